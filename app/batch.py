@@ -0,0 +1,307 @@
+"""
+Bulk transcript generation, for campus staff.
+
+Generates the transcripts of a list of logins, or of every user of a campus and/or cursus,
+with the app's own credentials: nobody has to log in. Users are fetched concurrently through
+the shared rate limiter, and their PDFs rendered `--jobs` at a time: by the warm `wkhtmltopdf`
+pool, or with `PDF_ENGINE=native` by as many worker processes, as native renders hold the GIL.
+
+Each PDF is written atomically to `<out>/<login>.pdf` and recorded in `<out>/manifest.jsonl`.
+Running the same command again after an interruption only generates what is missing (and
+retries what failed).
+
+Usage:
+	python app/batch.py --logins jdoe,asmith --out transcripts
+	python app/batch.py --campus 1 --cursus 21 --pool-year 2023 --out promo-2023 --zip promo-2023.zip
+"""
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import argparse
+import threading
+import multiprocessing
+from dataclasses import replace
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from flask import Flask
+
+from main import create_app, get_config_or_exit, load_env
+
+
+MANIFEST = 'manifest.jsonl'
+USERS = 'users.json'
+# Logins name the output files: anything else could write outside of `--out`
+LOGIN_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description='Generate the transcripts of many users at once.')
+	parser.add_argument('--logins', help='Comma-separated logins')
+	parser.add_argument('--logins-file', help='File with one login per line')
+	parser.add_argument('--campus', type=int, help='Every user of this campus id')
+	parser.add_argument('--cursus', type=int, help='Every user of this cursus id')
+	parser.add_argument('--pool-year', help='Only users of this piscine year')
+	parser.add_argument('--pool-month', help='Only users of this piscine month (e.g. september)')
+	parser.add_argument('--out', required=True, help='Output directory, also used to resume')
+	parser.add_argument('--zip', help='Also pack the PDFs into this zip file')
+	parser.add_argument('--jobs', type=int, default=os.cpu_count() or 2, help='PDFs rendered at once')
+	parser.add_argument('--env', action='append', default=[], help='Extra environment file (repeatable)')
+	args = parser.parse_args(argv)
+	if not (args.logins or args.logins_file or args.campus or args.cursus):
+		parser.error('give --logins, --logins-file, --campus or --cursus.')
+	args.jobs = max(1, args.jobs)
+	return args
+
+
+def read_logins(args: argparse.Namespace) -> list[str]:
+	logins = []
+	if args.logins:
+		logins += args.logins.split(',')
+	if args.logins_file:
+		with open(args.logins_file, 'r') as f:
+			logins += f.read().split()
+	return list(dict.fromkeys(login.strip() for login in logins if login.strip()))
+
+
+def list_users(sess: dict, args: argparse.Namespace) -> list[str] | dict:
+	"""
+	Logins of the users matching the campus/cursus/piscine filters.
+
+	Returns:
+		list | dict: The sorted logins, or the API error dict.
+	"""
+	from server.session import Session
+
+	filters = {}
+	if args.cursus is not None:
+		endpoint = f'/v2/cursus/{args.cursus}/users'
+		if args.campus is not None:
+			filters['filter[primary_campus_id]'] = args.campus
+	else:
+		endpoint = f'/v2/campus/{args.campus}/users'
+	if args.pool_year:
+		filters['filter[pool_year]'] = args.pool_year
+	if args.pool_month:
+		filters['filter[pool_month]'] = args.pool_month.lower()
+
+	logins = set()
+	for page in Session.iter_pages(sess, endpoint, 100, False, **filters):
+		if 'error' in page:
+			return page
+		logins.update(u['login'] for u in page['data'])
+	return sorted(logins)
+
+
+class Manifest:
+	"""
+	Append-only JSON lines log of the finished users of a run, the last entry of a login winning.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._lock = threading.Lock()
+
+	def load(self) -> dict[str, dict]:
+		entries = {}
+		if os.path.exists(self.path):
+			with open(self.path, 'r') as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						continue  # Torn last line of an interrupted run
+					entries[entry['login']] = entry
+		return entries
+
+	def record(self, entry: dict) -> None:
+		with self._lock, open(self.path, 'a') as f:
+			f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class Progress:
+	def __init__(self, total: int, skipped: int):
+		self.total = total
+		self.skipped = skipped
+		self.done = 0
+		self.failed = 0
+		self.start = time.perf_counter()
+		self._lock = threading.Lock()
+
+	def update(self, entry: dict) -> None:
+		with self._lock:
+			if entry['status'] == 'done':
+				self.done += 1
+			else:
+				self.failed += 1
+			finished = self.done + self.failed
+			elapsed = time.perf_counter() - self.start
+			rate = finished / elapsed if elapsed > 0 else 0.0
+			eta = (self.total - finished) / rate if rate > 0 else 0.0
+			width = len(str(self.total))
+			print(
+				f"[{finished + self.skipped:>{width}}/{self.total + self.skipped}] {entry['login']:<12} "
+				f"{'ok' if entry['status'] == 'done' else 'FAILED':<6} {entry['seconds']:6.2f}s | "
+				f"{rate:.2f} users/s, eta {int(eta // 60)}:{int(eta % 60):02d}"
+				+ (f" | {entry['error']}" if entry['status'] != 'done' else ''),
+				file=sys.stderr, flush=True,
+			)
+
+	def summary(self) -> str:
+		elapsed = time.perf_counter() - self.start
+		finished = self.done + self.failed
+		return (
+			f"{self.done} generated, {self.failed} failed, {self.skipped} already done, "
+			f"in {elapsed:.1f}s ({finished / elapsed if elapsed > 0 else 0.0:.2f} users/s)."
+		)
+
+
+def render_native(data: dict, path: str) -> int:
+	"""
+	Render the native PDF of `data` into `path`, in a worker process.
+	"""
+	from server.pdflayout import render_transcript
+
+	with open(path, 'wb') as f:
+		return render_transcript(data, f)
+
+
+def build(app: Flask, sess: dict, login: str, out: str, renderer: Executor | None = None) -> dict:
+	"""
+	Generate the transcript of `login` into `<out>/<login>.pdf`, rendering it in `renderer`
+	(a process pool, for the native engine) or else in this thread.
+
+	Returns:
+		dict: The manifest entry of `login`.
+	"""
+	from server.transcript import get_transcript_data, write_transcript_pdf
+
+	start = time.perf_counter()
+	entry = {'login': login, 'status': 'error', 'file': None, 'error': None}
+	if not LOGIN_PATTERN.fullmatch(login):
+		entry |= {'error': 'Invalid login.', 'seconds': 0.0}
+		return entry
+	path = os.path.join(out, f'{login}.pdf')
+	tmp = f'{path}.tmp'
+	try:
+		with app.app_context():
+			data = get_transcript_data(sess, login=login, feedback_error=False)
+			if 'error' in data:
+				entry['error'] = f"[{data.get('status_code')}] {data.get('text') or data['error']}"
+			else:
+				if renderer is not None:
+					renderer.submit(render_native, data, tmp).result()
+				else:
+					with open(tmp, 'wb') as f:
+						write_transcript_pdf(data, f)
+				os.replace(tmp, path)
+				entry |= {'status': 'done', 'file': os.path.basename(path), 'name': f'{data['name']}.pdf'}
+	except Exception as e:
+		entry['error'] = f'[{e.__class__.__name__}] {e}'
+		if os.path.exists(tmp):
+			os.remove(tmp)
+	entry['seconds'] = round(time.perf_counter() - start, 3)
+	return entry
+
+
+def write_zip(out: str, entries: dict[str, dict], path: str) -> int:
+	"""
+	Pack the generated PDFs into `path` (stored, PDFs are already compressed).
+
+	Returns:
+		int: The number of PDFs packed.
+	"""
+	files = sorted(e['file'] for e in entries.values() if e['status'] == 'done')
+	tmp = f'{path}.tmp'
+	with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_STORED) as z:
+		for name in files:
+			z.write(os.path.join(out, name), name)
+	os.replace(tmp, path)
+	return len(files)
+
+
+def main(argv: list[str]) -> int:
+	args = parse_args(argv)
+	load_env(['.env', 'secrets.txt', *args.env])
+	config = get_config_or_exit()
+	# Enough workers to keep fetching while `jobs` PDFs render, and room for all of them in the queue
+	workers = args.jobs * 2
+	app = create_app(replace(
+		config,
+		render_pool_size=args.jobs,
+		render_queue_size=max(config.render_queue_size, workers),
+	))
+
+	from server.session import Session
+
+	sess = Session.app_session()
+	if 'error' in sess:
+		print(f"[FATAL] Could not authenticate as the app: [{sess.get('status_code')}] {sess.get('text') or sess['error']}", file=sys.stderr)
+		return 1
+
+	os.makedirs(args.out, exist_ok=True)
+	logins = read_logins(args)
+	if args.campus is not None or args.cursus is not None:
+		# The user list is kept with the output so that a resumed run works on the same promo
+		users_path = os.path.join(args.out, USERS)
+		if os.path.exists(users_path):
+			with open(users_path, 'r') as f:
+				users = json.load(f)
+		else:
+			if isinstance(users := list_users(sess, args), dict):
+				print(f"[FATAL] Could not list the users: [{users.get('status_code')}] {users.get('text') or users['error']}", file=sys.stderr)
+				return 1
+			with open(users_path, 'w') as f:
+				json.dump(users, f)
+		logins = list(dict.fromkeys(logins + users))
+
+	manifest = Manifest(os.path.join(args.out, MANIFEST))
+	entries = manifest.load()
+	pending = [
+		login for login in logins
+		if (e := entries.get(login)) is None or e['status'] != 'done'
+			or not os.path.exists(os.path.join(args.out, e['file']))
+	]
+	progress = Progress(len(pending), len(logins) - len(pending))
+	print(f"[INFO] {len(logins)} users, {len(pending)} to generate with {args.jobs} renderers.", file=sys.stderr)
+
+	def finish(future):
+		finished.add(future)
+		entry = future.result()
+		manifest.record(entry)
+		entries[entry['login']] = entry
+		progress.update(entry)
+
+	finished = set()
+	renderer = None
+	if config.pdf_engine == 'native':
+		# Spawned, not forked: this process already runs threads
+		renderer = ProcessPoolExecutor(max_workers=args.jobs, mp_context=multiprocessing.get_context('spawn'))
+	executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+	futures = [executor.submit(build, app, sess, login, args.out, renderer) for login in pending]
+	try:
+		for future in as_completed(futures):
+			finish(future)
+	except KeyboardInterrupt:
+		print("[WARN] Interrupted, finishing the transcripts in flight...", file=sys.stderr)
+		executor.shutdown(cancel_futures=True)
+		for future in futures:
+			if future not in finished and not future.cancelled():
+				finish(future)
+		print(f"[WARN] {progress.summary()} Run the same command again to resume.", file=sys.stderr)
+		return 130
+	finally:
+		if renderer is not None:
+			renderer.shutdown()
+	executor.shutdown()
+
+	print(f"[INFO] {progress.summary()}", file=sys.stderr)
+	if args.zip:
+		count = write_zip(args.out, {login: entries[login] for login in logins if login in entries}, args.zip)
+		print(f"[INFO] Packed {count} transcripts into {args.zip}.", file=sys.stderr)
+	return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
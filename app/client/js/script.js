@@ -4,4 +4,54 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function initApp() {
+	initTranscriptButton();
+}
+
+function initTranscriptButton() {
+	const button = document.getElementById('transcript-button');
+	if (!button)
+		return;
+
+	const label = button.textContent;
+	let busy = false;
+
+	const reset = () => {
+		busy = false;
+		button.textContent = label;
+		button.classList.remove('disabled');
+	};
+
+	const poll = async (job) => {
+		while (job.status === 'queued' || job.status === 'running') {
+			await new Promise((resolve) => setTimeout(resolve, 1000));
+			const res = await fetch(`/transcript/jobs/${job.id}`);
+			job = await res.json();
+		}
+		return job;
+	};
+
+	button.addEventListener('click', async (event) => {
+		event.preventDefault();
+		if (busy)
+			return;
+		busy = true;
+		button.textContent = 'Generating...';
+		button.classList.add('disabled');
+
+		try {
+			const res = await fetch('/transcript/jobs', { method: 'POST' });
+			if (!res.ok)
+				throw new Error(`HTTP ${res.status}`);
+			const job = await poll(await res.json());
+			if (job.status !== 'done')
+				throw new Error(job.error || 'Transcript generation failed.');
+			window.location.href = job.download;
+		} catch (e) {
+			console.error(e);
+			// Fall back to the synchronous endpoint, which reports errors through the page
+			window.location.href = button.href;
+		} finally {
+			reset();
+		}
+	});
 }
@@ -0,0 +1,15 @@
+"""
+Green-thread entry point, for gunicorn's gevent workers:
+
+	gunicorn -k gevent --worker-connections 1000 --preload --pythonpath app gwsgi:app
+
+The standard library is patched before anything else is imported, so that the app built by
+`--preload` (HTTP client, rate limiter, token refreshes, render pool) blocks on cooperative
+sockets, pipes, locks and sleeps. Each request then runs in its own greenlet, and a worker
+overlaps as many upstream waits as it has connections instead of one.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+from wsgi import app
@@ -1,78 +1,103 @@
 import os
 import sys
-import codecs
-import json
+import time
 import dotenv
 import traceback
-from urllib.parse import quote
-from flask import Flask, redirect
-from flask_session import Session as FlaskSession
+from flask import Flask, g, redirect, request
 
 from server.data import Data
-from server.utils import strbool, set_default, os_assert, session_error
+from server.config import Config, ConfigError, load_config, set_config
+from server.metrics import HTTP_REQUESTS, HTTP_SECONDS
+from server.log import get_logger, setup_logging
 
 
-def parse_args():
-	for arg in sys.argv[1:]:
+log = get_logger('main')
+
+
+def load_env(paths: list[str]) -> None:
+	"""
+	Load dotenv files into the environment, later files overriding earlier ones.
+	"""
+	for path in paths:
+		if os.path.exists(path):
+			dotenv.load_dotenv(path, override=True)
+			print(f"[INFO] Loaded environment file {path}.")
+		else:
+			print(f"[WARN] Environment file {path} does not exist.")
+
+
+def parse_args(argv: list[str]) -> None:
+	for arg in argv:
 		if arg == '--debug':
 			os.environ[Data.X_DEBUG] = '1'
 			break
 
 		if arg.startswith('--port='):
-			port = arg.split('=')[1]
-			try:
-				port = int(port)
-				if port < 1 or port > 65535:
-					raise ValueError
-				os.environ[Data.X_PORT] = str(port)
-			except ValueError:
-				print("Invalid port number. Please provide a valid port between 1 and 65535.")
-				sys.exit(1)
-
-		if os.path.exists(arg):
-			dotenv.load_dotenv(arg, override=True)
-			print(f"[INFO] Loaded environment file {arg}.")
-		else:
-			print(f"[WARN] Environment file {arg} does not exist.")
+			os.environ[Data.X_PORT] = arg.split('=')[1]
+			continue
 
+		load_env([arg])
 
-def setup_env():
-	set_default(Data.X_TITLE, '42 Transcript Generator')
-	set_default(Data.X_PORT, 5000)
-	set_default(Data.X_DEBUG, False)
-	set_default(Data.X_VERSION, '0.0.0')
-	set_default(Data.X_SECRET_KEY, 'change_me')
 
-	os_assert(Data.X_API_URL)
-	os_assert(Data.X_API_TOKEN_URL)
-	os_assert(Data.X_API_OAUTH_URL)
-	os_assert(Data.X_REDIRECT_URI)
-	os_assert(Data.X_FT_UID)
-	os_assert(Data.X_FT_SECRET)
+def get_config_or_exit() -> Config:
+	try:
+		return load_config()
+	except ConfigError as e:
+		print(f"[FATAL] {e}", file=sys.stderr)
+		sys.exit(1)
 
-	os.environ[Data.X_API_OAUTH_URL] = os.environ[Data.X_API_OAUTH_URL] \
-		.replace('$FT_UID', os.environ[Data.X_FT_UID]) \
-		.replace('$REDIRECT_URI', quote(os.environ[Data.X_REDIRECT_URI], safe='$'))
 
-	Data.DEBUG = strbool(os.environ[Data.X_DEBUG])
-
-
-def setup_session(app: Flask):
+def setup_session(app: Flask, config: Config):
 	"""
 	Session config: https://flask-session.readthedocs.io/en/latest/config.html#relevant-flask-configuration-values
 	"""
-	app.config['SESSION_TYPE'] = 'filesystem'
-	app.config['SESSION_FILE_THRESHOLD'] = 64
 	app.config['SESSION_PERMANENT'] = True
 	app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 	app.config['SESSION_COOKIE_NAME'] = 'ft_tg'
 	app.config['SESSION_COOKIE_HTTPONLY'] = True
 	app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-	app.config['SESSION_COOKIE_SECURE'] = not Data.DEBUG
-	FlaskSession(app)
+	app.config['SESSION_COOKIE_SECURE'] = not config.debug
+
+	if config.session_backend == 'sqlite':
+		from server.sessionstore import SqliteSessionInterface
+		app.session_interface = SqliteSessionInterface(app, config.session_db)
+	else:
+		from flask_session import Session as FlaskSession
+		if config.session_backend == 'memory':
+			from cachelib import SimpleCache
+			app.config['SESSION_TYPE'] = 'cachelib'
+			app.config['SESSION_CACHELIB'] = SimpleCache(threshold=1024, default_timeout=86400)
+		else:
+			app.config['SESSION_TYPE'] = 'filesystem'
+			app.config['SESSION_FILE_THRESHOLD'] = 64
+		FlaskSession(app)
+
+	from server.sessionstore import SessionlessEndpoints
+	from server.routes import SESSIONLESS_ENDPOINTS
+	app.session_interface = SessionlessEndpoints(app.session_interface, SESSIONLESS_ENDPOINTS)
+
+
+def setup_metrics(app: Flask):
+	"""
+	Time every request, labelled by its URL rule (not its path) to keep the label set bounded.
+	"""
+	@app.before_request
+	def start_timer():
+		g.request_start = time.perf_counter()
 
 
-def setup_routes(app: Flask):
+	@app.after_request
+	def record_request(response):
+		endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+		if (start := g.pop('request_start', None)) is not None:
+			HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+		HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+		return response
+
+
+def setup_routes(app: Flask, config: Config):
+	from server.utils import session_error
+
 	@app.errorhandler(404)
 	def handle_not_found(e=None):
 		session_error('[404] Not Found', 'The requested resource was not found.', 404)
@@ -81,32 +106,94 @@ def setup_routes(app: Flask):
 
 	@app.errorhandler(Exception)
 	def handle_generic_exception(e=None):
+		log.exception("Unhandled exception on %s %s.", request.method, request.path)
 		session_error(
 			'An unexpected error occurred.', f'[{e.__class__.__name__}] {e}', 500,
-			**({ 'trace': traceback.format_exc().split('\n') } if Data.DEBUG else {}),
+			**({ 'trace': traceback.format_exc().split('\n') } if config.debug else {}),
 		)
 		return redirect('/')
 
+	app.config['USE_X_SENDFILE'] = config.sendfile == 'x-sendfile'
+
 	from server.routes import main_bp
 	app.register_blueprint(main_bp)
 
 
-parse_args()
-setup_env()
+def setup_templates(app: Flask, config: Config):
+	"""
+	Serve the templates handed to the PDF renderer from their build (minified, images moved
+	out, see `server.templates`), and keep compiled templates in an on-disk bytecode cache so
+	that workers and restarts skip the Jinja compilation. Templates link static files with
+	`asset(name)`, their fingerprinted URL (see `server.assets`).
+	"""
+	from jinja2 import ChoiceLoader, FileSystemBytecodeCache
+	from server.templates import BuildLoader
+
+	app.jinja_loader = ChoiceLoader([
+		BuildLoader(os.path.join(app.root_path, app.template_folder), config.template_cache_dir),
+		app.jinja_loader,
+	])
+	bytecode_dir = os.path.join(config.template_cache_dir, 'bytecode')
+	os.makedirs(bytecode_dir, exist_ok=True)
+	app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+
+	from server.assets import get_assets
+	app.jinja_env.globals['asset'] = lambda name: get_assets().url(name)
 
-app = Flask(__name__, static_folder='client', template_folder='client/html')
-app.secret_key = codecs.decode(os.environ.get(Data.X_SECRET_KEY), 'unicode_escape').encode('latin1')
 
-setup_session(app)
-setup_routes(app)
+def warm_up(app: Flask, config: Config):
+	"""
+	Load what every worker needs before serving: with `gunicorn --preload` this runs once in
+	the master and the workers fork with it already in memory.
+	"""
+	from server.catalogue import get_catalogue
+	from server.campuses import get_campuses
+	from server.assets import get_assets
+	get_catalogue().index()
+	get_assets()
+	# Never fetched here: a slow or unreachable API would hold the boot. A stale or missing
+	# directory is refreshed in the background on first use, after the fork (profiles embed
+	# the campuses it does not know meanwhile).
+	get_campuses().index()
+	for template in app.jinja_env.list_templates(extensions=['html']):
+		app.jinja_env.get_template(template)
+	if config.pdf_engine == 'native':
+		from server.pdflayout import get_fonts, get_logo
+		get_fonts()
+		get_logo()
+
+
+def create_app(config: Config | None = None) -> Flask:
+	"""
+	Application factory.
+
+	Args:
+		config (Config | None): Defaults to the config parsed from the environment.
+	"""
+	config = get_config_or_exit() if config is None else set_config(config)
+	setup_logging(config)
+
+	app = Flask(__name__, static_folder='client', template_folder='client/html')
+	app.secret_key = config.secret_key_bytes
 
-print(f"[INFO] ENV: {json.dumps(dict(os.environ), indent=4, ensure_ascii=False)}")
-print(f"[INFO] Starting server {os.environ[Data.X_TITLE]} v{os.environ.get(Data.X_VERSION, '?.?')} on port {os.environ[Data.X_PORT]} (debug={Data.DEBUG}; key={app.secret_key})")
+	setup_session(app, config)
+	setup_metrics(app)
+	setup_routes(app, config)
+	setup_templates(app, config)
+	warm_up(app, config)
+
+	log.info(
+		"Starting server %s v%s on port %s (debug=%s).",
+		config.title, config.version, config.port, config.debug,
+	)
+	return app
 
 
 if __name__ == '__main__':
-	app.run(
-		debug=Data.DEBUG,
+	parse_args(sys.argv[1:])
+	config = get_config_or_exit()
+	create_app(config).run(
+		debug=config.debug,
 		host='0.0.0.0',
-		port=int(os.environ[Data.X_PORT]),
+		port=config.port,
 	)
@@ -0,0 +1,132 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+from .config import get_config
+from .templates import _write
+
+
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client')
+# Rendered by Flask, not served as files
+SKIP_DIRS = ('html',)
+# Already compressed formats, not worth gzip or brotli
+COMPRESSED_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2')
+# A compressed variant is only kept when it is at least this much smaller
+MIN_SAVING = 0.1
+MANIFEST = 'manifest.json'
+URL_PREFIX = '/assets/'
+
+
+def fingerprint(name: str, data: bytes) -> str:
+	"""
+	`name` with a hash of its contents before the extension: `css/style.css` -> `css/style.<hash>.css`.
+	"""
+	root, ext = os.path.splitext(name)
+	return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+	if encoding == 'br':
+		return brotli.compress(data, quality=11)
+	return gzip.compress(data, 9, mtime=0)
+
+
+class Assets:
+	"""
+	Fingerprinted, precompressed copies of the static files of `src_dir`, built into `build_dir`.
+
+	Every file is copied as `<name>.<hash><ext>`, with `.br` (when brotli is installed) and
+	`.gz` variants when they are worth it. Names change with contents, so built files can be
+	cached forever. `manifest.json` maps source names to built ones, for reverse proxies and
+	deployment scripts. Building is idempotent and files are written atomically, so several
+	processes can build the same directory.
+	"""
+
+	def __init__(self, src_dir: str, build_dir: str):
+		self.src_dir = src_dir
+		self.build_dir = build_dir
+		self.manifest: dict[str, str] = {}
+		# Built name -> encodings of its variants, best first
+		self.encodings: dict[str, tuple[str, ...]] = {}
+
+	def build(self) -> dict[str, str]:
+		"""
+		Build every file of `src_dir` missing from `build_dir`, write the manifest and return it.
+		"""
+		manifest, encodings = {}, {}
+		for root, dirs, files in os.walk(self.src_dir):
+			dirs[:] = sorted(d for d in dirs if os.path.relpath(os.path.join(root, d), self.src_dir) not in SKIP_DIRS)
+			for file in sorted(files):
+				path = os.path.join(root, file)
+				name = os.path.relpath(path, self.src_dir).replace(os.sep, '/')
+				with open(path, 'rb') as f:
+					data = f.read()
+				built = manifest[name] = fingerprint(name, data)
+				encodings[built] = self._build(built, data)
+		_write(os.path.join(self.build_dir, MANIFEST), json.dumps(manifest, indent='\t', sort_keys=True) + '\n')
+		self.manifest, self.encodings = manifest, encodings
+		return manifest
+
+	def _build(self, built: str, data: bytes) -> tuple[str, ...]:
+		path = os.path.join(self.build_dir, built)
+		if not os.path.exists(path):
+			_write(path, data)
+		if os.path.splitext(built)[1].lower() in COMPRESSED_EXTS:
+			return ()
+		encodings = []
+		for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+			if encoding == 'br' and brotli is None:
+				continue
+			if not os.path.exists(path + suffix):
+				if len(packed := compress(data, encoding)) > len(data) * (1 - MIN_SAVING):
+					continue
+				_write(path + suffix, packed)
+			encodings.append(encoding)
+		return tuple(encodings)
+
+	def url(self, name: str) -> str:
+		"""
+		URL of the source file `name` (relative to `src_dir`), falling back to the unversioned
+		Flask static URL for files that were not built.
+		"""
+		if (built := self.manifest.get(name)) is None:
+			return f'/client/{name}'
+		return URL_PREFIX + built
+
+	def variant(self, built: str, accept) -> tuple[str, str | None] | None:
+		"""
+		The file to send for the built name `built` to a client accepting the encodings `accept`
+		(a werkzeug `Accept`): `(path relative to build_dir, content encoding or None)`, or None
+		if `built` is unknown.
+		"""
+		if (encodings := self.encodings.get(built)) is None:
+			return None
+		for encoding in encodings:
+			if accept.quality(encoding) > 0:
+				return built + ('.br' if encoding == 'br' else '.gz'), encoding
+		return built, None
+
+
+_assets: Assets | None = None
+_assets_lock = threading.Lock()
+
+
+def get_assets() -> Assets:
+	"""
+	Return the static assets of the app, building them on first use.
+	"""
+	global _assets
+	if _assets is None:
+		with _assets_lock:
+			if _assets is None:
+				assets = Assets(os.path.abspath(CLIENT_DIR), os.path.abspath(get_config().asset_dir))
+				assets.build()
+				_assets = assets
+	return _assets
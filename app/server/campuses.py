@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+
+from .config import get_config
+from .session import Session
+from .metrics import REGISTRY
+from .log import get_logger
+
+
+log = get_logger('campuses')
+
+
+CAMPUS_FIELDS = ('id', 'name', 'address', 'zip', 'city', 'country', 'website')
+
+# Wait before retrying a failed refresh, in seconds
+RETRY_DELAY = 300
+
+
+class CampusDirectory:
+	"""
+	Index of every 42 campus by id, fetched in bulk from `/v2/campus` with the app's token.
+
+	The directory is kept in a JSON file shared by the workers and reloaded whenever its mtime
+	changes, like the catalogue. `refresh_if_stale` refreshes it in the background once it is
+	missing or older than `ttl` (one refresh at a time per process, retried after `RETRY_DELAY`
+	on failure), and the stale index keeps being served meanwhile.
+	"""
+
+	def __init__(self, path: str, ttl: float = 7 * 86400):
+		self.path = path
+		self.ttl = ttl
+		self._mtime = None
+		self._index: dict[int, dict] = {}
+		self._lock = threading.Lock()
+		self._refreshing = False
+		self._failed_at = 0.0
+
+	def index(self) -> dict[int, dict]:
+		try:
+			mtime = os.stat(self.path).st_mtime_ns
+		except FileNotFoundError:
+			mtime = None
+		if mtime != self._mtime:
+			with self._lock:
+				if mtime != self._mtime:
+					self._index = self._load() if mtime is not None else {}
+					self._mtime = mtime
+		return self._index
+
+	def _load(self) -> dict[int, dict]:
+		try:
+			with open(self.path, 'r') as f:
+				return {c['id']: c for c in json.load(f)}
+		except (OSError, ValueError, KeyError, TypeError) as e:
+			log.warning("Ignoring the unreadable campus directory %s: %s", self.path, e)
+			return {}
+
+	def get(self, cid: int | None) -> dict | None:
+		return self.index().get(cid)
+
+	def stale(self) -> bool:
+		try:
+			return time.time() - os.stat(self.path).st_mtime > self.ttl
+		except FileNotFoundError:
+			return True
+
+	def refresh_if_stale(self) -> None:
+		if self.stale():
+			self.refresh_async()
+
+	def refresh(self) -> bool:
+		"""
+		Fetch every campus and replace the directory file.
+
+		Returns:
+			bool: Whether the directory was refreshed.
+		"""
+		sess = Session.app_session()
+		if 'error' in sess:
+			return False
+		campuses = []
+		for page in Session.iter_pages(sess, '/v2/campus', 100, False):
+			if 'error' in page:
+				log.warning("Could not fetch the campus directory: %s %s", page.get('status_code'), page['error'])
+				return False
+			campuses += [{k: c.get(k) for k in CAMPUS_FIELDS} for c in page['data']]
+		if not campuses:
+			return False
+		campuses.sort(key=lambda c: c['id'])
+
+		if os.path.dirname(self.path):
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		tmp = f'{self.path}.{os.getpid()}.tmp'
+		with open(tmp, 'w') as f:
+			json.dump(campuses, f, ensure_ascii=False)
+		os.replace(tmp, self.path)
+		log.info("Campus directory refreshed: %d campuses.", len(campuses))
+		return True
+
+	def refresh_async(self) -> None:
+		with self._lock:
+			if self._refreshing or time.time() - self._failed_at < RETRY_DELAY:
+				return
+			self._refreshing = True
+		threading.Thread(target=self._run, name='campuses', daemon=True).start()
+
+	def _run(self) -> None:
+		ok = False
+		try:
+			ok = self.refresh()
+		except Exception:
+			log.exception("Campus directory refresh failed.")
+		finally:
+			with self._lock:
+				self._refreshing = False
+				self._failed_at = 0.0 if ok else time.time()
+
+
+_directory: CampusDirectory | None = None
+_directory_pid: int | None = None
+_directory_lock = threading.Lock()
+
+
+def get_campuses() -> CampusDirectory:
+	"""
+	Return the campus directory of the current process. A refresh thread does not survive a
+	fork, hence one directory per PID.
+	"""
+	global _directory, _directory_pid
+	with _directory_lock:
+		if _directory is None or _directory_pid != os.getpid():
+			config = get_config()
+			_directory = CampusDirectory(config.campus_file, ttl=config.campus_ttl)
+			_directory_pid = os.getpid()
+		return _directory
+
+
+@REGISTRY.collector
+def _collect() -> dict:
+	if _directory is None:
+		return {}
+	return {
+		'ft_campuses': ('Campuses in the directory loaded by this worker.', len(_directory._index)),
+	}
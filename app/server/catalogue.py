@@ -0,0 +1,73 @@
+import os
+import json
+import threading
+from math import ceil
+
+
+CATALOGUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'projects.json')
+
+CATEGORIES = ('piscine', 'commonCore', 'postCore')
+
+DEFAULT_MULT = 2
+DEFAULT_EXP = 0.25
+
+
+def project_credits(base: int, mult: float = DEFAULT_MULT, exp: float = DEFAULT_EXP) -> int:
+	return ceil(base ** exp * mult)
+
+
+class Catalogue:
+	"""
+	In-memory index of `projects.json`, reloaded whenever the file's mtime changes.
+
+	The index maps a project id to:
+		{
+			'pos': int,            # position in the catalogue, to keep the file's ordering
+			'category': str,       # 'piscine' | 'commonCore' | 'postCore'
+			'subCategory': str,
+			'project': dict,       # the catalogue entry itself
+			'credits': int,        # project_credits(base) with the default mult/exp
+		}
+	When a project is listed several times, its first occurrence wins.
+	"""
+
+	def __init__(self, path: str = CATALOGUE_PATH):
+		self.path = path
+		self._mtime = None
+		self._index: dict[int, dict] = {}
+		self._lock = threading.Lock()
+
+	def _load(self) -> dict[int, dict]:
+		with open(self.path, 'r') as f:
+			projects = json.load(f)
+		index = {}
+		pos = 0
+		for tcat in CATEGORIES:
+			for cat_name, cat in projects[tcat].items():
+				for p in cat:
+					if p['id'] not in index:
+						index[p['id']] = {
+							'pos': pos,
+							'category': tcat,
+							'subCategory': cat_name,
+							'project': p,
+							'credits': project_credits(p['base']),
+						}
+					pos += 1
+		return index
+
+	def index(self) -> dict[int, dict]:
+		mtime = os.stat(self.path).st_mtime_ns
+		if mtime != self._mtime:
+			with self._lock:
+				if mtime != self._mtime:
+					self._index = self._load()
+					self._mtime = mtime
+		return self._index
+
+
+_catalogue = Catalogue()
+
+
+def get_catalogue() -> Catalogue:
+	return _catalogue
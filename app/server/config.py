@@ -0,0 +1,212 @@
+import os
+import codecs
+import threading
+from types import MappingProxyType
+from functools import cached_property
+from urllib.parse import quote
+from dataclasses import dataclass, field, fields
+
+from .data import Data
+from .wording import WORDING
+
+
+class ConfigError(ValueError):
+	"""
+	Raised with every invalid or missing setting at once.
+	"""
+
+	def __init__(self, problems: list[str]):
+		self.problems = problems
+		super().__init__('Invalid configuration:\n' + '\n'.join(f'  - {p}' for p in problems))
+
+
+def setting(key: str, default=None, choices: tuple | None = None, required: bool = False):
+	return field(default=default, metadata={'env': key, 'choices': choices, 'required': required})
+
+
+@dataclass(frozen=True)
+class Config:
+	"""
+	Settings of the app, parsed and validated once from the environment.
+
+	Every field maps to the environment variable given by its `Data.X_*` key.
+	Instances are immutable: read them freely from any thread or request.
+	"""
+
+	title: str = setting(Data.X_TITLE, '42 Transcript Generator')
+	version: str = setting(Data.X_VERSION, '0.0.0')
+	port: int = setting(Data.X_PORT, 5000)
+	debug: bool = setting(Data.X_DEBUG, False)
+	secret_key: str = setting(Data.X_SECRET_KEY, 'change_me')
+
+	api_url: str = setting(Data.X_API_URL, required=True)
+	api_token_url: str = setting(Data.X_API_TOKEN_URL, required=True)
+	api_oauth_url: str = setting(Data.X_API_OAUTH_URL, required=True)
+	redirect_uri: str = setting(Data.X_REDIRECT_URI, required=True)
+	ft_uid: str = setting(Data.X_FT_UID, required=True)
+	ft_secret: str = setting(Data.X_FT_SECRET, required=True)
+
+	session_backend: str = setting(Data.X_SESSION_BACKEND, 'sqlite', choices=('sqlite', 'memory', 'filesystem'))
+	session_db: str = setting(Data.X_SESSION_DB, 'cache/sessions.sqlite3')
+
+	http_pool_size: int = setting(Data.X_HTTP_POOL_SIZE, 10)
+	http_connect_timeout: float = setting(Data.X_HTTP_CONNECT_TIMEOUT, 5.0)
+	http_read_timeout: float = setting(Data.X_HTTP_READ_TIMEOUT, 30.0)
+	http_retries: int = setting(Data.X_HTTP_RETRIES, 3)
+	http_backoff: float = setting(Data.X_HTTP_BACKOFF, 0.5)
+	http_cache_size: int = setting(Data.X_HTTP_CACHE_SIZE, 32 * 1024 * 1024)
+	fetch_concurrency: int = setting(Data.X_FETCH_CONCURRENCY, 4)
+
+	rate_limit: float = setting(Data.X_RATE_LIMIT, 2.0)
+	rate_burst: int = setting(Data.X_RATE_BURST, 2)
+	rate_deadline: float = setting(Data.X_RATE_DEADLINE, 10.0)
+	rate_limit_db: str = setting(Data.X_RATE_LIMIT_DB, 'cache/ratelimit.sqlite3')
+
+	profile_ttl: float = setting(Data.X_PROFILE_TTL, 300.0)
+	profile_snapshot_ttl: float = setting(Data.X_PROFILE_SNAPSHOT_TTL, 86400.0)
+	profile_db: str = setting(Data.X_PROFILE_DB, 'cache/profiles.sqlite3')
+
+	token_refresh_margin: float = setting(Data.X_TOKEN_REFRESH_MARGIN, 60.0)
+	token_refresh_lead: float = setting(Data.X_TOKEN_REFRESH_LEAD, 600.0)
+	token_db: str = setting(Data.X_TOKEN_DB, 'cache/tokens.sqlite3')
+
+	campus_file: str = setting(Data.X_CAMPUS_FILE, 'cache/campuses.json')
+	campus_ttl: float = setting(Data.X_CAMPUS_TTL, 7 * 86400.0)
+
+	render_pool_size: int = setting(Data.X_RENDER_POOL_SIZE, 2)
+	render_queue_size: int = setting(Data.X_RENDER_QUEUE_SIZE, 16)
+	render_timeout: float = setting(Data.X_RENDER_TIMEOUT, 30.0)
+
+	pdf_engine: str = setting(Data.X_PDF_ENGINE, 'wkhtmltopdf', choices=('wkhtmltopdf', 'native'))
+	pdf_font_regular: str = setting(Data.X_PDF_FONT_REGULAR, '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf')
+	pdf_font_bold: str = setting(Data.X_PDF_FONT_BOLD, '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf')
+	pdf_font_italic: str = setting(Data.X_PDF_FONT_ITALIC, '/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf')
+	pdf_font_bold_italic: str = setting(Data.X_PDF_FONT_BOLD_ITALIC, '/usr/share/fonts/truetype/liberation/LiberationSans-BoldItalic.ttf')
+
+	job_workers: int = setting(Data.X_JOB_WORKERS, 2)
+	job_timeout: float = setting(Data.X_JOB_TIMEOUT, 120.0)
+	job_db: str = setting(Data.X_JOB_DB, 'cache/jobs.sqlite3')
+
+	pdf_cache_dir: str = setting(Data.X_PDF_CACHE_DIR, 'cache/pdf')
+	pdf_cache_size: int = setting(Data.X_PDF_CACHE_SIZE, 64 * 1024 * 1024)
+	pdf_cache_ttl: float = setting(Data.X_PDF_CACHE_TTL, 86400.0)
+
+	template_cache_dir: str = setting(Data.X_TEMPLATE_CACHE_DIR, 'cache/templates')
+	asset_dir: str = setting(Data.X_ASSET_DIR, 'cache/assets')
+
+	sendfile: str = setting(Data.X_SENDFILE, '', choices=('', 'x-sendfile', 'x-accel-redirect'))
+	sendfile_prefix: str = setting(Data.X_SENDFILE_PREFIX, '/_pdf/')
+
+	metrics_token: str = setting(Data.X_METRICS_TOKEN, '')
+
+	log_level: str = setting(Data.X_LOG_LEVEL, '', choices=('', 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'))
+	log_format: str = setting(Data.X_LOG_FORMAT, 'text', choices=('text', 'json'))
+	log_payload_limit: int = setting(Data.X_LOG_PAYLOAD_LIMIT, 512)
+
+	@classmethod
+	def from_env(cls, env=None) -> 'Config':
+		"""
+		Build the config from `env` (defaults to `os.environ`).
+
+		Raises:
+			ConfigError: Listing every missing or invalid variable.
+		"""
+		env = os.environ if env is None else env
+		values = {}
+		problems = []
+		for f in fields(cls):
+			key = f.metadata['env']
+			raw = env.get(key)
+			if raw is None:
+				if f.metadata['required']:
+					problems.append(f'{key} must be set.')
+				continue
+			try:
+				value = cls._parse(f.type, raw)
+			except ValueError:
+				problems.append(f'{key} must be a valid {f.type.__name__}, got {raw!r}.')
+				continue
+			if f.metadata['choices'] is not None:
+				value = value.upper() if key == Data.X_LOG_LEVEL else value.lower()
+				if value not in f.metadata['choices']:
+					problems.append(f'{key} must be one of {', '.join(c or '(empty)' for c in f.metadata['choices'])}, got {raw!r}.')
+					continue
+			values[f.name] = value
+
+		port = values.get('port', 5000)
+		if not 1 <= port <= 65535:
+			problems.append(f'{Data.X_PORT} must be between 1 and 65535, got {port}.')
+		if problems:
+			raise ConfigError(problems)
+
+		values['api_oauth_url'] = values['api_oauth_url'] \
+			.replace('$FT_UID', values['ft_uid']) \
+			.replace('$REDIRECT_URI', quote(values['redirect_uri'], safe='$'))
+		return cls(**values)
+
+	@staticmethod
+	def _parse(kind: type, raw: str):
+		if kind is bool:
+			# Imported here, as utils imports this module
+			from .utils import strbool
+			if (value := strbool(raw, strict=True)) is None:
+				raise ValueError(raw)
+			return value
+		return kind(raw)
+
+	@cached_property
+	def secret_key_bytes(self) -> bytes:
+		return codecs.decode(self.secret_key, 'unicode_escape').encode('latin1')
+
+	@cached_property
+	def pdf_fonts(self) -> tuple[str, str, str, str]:
+		"""
+		Font files of the native PDF engine: regular, bold, italic and bold italic.
+		"""
+		return (self.pdf_font_regular, self.pdf_font_bold, self.pdf_font_italic, self.pdf_font_bold_italic)
+
+	@cached_property
+	def template_env(self) -> MappingProxyType:
+		"""
+		The only settings exposed to templates as `env`.
+		"""
+		return MappingProxyType({
+			'TITLE': self.title,
+			'VERSION': self.version,
+			'DEBUG': self.debug,
+			'API_OAUTH_URL': self.api_oauth_url,
+			'WORDING': WORDING,
+		})
+
+
+_config: Config | None = None
+_config_lock = threading.Lock()
+
+
+def set_config(config: Config) -> Config:
+	"""
+	Install `config` as the process-wide config.
+	"""
+	global _config
+	with _config_lock:
+		_config = config
+	return config
+
+
+def load_config(env=None) -> Config:
+	"""
+	Parse `env` (defaults to `os.environ`) and install it as the process-wide config.
+	"""
+	return set_config(Config.from_env(env))
+
+
+def get_config() -> Config:
+	"""
+	Return the process-wide config, loading it from `os.environ` on first use.
+	"""
+	global _config
+	if _config is None:
+		with _config_lock:
+			if _config is None:
+				_config = Config.from_env()
+	return _config
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+
+
+def green() -> bool:
+	"""
+	Whether gevent patched `threading` (see `gwsgi.py`), making every thread a greenlet.
+	"""
+	try:
+		from gevent import monkey
+	except ImportError:
+		return False
+	return monkey.is_module_patched('threading')
+
+
+class Connections:
+	"""
+	SQLite (WAL) connections to `path` of a store, set up by `setup` when opened, with the file
+	permissions `mode` when given.
+
+	One connection per thread, reopened after a fork. Under gevent, threads are greenlets, and
+	one connection per greenlet would rerun the setup on every request: every greenlet of the
+	process shares one connection instead, and `transaction` serializes them.
+	"""
+
+	def __init__(self, path: str, setup=None, mode: int | None = None):
+		self.path = path
+		self.setup = setup
+		self.mode = mode
+		self.shared = green()
+		self._local = threading.local()
+		self._shared: tuple[int, sqlite3.Connection] | None = None
+		self._lock = threading.RLock()
+		if os.path.dirname(self.path):
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+	def _connect(self) -> sqlite3.Connection:
+		if self.mode is not None:
+			# Created (or tightened) before SQLite opens it: its -wal and -shm files get the same mode
+			os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, self.mode))
+			os.chmod(self.path, self.mode)
+		db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=not self.shared)
+		db.execute('PRAGMA journal_mode=WAL')
+		db.execute('PRAGMA synchronous=NORMAL')
+		if self.setup is not None:
+			self.setup(db)
+		return db
+
+	def get(self) -> sqlite3.Connection:
+		if self.shared:
+			with self._lock:
+				if self._shared is None or self._shared[0] != os.getpid():
+					self._shared = (os.getpid(), self._connect())
+				return self._shared[1]
+		db = getattr(self._local, 'db', None)
+		if db is None or getattr(self._local, 'pid', None) != os.getpid():
+			self._local.db = db = self._connect()
+			self._local.pid = os.getpid()
+		return db
+
+	@contextmanager
+	def transaction(self):
+		"""
+		Run the block in a `BEGIN IMMEDIATE` transaction, committed on exit and rolled back on
+		any exception. Yields the connection.
+		"""
+		db = self.get()
+		with self._lock if self.shared else nullcontext():
+			db.execute('BEGIN IMMEDIATE')
+			try:
+				yield db
+			except BaseException:
+				db.execute('ROLLBACK')
+				raise
+			db.execute('COMMIT')
@@ -1,6 +1,4 @@
 class Data:
-	DEBUG			= False
-
 	X_TITLE			= "TITLE"
 	X_VERSION		= "VERSION"
 	X_PORT			= "PORT"
@@ -15,6 +13,64 @@ class Data:
 	X_FT_UID		= "FT_UID"
 	X_FT_SECRET		= "FT_SECRET"
 
+	X_SESSION_BACKEND	= "SESSION_BACKEND"
+	X_SESSION_DB		= "SESSION_DB"
+
+	X_HTTP_POOL_SIZE		= "HTTP_POOL_SIZE"
+	X_HTTP_CONNECT_TIMEOUT	= "HTTP_CONNECT_TIMEOUT"
+	X_HTTP_READ_TIMEOUT		= "HTTP_READ_TIMEOUT"
+	X_HTTP_RETRIES			= "HTTP_RETRIES"
+	X_HTTP_BACKOFF			= "HTTP_BACKOFF"
+	X_HTTP_CACHE_SIZE		= "HTTP_CACHE_SIZE"
+
+	X_FETCH_CONCURRENCY	= "FETCH_CONCURRENCY"
+
+	X_RATE_LIMIT		= "RATE_LIMIT"
+	X_RATE_BURST		= "RATE_BURST"
+	X_RATE_DEADLINE		= "RATE_DEADLINE"
+	X_RATE_LIMIT_DB		= "RATE_LIMIT_DB"
+
+	X_PROFILE_TTL		= "PROFILE_TTL"
+	X_PROFILE_SNAPSHOT_TTL	= "PROFILE_SNAPSHOT_TTL"
+	X_PROFILE_DB		= "PROFILE_DB"
+
+	X_TOKEN_REFRESH_MARGIN	= "TOKEN_REFRESH_MARGIN"
+	X_TOKEN_REFRESH_LEAD	= "TOKEN_REFRESH_LEAD"
+	X_TOKEN_DB				= "TOKEN_DB"
+
+	X_CAMPUS_FILE		= "CAMPUS_FILE"
+	X_CAMPUS_TTL		= "CAMPUS_TTL"
+
+	X_RENDER_POOL_SIZE	= "RENDER_POOL_SIZE"
+	X_RENDER_QUEUE_SIZE	= "RENDER_QUEUE_SIZE"
+	X_RENDER_TIMEOUT	= "RENDER_TIMEOUT"
+
+	X_PDF_ENGINE		= "PDF_ENGINE"
+	X_PDF_FONT_REGULAR	= "PDF_FONT_REGULAR"
+	X_PDF_FONT_BOLD		= "PDF_FONT_BOLD"
+	X_PDF_FONT_ITALIC	= "PDF_FONT_ITALIC"
+	X_PDF_FONT_BOLD_ITALIC	= "PDF_FONT_BOLD_ITALIC"
+
+	X_JOB_WORKERS		= "JOB_WORKERS"
+	X_JOB_TIMEOUT		= "JOB_TIMEOUT"
+	X_JOB_DB			= "JOB_DB"
+
+	X_PDF_CACHE_DIR		= "PDF_CACHE_DIR"
+	X_PDF_CACHE_SIZE	= "PDF_CACHE_SIZE"
+	X_PDF_CACHE_TTL		= "PDF_CACHE_TTL"
+
+	X_TEMPLATE_CACHE_DIR	= "TEMPLATE_CACHE_DIR"
+	X_ASSET_DIR			= "ASSET_DIR"
+
+	X_SENDFILE			= "SENDFILE"
+	X_SENDFILE_PREFIX	= "SENDFILE_PREFIX"
+
+	X_METRICS_TOKEN		= "METRICS_TOKEN"
+
+	X_LOG_LEVEL			= "LOG_LEVEL"
+	X_LOG_FORMAT		= "LOG_FORMAT"
+	X_LOG_PAYLOAD_LIMIT	= "LOG_PAYLOAD_LIMIT"
+
 	S_SESSION		= "_session_"
 	S_ERRORS		= "_errors_"
 	S_SUCCESSES		= "_successes_"
@@ -0,0 +1,131 @@
+try:
+	import numpy as np
+except ImportError as e:
+	raise ImportError("The credit engine needs numpy: pip install -r requirements-optional.txt") from e
+
+from .catalogue import CATEGORIES, DEFAULT_MULT, DEFAULT_EXP, get_catalogue, project_credits
+from .transcript import graded_projects
+
+
+class CreditResults:
+	"""
+	Credits and GPAs of `CreditEngine.compute`, `K` parameter sets by `N` users by the `C` categories.
+
+	Attributes:
+		params (list): The `(mult, exp)` of each parameter set.
+		users (list): The 42 user id of each row.
+		max_credits (ndarray): `(K, N, C)` int64, the `maxCredits` of each category.
+		total_credits (ndarray): `(K, N, C)` int64, the `totalCredits` of each category.
+		gpa (list): `N` lists of the `C` category GPAs followed by the overall GPA
+			(GPAs do not depend on the parameters).
+	"""
+
+	def __init__(self, params: list[tuple[float, float]], users: list[int], max_credits, total_credits, gpa: list[list[float]]):
+		self.params = params
+		self.users = users
+		self.max_credits = max_credits
+		self.total_credits = total_credits
+		self.gpa = gpa
+
+	def transcript(self, row: int, k: int = 0) -> dict:
+		"""
+		The figures of user `row` for parameter set `k`, shaped like the `transcript` of
+		`compute_transcript` without its project lists and piscine date.
+		"""
+		transcript = {}
+		for c, tcat in enumerate(CATEGORIES):
+			transcript[tcat] = {
+				'maxCredits': int(self.max_credits[k, row, c]),
+				'totalCredits': int(self.total_credits[k, row, c]),
+				'gpa': self.gpa[row][c],
+			}
+		transcript['maxCredits'] = int(self.max_credits[k, row].sum())
+		transcript['totalCredits'] = int(self.total_credits[k, row].sum())
+		transcript['gpa'] = self.gpa[row][-1]
+		return transcript
+
+
+class CreditEngine:
+	"""
+	Array-backed credit and GPA computation, for many users and many `(mult, exp)` at once.
+
+	The catalogue is held as columns (project id, raw base, category) and the users' graded
+	projects as one flat CSR-like table (catalogue column and mark of each entry, with the
+	offsets of each user's rows), so a parameter set costs a handful of array operations
+	whatever the number of users.
+
+	Results are identical to `compute_transcript`: the projects are selected by the same
+	`graded_projects`, base credits go through `project_credits` (once per catalogue project),
+	credits use the same float operations (`ceil(mark / 100 * base)`, capped by `base`), sums
+	are exact integer sums, and GPAs are rounded with Python's `round`.
+	"""
+
+	def __init__(self, index: dict[int, dict] | None = None):
+		index = get_catalogue().index() if index is None else index
+		pids = sorted(index)
+		self.bases = [index[pid]['project']['base'] for pid in pids]
+		self.categories = np.array([CATEGORIES.index(index[pid]['category']) for pid in pids], dtype=np.int64)
+		self._columns = {pid: i for i, pid in enumerate(pids)}
+		self.users: list[int] = []
+		self._offsets = [0]
+		self._cols: list[int] = []
+		self._marks: list[int] = []
+		self._arrays = None
+
+	def add_user(self, me: dict) -> int:
+		"""
+		Add the graded projects of a trimmed profile. Returns the user's row.
+		"""
+		for pid, project in graded_projects(me).items():
+			if (col := self._columns.get(pid)) is not None:
+				self._cols.append(col)
+				self._marks.append(project['mark'])
+		self.users.append(me['id'])
+		self._offsets.append(len(self._cols))
+		self._arrays = None
+		return len(self.users) - 1
+
+	def base_credits(self, mult: float = DEFAULT_MULT, exp: float = DEFAULT_EXP):
+		# Scalar on purpose: a vectorised `pow` is not guaranteed to round like `math`'s
+		return np.array([project_credits(base, mult, exp) for base in self.bases], dtype=np.int64)
+
+	def _columnar(self):
+		if self._arrays is None:
+			cols = np.array(self._cols, dtype=np.int64)
+			counts = np.diff(np.array(self._offsets, dtype=np.int64))
+			rows = np.repeat(np.arange(len(self.users), dtype=np.int64), counts)
+			# One bucket per (user, category)
+			groups = rows * len(CATEGORIES) + self.categories[cols]
+			self._arrays = cols, np.array(self._marks, dtype=np.int64), groups
+		return self._arrays
+
+	def _sum(self, groups, values):
+		size = len(self.users) * len(CATEGORIES)
+		# Float64 bincount is exact for integers below 2**53
+		return np.bincount(groups, weights=values, minlength=size).astype(np.int64).reshape(len(self.users), len(CATEGORIES))
+
+	def compute(self, params: list[tuple[float, float]] | None = None) -> CreditResults:
+		"""
+		Compute every user's credits for each `(mult, exp)` of `params` (defaults to the
+		default parameters only), and their GPAs.
+		"""
+		params = [(DEFAULT_MULT, DEFAULT_EXP)] if params is None else list(params)
+		cols, marks, groups = self._columnar()
+		shape = (len(params), len(self.users), len(CATEGORIES))
+		max_credits = np.empty(shape, dtype=np.int64)
+		total_credits = np.empty(shape, dtype=np.int64)
+		for k, (mult, exp) in enumerate(params):
+			base = self.base_credits(mult, exp)[cols]
+			credits = np.minimum(np.ceil(marks / 100 * base).astype(np.int64), base)
+			max_credits[k] = self._sum(groups, base)
+			total_credits[k] = self._sum(groups, credits)
+
+		mark_sums = self._sum(groups, marks).tolist()
+		counts = self._sum(groups, np.ones_like(marks)).tolist()
+		gpa = []
+		for sums, count in zip(mark_sums, counts):
+			gpa.append(
+				[round(float(s) / c, 2) if c else 0.0 for s, c in zip(sums, count)]
+				+ [round(float(sum(sums)) / sum(count), 2) if sum(count) else 0.0]
+			)
+		return CreditResults(params, list(self.users), max_credits, total_credits, gpa)
@@ -0,0 +1,211 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .config import get_config
+from .httpclient import get_client
+from .metrics import REGISTRY
+
+
+# Headers kept with a cached body: the ones callers read, and the validators
+KEPT_HEADERS = ('Content-Type', 'Cache-Control', 'ETag', 'Last-Modified', 'Date', 'Link', 'X-Total', 'X-Per-Page', 'X-Page')
+
+# Headers a 304 may update
+REVALIDATED_HEADERS = ('Cache-Control', 'ETag', 'Last-Modified', 'Date')
+
+PUBLIC_SCOPE = ''
+
+
+def parse_cache_control(value: str | None) -> dict[str, str | None]:
+	directives = {}
+	for part in (value or '').split(','):
+		name, _, arg = part.strip().partition('=')
+		if name:
+			directives[name.lower()] = arg.strip().strip('"') if arg else None
+	return directives
+
+
+def _max_age(headers) -> float:
+	"""
+	Seconds a response stays fresh, from its `Cache-Control` (0 when it must be revalidated).
+	There is no heuristic freshness: marks must be current, so without `max-age` every read is
+	revalidated.
+	"""
+	cc = parse_cache_control(headers.get('Cache-Control'))
+	if 'no-cache' in cc:
+		return 0.0
+	try:
+		max_age = float(cc.get('max-age') or 0)
+		age = float(headers.get('Age') or 0)
+	except ValueError:
+		return 0.0
+	return max(0.0, max_age - age)
+
+
+def cache_scope(sess: dict) -> str:
+	"""
+	Private cache scope of a session: its user once known, its token before that.
+	"""
+	if (uid := sess.get('uid')) is not None:
+		return f'uid:{uid}'
+	return 'token:' + hashlib.sha256(str(sess.get('token')).encode('utf-8')).hexdigest()[:32]
+
+
+class CachedResponse:
+	def __init__(self, url: str, headers: dict[str, str], body: bytes, expires: float):
+		self.url = url
+		self.headers = headers
+		self.body = body
+		self.expires = expires
+		self.size = len(url) + len(body) + sum(len(k) + len(v) for k, v in headers.items())
+
+	def response(self) -> requests.Response:
+		res = requests.Response()
+		res.status_code = 200
+		res.reason = 'OK'
+		res.url = self.url
+		res.headers = CaseInsensitiveDict(self.headers)
+		res.encoding = get_encoding_from_headers(res.headers)
+		res._content = self.body
+		return res
+
+
+class ResponseCache:
+	"""
+	Per-process HTTP cache of the GET responses of the 42 API, bounded by size and evicting the
+	least recently used entries.
+
+	Responses are stored by URL and scope (the user or token they were fetched with), or under
+	the shared public scope when marked `Cache-Control: public`. A fresh entry (`max-age` not
+	elapsed) is served without any request. A stale one is revalidated with `If-None-Match`
+	and `If-Modified-Since`, and a 304 answered with the stored body. `no-store` responses, and
+	responses that have neither a validator nor a `max-age`, are never stored.
+	"""
+
+	def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+		self.max_bytes = max_bytes
+		self.bytes = 0
+		self.fresh = 0
+		self.revalidated = 0
+		self.misses = 0
+		self.evictions = 0
+		self._entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _lookup(self, url: str, scope: str) -> tuple[tuple[str, str], CachedResponse] | tuple[None, None]:
+		with self._lock:
+			for key in ((scope, url), (PUBLIC_SCOPE, url)):
+				if (entry := self._entries.get(key)) is not None:
+					self._entries.move_to_end(key)
+					return key, entry
+		return None, None
+
+	def _store(self, key: tuple[str, str], entry: CachedResponse) -> None:
+		with self._lock:
+			if (old := self._entries.pop(key, None)) is not None:
+				self.bytes -= old.size
+			# A single response may not take more than a quarter of the cache
+			if entry.size > self.max_bytes // 4:
+				return
+			self._entries[key] = entry
+			self.bytes += entry.size
+			while self.bytes > self.max_bytes:
+				_, evicted = self._entries.popitem(last=False)
+				self.bytes -= evicted.size
+				self.evictions += 1
+
+	def _drop(self, key: tuple[str, str]) -> None:
+		with self._lock:
+			if (old := self._entries.pop(key, None)) is not None:
+				self.bytes -= old.size
+
+	def get(self, url: str, headers: dict[str, str], scope: str) -> requests.Response:
+		"""
+		GET `url` through the cache.
+
+		Raises:
+			requests.RequestException: As `HttpClient.get`.
+		"""
+		if self.max_bytes <= 0:
+			return get_client().get(url, headers=headers)
+
+		key, entry = self._lookup(url, scope)
+		if entry is not None and entry.expires > time.monotonic():
+			with self._lock:
+				self.fresh += 1
+			return entry.response()
+
+		conditional = dict(headers)
+		if entry is not None:
+			if 'ETag' in entry.headers:
+				conditional['If-None-Match'] = entry.headers['ETag']
+			if 'Last-Modified' in entry.headers:
+				conditional['If-Modified-Since'] = entry.headers['Last-Modified']
+		res = get_client().get(url, headers=conditional)
+
+		if res.status_code == 304 and entry is not None:
+			with self._lock:
+				entry.headers = entry.headers | {h: res.headers[h] for h in REVALIDATED_HEADERS if h in res.headers}
+				entry.expires = time.monotonic() + _max_age(res.headers)
+				self.revalidated += 1
+			return entry.response()
+
+		with self._lock:
+			self.misses += 1
+		if res.status_code in (404, 410) and key is not None:
+			self._drop(key)
+		elif res.status_code == 200:
+			self._put(url, scope, res)
+		return res
+
+	def _put(self, url: str, scope: str, res: requests.Response) -> None:
+		cc = parse_cache_control(res.headers.get('Cache-Control'))
+		max_age = _max_age(res.headers)
+		validated = 'ETag' in res.headers or 'Last-Modified' in res.headers
+		if 'no-store' in cc or res.headers.get('Vary', '').strip() == '*' or not (validated or max_age > 0):
+			return
+		key = (PUBLIC_SCOPE if 'public' in cc and 'private' not in cc else scope, url)
+		headers = {h: res.headers[h] for h in KEPT_HEADERS if h in res.headers}
+		self._store(key, CachedResponse(url, headers, res.content, time.monotonic() + max_age))
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				'entries': len(self._entries),
+				'bytes': self.bytes,
+				'max_bytes': self.max_bytes,
+				'fresh': self.fresh,
+				'revalidated': self.revalidated,
+				'misses': self.misses,
+				'evictions': self.evictions,
+			}
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> ResponseCache:
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			_cache = ResponseCache(max_bytes=get_config().http_cache_size)
+		return _cache
+
+
+@REGISTRY.collector
+def _collect() -> dict:
+	if _cache is None:
+		return {}
+	stats = _cache.stats()
+	return {
+		'ft_upstream_cache_fresh_total': ('42 API GETs served from the response cache without a request by this worker.', stats['fresh']),
+		'ft_upstream_cache_revalidated_total': ('42 API GETs answered 304 and served from the response cache by this worker.', stats['revalidated']),
+		'ft_upstream_cache_misses_total': ('42 API GETs downloaded in full by this worker.', stats['misses']),
+		'ft_upstream_cache_evictions_total': ('Response cache entries evicted by this worker.', stats['evictions']),
+		'ft_upstream_cache_bytes': ('Size of the response cache of this worker.', stats['bytes']),
+	}
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+import http.cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import get_config
+from .ratelimit import RateLimiter, RateLimited, get_limiter
+from .metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS, UPSTREAM_RETRIES
+
+
+def upstream_error(e: requests.RequestException) -> dict:
+	"""
+	Error dict of a failed upstream request: 429 when the rate limiter gave up, 504 on a
+	timeout, 502 otherwise.
+	"""
+	if isinstance(e, RateLimited):
+		return {
+			'status_code': 429,
+			'error': 'Too Many Requests',
+			'text': str(e),
+		}
+	timeout = isinstance(e, requests.Timeout)
+	return {
+		'status_code': 504 if timeout else 502,
+		'error': 'Gateway Timeout' if timeout else 'Bad Gateway',
+		'text': f'[{e.__class__.__name__}] {e}',
+	}
+
+
+class HttpClient:
+	"""
+	Keep-alive HTTP client shared by every upstream call of a worker.
+
+	Connections are pooled per host, every request gets a connect/read timeout, and
+	connection errors (raised before the request reaches the server, so safe for POSTs too)
+	are retried with exponential backoff. Cookies are never stored, since the client is
+	shared between users.
+
+	When a `limiter` is given, every request first waits for a slot in it, and 429 answers
+	are retried for as long as the limiter's deadline allows.
+	"""
+
+	def __init__(
+			self,
+			pool_size: int = 10,
+			connect_timeout: float = 5,
+			read_timeout: float = 30,
+			retries: int = 3,
+			backoff: float = 0.5,
+			limiter: RateLimiter | None = None,
+			):
+		self.limiter = limiter
+		self.timeout = (connect_timeout, read_timeout)
+		self.session = requests.Session()
+		self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+		adapter = HTTPAdapter(
+			pool_connections=pool_size,
+			pool_maxsize=pool_size,
+			max_retries=Retry(
+				total=retries,
+				connect=retries,
+				read=0,
+				status=0,
+				other=0,
+				backoff_factor=backoff,
+				raise_on_status=False,
+			),
+		)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+
+	def request(self, method: str, url: str, **kwargs) -> requests.Response:
+		kwargs.setdefault('timeout', self.timeout)
+		if self.limiter is None:
+			return self._send(method, url, **kwargs)
+
+		start = time.monotonic()
+		while True:
+			self.limiter.acquire(self.limiter.deadline - (time.monotonic() - start))
+			res = self._send(method, url, **kwargs)
+			self.limiter.feedback(res)
+			if res.status_code != 429:
+				return res
+			UPSTREAM_RETRIES.inc(reason='429')
+
+	def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+		start = time.perf_counter()
+		try:
+			res = self.session.request(method, url, **kwargs)
+		except requests.RequestException:
+			UPSTREAM_REQUESTS.inc(method=method, status='error')
+			raise
+		finally:
+			UPSTREAM_SECONDS.observe(time.perf_counter() - start, method=method)
+		UPSTREAM_REQUESTS.inc(method=method, status=res.status_code)
+		if history := getattr(getattr(res.raw, 'retries', None), 'history', None):
+			UPSTREAM_RETRIES.inc(len(history), reason='connection')
+		return res
+
+	def get(self, url: str, **kwargs) -> requests.Response:
+		return self.request('GET', url, **kwargs)
+
+	def post(self, url: str, **kwargs) -> requests.Response:
+		return self.request('POST', url, **kwargs)
+
+	def close(self) -> None:
+		self.session.close()
+
+
+_client: HttpClient | None = None
+_client_pid: int | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+	"""
+	Return the HTTP client of the current process, creating it on first use.
+	Sockets must not be shared across a fork, hence one client per PID.
+	"""
+	global _client, _client_pid
+	with _client_lock:
+		if _client is None or _client_pid != os.getpid():
+			config = get_config()
+			_client = HttpClient(
+				pool_size=config.http_pool_size,
+				connect_timeout=config.http_connect_timeout,
+				read_timeout=config.http_read_timeout,
+				retries=config.http_retries,
+				backoff=config.http_backoff,
+				limiter=get_limiter(),
+			)
+			_client_pid = os.getpid()
+		return _client
@@ -0,0 +1,162 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+
+from .config import get_config
+from .connections import Connections
+from .transcript import get_transcript_data, get_transcript_pdf
+from .log import get_logger
+
+
+log = get_logger('jobs')
+
+
+class JobStore:
+	"""
+	SQLite (WAL) table of transcript jobs, so that any worker can report the status of a
+	job or serve its result, whichever worker runs it.
+
+	A job record:
+		{
+			'id': str,
+			'owner': int,           # 42 user id
+			'status': str,          # 'queued' | 'running' | 'done' | 'error'
+			'created': float,
+			'updated': float,
+			'path': str | None,     # path of the PDF in the PDF cache, once done
+			'name': str | None,     # download name, once done
+			'error': str | None,
+		}
+	"""
+
+	def __init__(self, path: str, timeout: float = 120, ttl: float = 3600):
+		self.path = path
+		self.timeout = timeout
+		self.ttl = ttl
+		self._connections = Connections(self.path, self._setup)
+
+	@staticmethod
+	def _setup(db: sqlite3.Connection) -> None:
+		db.row_factory = sqlite3.Row
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS jobs ('
+			'id TEXT PRIMARY KEY, owner INTEGER NOT NULL, status TEXT NOT NULL, '
+			'created REAL NOT NULL, updated REAL NOT NULL, path TEXT, name TEXT, error TEXT)'
+		)
+		db.execute('CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, status)')
+
+	def _db(self) -> sqlite3.Connection:
+		return self._connections.get()
+
+	def claim(self, owner: int) -> tuple[str, bool]:
+		"""
+		Return the in-flight job of `owner`, or create a new one.
+
+		Returns:
+			tuple: `(job_id, created)`.
+		"""
+		now = time.time()
+		with self._connections.transaction() as db:
+			db.execute('DELETE FROM jobs WHERE updated < ?', (now - self.ttl,))
+			# A job not updated for `timeout` seconds belongs to a dead worker
+			row = db.execute(
+				"SELECT id FROM jobs WHERE owner = ? AND status IN ('queued', 'running') AND updated >= ?",
+				(owner, now - self.timeout),
+			).fetchone()
+			if row is not None:
+				return row['id'], False
+			job_id = uuid.uuid4().hex
+			db.execute(
+				"INSERT INTO jobs (id, owner, status, created, updated) VALUES (?, ?, 'queued', ?, ?)",
+				(job_id, owner, now, now),
+			)
+		return job_id, True
+
+	def update(self, job_id: str, **fields) -> None:
+		fields['updated'] = time.time()
+		self._db().execute(
+			f'UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?',
+			(*fields.values(), job_id),
+		)
+
+	def get(self, job_id: str) -> dict | None:
+		row = self._db().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+		if row is None:
+			return None
+		job = dict(row)
+		if job['status'] in ('queued', 'running') and job['updated'] < time.time() - self.timeout:
+			job['status'] = 'error'
+			job['error'] = 'The job timed out.'
+		return job
+
+
+def build_transcript(sess: dict) -> dict:
+	"""
+	Fetch the transcript data of `sess` and render its PDF into the PDF cache.
+
+	Returns:
+		dict: `{'path': str, 'name': str}`, or the API error dict.
+	"""
+	data = get_transcript_data(sess)
+	if 'error' in data:
+		return data
+	path, temporary, _ = get_transcript_pdf(data)
+	if temporary:
+		os.remove(path)
+		return {'error': 'The transcript PDF is too large to be cached.'}
+	return {'path': path, 'name': f'{data['name']}.pdf'}
+
+
+class JobManager:
+	"""
+	Runs transcript builds on a thread pool, outside of the HTTP request.
+	Requests for a user who already has a job in flight are coalesced onto that job.
+	"""
+
+	def __init__(self, store: JobStore, workers: int = 2):
+		self.store = store
+		self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+
+	def submit(self, app: Flask, sess: dict) -> str:
+		job_id, created = self.store.claim(sess['uid'])
+		if created:
+			self._executor.submit(self._run, app, job_id, dict(sess))
+		return job_id
+
+	def _run(self, app: Flask, job_id: str, sess: dict) -> None:
+		self.store.update(job_id, status='running')
+		try:
+			with app.app_context():
+				res = build_transcript(sess)
+		except Exception as e:
+			log.exception("Transcript job %s failed.", job_id)
+			res = {'error': f'[{e.__class__.__name__}] {e}'}
+		if 'error' in res:
+			self.store.update(job_id, status='error', error=str(res.get('text') or res['error']))
+		else:
+			self.store.update(job_id, status='done', path=res['path'], name=res['name'])
+
+	def get(self, job_id: str) -> dict | None:
+		return self.store.get(job_id)
+
+
+_manager: JobManager | None = None
+_manager_pid: int | None = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> JobManager:
+	global _manager, _manager_pid
+	with _manager_lock:
+		if _manager is None or _manager_pid != os.getpid():
+			config = get_config()
+			_manager = JobManager(
+				JobStore(path=config.job_db, timeout=config.job_timeout),
+				workers=config.job_workers,
+			)
+			_manager_pid = os.getpid()
+		return _manager
@@ -0,0 +1,243 @@
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from .config import Config, get_config
+
+
+SECRET_KEYS = ('token', 'access_token', 'refresh', 'refresh_token', 'client_secret', 'secret', 'code', 'password', 'authorization')
+SECRET_PATTERN = re.compile(r'(Bearer\s+)([^\s\'"]+)', re.IGNORECASE)
+
+# Attributes of every LogRecord, anything else was passed through `extra` and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: logging.handlers.QueueListener | None = None
+_handler: 'DroppingQueueHandler | None' = None
+_setup_config: Config | None = None
+_restart_pending = False
+_restart_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+	return logging.getLogger(f'ft.{name}')
+
+
+def mask(value) -> str:
+	"""
+	Keep just enough of a secret to correlate log lines: `abcd…(64)`.
+	"""
+	if value is None:
+		return 'None'
+	value = str(value)
+	return f'{value[:4]}…({len(value)})' if len(value) > 8 else '***'
+
+
+class Payload:
+	"""
+	Lazy, size-bounded summary of an API payload, for `%s` arguments of log calls.
+
+	Nothing is computed unless the record is actually emitted, and then the payload is only
+	walked until `limit` characters are produced, so a full `/v2/me` costs the same as a
+	small one. Values of secret keys are masked.
+	"""
+
+	def __init__(self, payload, limit: int | None = None):
+		self.payload = payload
+		self.limit = limit
+
+	def __str__(self) -> str:
+		out = []
+		budget = [get_config().log_payload_limit if self.limit is None else self.limit]
+		try:
+			self._dump(self.payload, out, budget)
+		except _Truncated:
+			out.append(f'… ({self._size()})')
+		return ''.join(out)
+
+	def _size(self) -> str:
+		if isinstance(self.payload, dict) and isinstance(self.payload.get('data'), list):
+			return f"{len(self.payload['data'])} items"
+		if isinstance(self.payload, (dict, list)):
+			return f'{len(self.payload)} entries'
+		return 'truncated'
+
+	def _emit(self, s: str, out: list, budget: list) -> None:
+		if len(s) > budget[0]:
+			out.append(s[:budget[0]])
+			raise _Truncated()
+		budget[0] -= len(s)
+		out.append(s)
+
+	def _dump(self, value, out: list, budget: list) -> None:
+		if isinstance(value, dict):
+			self._emit('{', out, budget)
+			for i, (k, v) in enumerate(value.items()):
+				self._emit(f'{", " if i else ""}{json.dumps(str(k), ensure_ascii=False)}: ', out, budget)
+				if str(k).lower() in SECRET_KEYS and isinstance(v, str):
+					self._emit(json.dumps(mask(v), ensure_ascii=False), out, budget)
+				else:
+					self._dump(v, out, budget)
+			self._emit('}', out, budget)
+		elif isinstance(value, (list, tuple)):
+			self._emit('[', out, budget)
+			for i, v in enumerate(value):
+				if i:
+					self._emit(', ', out, budget)
+				self._dump(v, out, budget)
+			self._emit(']', out, budget)
+		elif isinstance(value, str):
+			self._emit(json.dumps(value[:budget[0] + 2], ensure_ascii=False), out, budget)
+		else:
+			self._emit(json.dumps(value, ensure_ascii=False, default=str), out, budget)
+
+
+class _Truncated(Exception):
+	pass
+
+
+class RedactingFilter(logging.Filter):
+	"""
+	Mask bearer tokens and the configured secrets in the final message.
+	"""
+
+	def __init__(self, secrets: list[str]):
+		super().__init__()
+		self.secrets = [s for s in secrets if s and len(s) >= 4]
+
+	def filter(self, record: logging.LogRecord) -> bool:
+		message = SECRET_PATTERN.sub(lambda m: m.group(1) + mask(m.group(2)), record.getMessage())
+		for secret in self.secrets:
+			message = message.replace(secret, '***')
+		record.msg, record.args = message, None
+		return True
+
+
+class TextFormatter(logging.Formatter):
+	def __init__(self):
+		super().__init__('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+	def format(self, record: logging.LogRecord) -> str:
+		line = super().format(record)
+		fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+		if fields:
+			line += ' ' + ' '.join(f'{k}={v}' for k, v in fields.items())
+		return line
+
+
+class JsonFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		entry = {
+			'time': round(record.created, 3),
+			'level': record.levelname,
+			'logger': record.name,
+			'pid': record.process,
+			'message': record.getMessage(),
+		}
+		entry |= {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+		if record.exc_text:
+			entry['exc'] = record.exc_text
+		return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+	"""
+	Queue handler that never blocks the caller: when the writer falls behind and the queue
+	is full, records are dropped and counted, and the count is reported once it drains.
+	"""
+
+	def __init__(self, q: queue.Queue):
+		super().__init__(q)
+		self.dropped = 0
+
+	def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+		# Redaction already merged the arguments into `msg`; only the traceback still has to be
+		# rendered here, as it cannot cross the queue
+		if record.exc_info:
+			record.exc_text = logging.Formatter().formatException(record.exc_info)
+			record.exc_info = None
+		return record
+
+	def enqueue(self, record: logging.LogRecord) -> None:
+		if _restart_pending and (handler := _writer_handler()) is not self:
+			handler.enqueue(record)
+			return
+		try:
+			if self.dropped and self.queue.qsize() < self.queue.maxsize // 2:
+				dropped, self.dropped = self.dropped, 0
+				self.queue.put_nowait(logging.makeLogRecord({
+					'name': 'ft.log', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+					'msg': 'Dropped %d log records, the log writer is too slow.', 'args': (dropped,),
+				}))
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+
+
+def setup_logging(config: Config) -> None:
+	"""
+	Route the `ft.*` loggers through a bounded queue to a background writer thread.
+	The level, format and payload size come from `LOG_LEVEL`, `LOG_FORMAT` and `LOG_PAYLOAD_LIMIT`.
+	"""
+	global _listener, _handler, _setup_config
+	stop_logging()
+	_setup_config = config
+
+	level = config.log_level or ('DEBUG' if config.debug else 'INFO')
+	stream = logging.StreamHandler(sys.stderr)
+	stream.setFormatter(JsonFormatter() if config.log_format == 'json' else TextFormatter())
+
+	_handler = DroppingQueueHandler(queue.Queue(maxsize=10_000))
+	_handler.addFilter(RedactingFilter([config.ft_secret, config.secret_key, config.metrics_token]))
+	_listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+	_listener.start()
+
+	logger = logging.getLogger('ft')
+	logger.handlers = [_handler]
+	logger.setLevel(level)
+	logger.propagate = False
+
+
+def stop_logging() -> None:
+	"""
+	Flush the queue and stop the writer thread.
+	"""
+	global _listener
+	if _listener is not None:
+		try:
+			_listener.stop()
+		except Exception:
+			pass
+		_listener = None
+
+
+def _writer_handler() -> DroppingQueueHandler:
+	"""
+	The handler to enqueue to, after starting the writer of a forked child on its first record.
+	"""
+	global _restart_pending
+	with _restart_lock:
+		if _restart_pending:
+			_restart_pending = False
+			setup_logging(_setup_config)
+	return _handler
+
+
+def _restart_after_fork() -> None:
+	# The writer thread does not survive a fork (e.g. gunicorn workers): the child gets its own
+	# on its first record. Not here: under gevent, starting a thread yields to the hub, which
+	# would run the parent's greenlets in a child that `subprocess` is about to exec
+	global _listener, _restart_pending, _restart_lock
+	if _listener is not None:
+		_listener = None
+		_restart_lock = threading.Lock()
+		_restart_pending = True
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
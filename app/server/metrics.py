@@ -0,0 +1,155 @@
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+	pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+	if value == float('inf'):
+		return '+Inf'
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+	def __init__(self, name: str, help: str, labels: tuple = ()):
+		self.name = name
+		self.help = help
+		self.labels = labels
+		self._values: dict[tuple, float] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, amount: float = 1, **labels) -> None:
+		key = tuple(labels.get(n, '') for n in self.labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def render(self) -> list[str]:
+		lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+		with self._lock:
+			for key, value in self._values.items():
+				lines.append(f'{self.name}{_labels(self.labels, key)} {_number(value)}')
+		return lines
+
+
+class Histogram:
+	def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+		self.name = name
+		self.help = help
+		self.labels = labels
+		self.buckets = tuple(sorted(buckets))
+		self._values: dict[tuple, list] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, **labels) -> None:
+		key = tuple(labels.get(n, '') for n in self.labels)
+		with self._lock:
+			# [per-bucket counts..., sum, count]
+			entry = self._values.get(key)
+			if entry is None:
+				entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					entry[i] += 1
+					break
+			entry[-2] += value
+			entry[-1] += 1
+
+	@contextmanager
+	def time(self, **labels):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(time.perf_counter() - start, **labels)
+
+	def timed(self, **labels):
+		"""
+		Decorator observing the duration of every call of the decorated function.
+		"""
+		def decorator(fn):
+			@wraps(fn)
+			def wrapper(*args, **kwargs):
+				with self.time(**labels):
+					return fn(*args, **kwargs)
+			return wrapper
+		return decorator
+
+	def render(self) -> list[str]:
+		lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+		with self._lock:
+			for key, entry in self._values.items():
+				cumulative = 0
+				for bound, count in zip(self.buckets, entry):
+					cumulative += count
+					lines.append(f'{self.name}_bucket{_labels(self.labels, key, f'le="{_number(float(bound))}"')} {cumulative}')
+				lines.append(f'{self.name}_bucket{_labels(self.labels, key, 'le="+Inf"')} {entry[-1]}')
+				lines.append(f'{self.name}_sum{_labels(self.labels, key)} {_number(entry[-2])}')
+				lines.append(f'{self.name}_count{_labels(self.labels, key)} {entry[-1]}')
+		return lines
+
+
+class Registry:
+	"""
+	Process-local metrics registry rendered in the Prometheus text format.
+
+	Besides counters and histograms, collectors can be registered: callables returning
+	`{name: (help, value)}` of values sampled at scrape time. Values named `*_total` are
+	running counts (cache hits, renders...) and exported as counters, the others as gauges
+	(pool sizes, queue depths...).
+	"""
+
+	def __init__(self):
+		self.metrics: list[Counter | Histogram] = []
+		self.collectors: list = []
+
+	def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+		self.metrics.append(metric := Counter(name, help, labels))
+		return metric
+
+	def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+		self.metrics.append(metric := Histogram(name, help, labels, buckets))
+		return metric
+
+	def collector(self, fn):
+		self.collectors.append(fn)
+		return fn
+
+	def render(self) -> str:
+		lines = []
+		for metric in self.metrics:
+			lines += metric.render()
+		for collect in self.collectors:
+			try:
+				values = collect()
+			except Exception:
+				continue
+			for name, (help, value) in values.items():
+				kind = 'counter' if name.endswith('_total') else 'gauge'
+				lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {_number(value)}']
+		return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter('ft_http_requests_total', 'HTTP requests served, by endpoint and status.', ('endpoint', 'method', 'status'))
+HTTP_SECONDS = REGISTRY.histogram('ft_http_request_seconds', 'Time spent serving HTTP requests.', ('endpoint',))
+STAGE_SECONDS = REGISTRY.histogram('ft_stage_seconds', 'Time spent in each stage of the transcript pipeline.', ('stage',))
+UPSTREAM_REQUESTS = REGISTRY.counter('ft_upstream_requests_total', 'Requests sent to the 42 API, by method and status.', ('method', 'status'))
+UPSTREAM_SECONDS = REGISTRY.histogram('ft_upstream_request_seconds', 'Latency of the requests sent to the 42 API.', ('method',))
+UPSTREAM_RETRIES = REGISTRY.counter('ft_upstream_retries_total', 'Retried 42 API requests, by reason.', ('reason',))
+TOKEN_REFRESHES = REGISTRY.counter('ft_token_refreshes_total', 'OAuth token refreshes, by result.', ('result',))
+PROFILE_FETCHES = REGISTRY.counter('ft_profile_fetches_total', 'User profiles fetched from the 42 API, in full or as a delta.', ('kind',))
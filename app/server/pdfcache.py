@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from .config import get_config
+from .metrics import REGISTRY
+
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client', 'html', 'transcript.html')
+# The fixed wording of both engines
+WORDING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wording.py')
+# What the native engine draws with, instead of the template
+NATIVE_PATHS = (*(os.path.join(os.path.dirname(os.path.abspath(__file__)), f) for f in ('pdflayout.py', 'pdfwriter.py')), WORDING_PATH)
+
+VOLATILE_KEYS = ('name', 'date')
+
+# Age after which a temporary file is considered abandoned (renders are bounded by RENDER_TIMEOUT)
+TMP_TTL = 3600
+
+_template_digests: dict[str, tuple[int, str]] = {}
+
+
+def _template_digest(path: str = TEMPLATE_PATH) -> str:
+	"""
+	Digest of the transcript template (or another file it renders from), recomputed only when its mtime changes.
+	Empty for a missing file.
+	"""
+	try:
+		mtime = os.stat(path).st_mtime_ns
+	except OSError:
+		return ''
+	if _template_digests.get(path, (None,))[0] != mtime:
+		with open(path, 'rb') as f:
+			_template_digests[path] = (mtime, hashlib.sha256(f.read()).hexdigest())
+	return _template_digests[path][1]
+
+
+def _engine_digest() -> str:
+	"""
+	Digest of what the configured PDF engine renders from: the template and its wording, or the
+	native layout and its fonts.
+	"""
+	config = get_config()
+	if config.pdf_engine == 'native':
+		# Font contents, not paths: a font replaced in place changes the PDFs too
+		return '\0'.join(('native', *map(_template_digest, NATIVE_PATHS + config.pdf_fonts)))
+	return '\0'.join((_template_digest(), _template_digest(WORDING_PATH)))
+
+
+class PdfCache:
+	"""
+	Size-bounded, content-addressed on-disk cache of rendered transcripts.
+
+	Entries are `<key>.pdf` files. The mtime of a file is its creation time (used for TTL
+	expiry) and its atime is explicitly bumped on every hit (used for LRU eviction), so the
+	cache works across gunicorn workers sharing the same directory.
+	"""
+
+	def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, ttl: float = 86400):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._lock = threading.Lock()
+		os.makedirs(self.directory, exist_ok=True)
+
+	@staticmethod
+	def key(data: dict) -> str:
+		"""
+		Stable hash of the transcript data (minus volatile fields), the PDF engine and its template, and the app version.
+		"""
+		stable = {k: v for k, v in data.items() if k not in VOLATILE_KEYS}
+		h = hashlib.sha256()
+		h.update(json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+		h.update(b'\0' + _engine_digest().encode())
+		h.update(b'\0' + get_config().version.encode())
+		return h.hexdigest()
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, f'{key}.pdf')
+
+	def get(self, key: str) -> str | None:
+		"""
+		Return the path of the cached PDF for `key`, or None on a miss.
+		"""
+		path = self._path(key)
+		now = time.time()
+		try:
+			st = os.stat(path)
+			if st.st_mtime + self.ttl < now:
+				os.remove(path)
+				raise FileNotFoundError(path)
+			os.utime(path, (now, st.st_mtime))
+		except OSError:
+			with self._lock:
+				self.misses += 1
+			return None
+		with self._lock:
+			self.hits += 1
+		return path
+
+	def tempfile(self) -> tuple[int, str]:
+		"""
+		Create a temporary file in the cache directory to render into, see `commit`.
+
+		Returns:
+			tuple: `(fd, path)` as `tempfile.mkstemp`.
+		"""
+		return tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+	def commit(self, key: str, tmp: str) -> str | None:
+		"""
+		Move the rendered temporary file `tmp` into the cache under `key` and return its path.
+		Returns None, leaving `tmp` in place, if it does not fit in the cache.
+		"""
+		size = os.path.getsize(tmp)
+		if size > self.max_bytes:
+			return None
+		self.evict(reserve=size)
+		os.replace(tmp, self._path(key))
+		return self._path(key)
+
+	def evict(self, reserve: int = 0) -> None:
+		"""
+		Drop expired entries and abandoned temporary files, then least recently used entries
+		until `reserve` more bytes fit.
+		"""
+		now = time.time()
+		entries = []
+		total = 0
+		removed = 0
+		with os.scandir(self.directory) as it:
+			for entry in it:
+				if not entry.name.endswith(('.pdf', '.tmp')):
+					continue
+				try:
+					st = entry.stat()
+				except OSError:
+					continue
+				if entry.name.endswith('.tmp'):
+					# Left behind by a crashed worker
+					if st.st_mtime + TMP_TTL < now:
+						try:
+							os.remove(entry.path)
+						except OSError:
+							pass
+					continue
+				if st.st_mtime + self.ttl < now:
+					try:
+						os.remove(entry.path)
+						removed += 1
+					except OSError:
+						pass
+					continue
+				entries.append((st.st_atime, st.st_size, entry.path))
+				total += st.st_size
+		entries.sort()
+		for _, size, path in entries:
+			if total + reserve <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+				removed += 1
+			except OSError:
+				pass
+			total -= size
+		with self._lock:
+			self.evictions += removed
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+				'max_bytes': self.max_bytes,
+				'ttl': self.ttl,
+			}
+
+
+_cache: PdfCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> PdfCache:
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			config = get_config()
+			_cache = PdfCache(
+				directory=config.pdf_cache_dir,
+				max_bytes=config.pdf_cache_size,
+				ttl=config.pdf_cache_ttl,
+			)
+		return _cache
+
+
+@REGISTRY.collector
+def _collect() -> dict:
+	if _cache is None:
+		return {}
+	stats = _cache.stats()
+	return {
+		'ft_pdf_cache_hits_total': ('PDF cache hits of this worker.', stats['hits']),
+		'ft_pdf_cache_misses_total': ('PDF cache misses of this worker.', stats['misses']),
+		'ft_pdf_cache_evictions_total': ('PDF cache entries evicted by this worker.', stats['evictions']),
+	}
@@ -0,0 +1,516 @@
+import os
+import threading
+from html import escape
+from html.parser import HTMLParser
+from typing import BinaryIO
+
+from .config import get_config
+from .pdfwriter import PdfDocument, PdfError, Font, StandardFont, TrueTypeFont, PngImage
+from .log import get_logger
+from .wording import TITLE, TORN, RRN, NOTES, STAGES, JURY, FOOTNOTES, CREDIT, PURPOSE
+
+
+log = get_logger('pdflayout')
+
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client', 'img', '42_logo.png')
+
+# Lengths are in CSS pixels, as in `transcript.html`, and rendered at 96 dpi
+PX = 0.75
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4
+MARGIN = 10.8  # 0.15in
+
+STYLES = ('regular', 'bold', 'italic', 'bold-italic')
+STANDARD_FONTS = ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique', 'Helvetica-BoldOblique')
+
+BLACK = (0, 0, 0)
+LINK = (0, 0, 0.933)
+RULE = (0.867, 0.867, 0.867)
+TITLE_BG = (0.949, 0.949, 0.949)
+FINAL_BG = (0.941, 0.941, 0.941)
+HR_DARK, HR_LIGHT = (0.604, 0.604, 0.604), (0.933, 0.933, 0.933)
+
+CATEGORY_TITLES = (
+	('piscine', 'Piscine of {date}', 'Piscine'),
+	('commonCore', 'Common Core', 'Common Core'),
+	('postCore', 'Post-Core', 'Post-Core'),
+)
+
+
+class Run:
+	"""
+	A piece of text in a single style.
+	"""
+
+	__slots__ = ('text', 'bold', 'italic', 'sup', 'href')
+
+	def __init__(self, text: str, bold: bool = False, italic: bool = False, sup: bool = False, href: str | None = None):
+		self.text = text
+		self.bold = bold
+		self.italic = italic
+		self.sup = sup
+		self.href = href
+
+	@property
+	def style(self) -> int:
+		return self.bold + 2 * self.italic
+
+
+BREAK = Run('\n')
+
+
+class _Markup(HTMLParser):
+	def __init__(self, bold: bool):
+		super().__init__()
+		self.runs: list[Run] = []
+		self.state = {'bold': bold, 'italic': False, 'sup': False, 'href': None}
+		self.stack = []
+
+	def handle_starttag(self, tag, attrs):
+		if tag == 'br':
+			self.runs.append(BREAK)
+			return
+		key, value = {
+			'b': ('bold', True), 'strong': ('bold', True),
+			'i': ('italic', True), 'em': ('italic', True),
+			'sup': ('sup', True), 'a': ('href', dict(attrs).get('href')),
+		}[tag]
+		self.stack.append((key, self.state[key]))
+		self.state[key] = value
+
+	def handle_endtag(self, tag):
+		key, value = self.stack.pop()
+		self.state[key] = value
+
+	def handle_data(self, data):
+		self.runs.append(Run(data, **self.state))
+
+
+def markup(html: str, bold: bool = False) -> list[Run]:
+	"""
+	Runs of the inline HTML `html` (`b`, `strong`, `i`, `em`, `sup`, `a` and `br`).
+	Interpolated values must be escaped.
+	"""
+	parser = _Markup(bold)
+	parser.feed(html)
+	parser.close()
+	return parser.runs
+
+
+class Text:
+	"""
+	Runs wrapped into lines of at most `width` px, whitespace collapsed as in HTML.
+	"""
+
+	def __init__(self, fonts: list[Font], runs: list[Run], width: float, size: float = 13, align: str = 'left', margin: tuple[float, float] = (0, 0)):
+		self.fonts = fonts
+		self.size = size
+		self.align = align
+		self.width = width
+		self.margin = margin
+		self.line_height = fonts[0].line_height * size
+		self.lines = self._wrap(runs, width)
+
+	@property
+	def height(self) -> float:
+		return len(self.lines) * self.line_height
+
+	@property
+	def natural_width(self) -> float:
+		return max((sum(w for _, _, w in line) for line in self.lines), default=0.0)
+
+	def _measure(self, run: Run, text: str) -> float:
+		return self.fonts[run.style].width(text, self.size * (0.83 if run.sup else 1))
+
+	@staticmethod
+	def _append(line: list[tuple[Run, str, float]], run: Run, text: str, width: float) -> None:
+		# One piece per run and line, drawn at once
+		if line and line[-1][0] is run:
+			line[-1] = (run, line[-1][1] + text, line[-1][2] + width)
+		else:
+			line.append((run, text, width))
+
+	def _wrap(self, runs: list[Run], width: float) -> list[list[tuple[Run, str, float]]]:
+		lines, line, used, space = [], [], 0.0, None
+		for run in runs:
+			if run is BREAK:
+				lines.append(line)
+				line, used, space = [], 0.0, None
+				continue
+			words = run.text.split()
+			if run.text[:1].isspace() and line:
+				space = run
+			for i, word in enumerate(words):
+				if i > 0:
+					space = run
+				w = self._measure(run, word)
+				gap = self._measure(space, ' ') if space is not None else 0.0
+				if line and used + gap + w > width:
+					lines.append(line)
+					line, used, gap = [], 0.0, 0.0
+				if gap:
+					self._append(line, space, ' ', gap)
+				self._append(line, run, word, w)
+				used += gap + w
+				space = None
+			if run.text[-1:].isspace() and line:
+				space = run
+		if line:
+			lines.append(line)
+		return lines
+
+	def draw(self, flow: 'Flow', x: float, y: float) -> None:
+		"""
+		Draw every line, the first one `y` px from the top of the page's content.
+		"""
+		for line in self.lines:
+			flow.draw_line(self, line, x, y)
+			y += self.line_height
+
+
+class Flow:
+	"""
+	Cursor laying blocks out top to bottom over as many A4 pages as needed, in CSS px from
+	the top-left corner of the page content. Vertical margins collapse as in CSS, and are
+	dropped at the top of a page.
+	"""
+
+	def __init__(self, doc: PdfDocument, fonts: list[Font]):
+		self.doc = doc
+		self.fonts = fonts
+		self.width = (PAGE_WIDTH - 2 * MARGIN) / PX
+		self.height = (PAGE_HEIGHT - 2 * MARGIN) / PX
+		self.page = doc.add_page(PAGE_WIDTH, PAGE_HEIGHT)
+		self.y = 0.0
+		self.margin = 0.0
+		# Drawn again at the top of each new page (a table header)
+		self.repeat = None
+
+	def x(self, x: float) -> float:
+		return MARGIN + x * PX
+
+	def top(self, y: float) -> float:
+		return PAGE_HEIGHT - MARGIN - y * PX
+
+	def new_page(self) -> None:
+		self.page = self.doc.add_page(PAGE_WIDTH, PAGE_HEIGHT)
+		self.y = 0.0
+		self.margin = 0.0
+		if self.repeat is not None:
+			self.repeat()
+
+	def space(self, margin: float) -> None:
+		"""
+		Collapse `margin` with the pending margin.
+		"""
+		self.margin = max(self.margin, margin)
+
+	def reserve(self, height: float) -> float:
+		"""
+		Apply the pending margin and move to the next page if `height` does not fit.
+		Returns the top of the reserved space, and moves the cursor past it.
+		"""
+		if self.y > 0 and self.y + self.margin + height > self.height:
+			self.new_page()
+		else:
+			self.y += self.margin
+		self.margin = 0.0
+		top, self.y = self.y, self.y + height
+		return top
+
+	def text(self, text: Text, x: float = 0) -> None:
+		"""
+		Lay a block of text out, breaking pages between its lines.
+		"""
+		self.space(text.margin[0])
+		for line in text.lines:
+			self.draw_line(text, line, x, self.reserve(text.line_height))
+		self.space(text.margin[1])
+
+	def draw_line(self, text: Text, line: list[tuple[Run, str, float]], x: float, y: float) -> None:
+		page = self.page
+		width = sum(w for _, _, w in line)
+		if text.align == 'center':
+			x += (text.width - width) / 2
+		elif text.align == 'right':
+			x += text.width - width
+		font = text.fonts[0]
+		baseline = y + (text.line_height - (font.ascent + font.descent) * text.size) / 2 + font.ascent * text.size
+		for run, word, w in line:
+			size = text.size * (0.83 if run.sup else 1)
+			rise = text.size / 3 if run.sup else 0
+			color = LINK if run.href else BLACK
+			page.text(self.x(x), self.top(baseline - rise), word, text.fonts[run.style], size * PX, color)
+			if run.href:
+				page.rect(self.x(x), self.top(baseline + size * 0.1), w * PX, max(size / 13, 1) * PX, color)
+				page.link(self.x(x), self.top(y + text.line_height), w * PX, text.line_height * PX, run.href)
+			x += w
+
+	def rect(self, x: float, y: float, w: float, h: float, color: tuple[float, float, float]) -> None:
+		self.page.rect(self.x(x), self.top(y + h), w * PX, h * PX, color)
+
+	def hline(self, x: float, y: float, w: float, width: float, color: tuple[float, float, float] = BLACK) -> None:
+		"""
+		A horizontal rule `width` px thick, its top edge at `y`.
+		"""
+		self.rect(x, y, w, width, color)
+
+
+class _Table:
+	"""
+	The transcript table: ID, name, base credits, grade and credits of every project, by
+	category, with the header repeated on every page it spans.
+	"""
+
+	HEADERS = ('ID', 'Project Name', 'Base Credits', 'Grade', 'Credits')
+	# Left padding of the cells of a project row
+	PADDING = (20, 20, 1, 1, 1)
+
+	def __init__(self, flow: Flow, transcript: dict):
+		self.flow = flow
+		self.fonts = flow.fonts
+		self.transcript = transcript
+		self.line = self.fonts[0].line_height * 13
+		self.widths = self._columns()
+
+	def _cells(self, project: dict | None) -> tuple[str, ...]:
+		if project is None:
+			return ('-',) * 5
+		name = project['name'] + ('*' if project.get('hasBonus') else '')
+		return tuple(str(v) for v in (project['tid'], name, project['base'], project['mark'], project['credits']))
+
+	def _columns(self) -> list[float]:
+		"""
+		Column widths of the automatic table layout: the widest cell of each column, the
+		remaining width shared in proportion.
+		"""
+		regular, bold = self.fonts[0], self.fonts[1]
+		widths = [bold.width(h, 13) + 2 for h in self.HEADERS]
+		for tcat, _, _ in CATEGORY_TITLES:
+			for project in self.transcript[tcat]['projects'] or [None]:
+				for i, cell in enumerate(self._cells(project)):
+					widths[i] = max(widths[i], regular.width(cell, 13) + self.PADDING[i] + 1)
+		total = sum(widths)
+		return [w * self.flow.width / total for w in widths]
+
+	def _row(self, cells: tuple[str, ...], bold: bool, padding: tuple[float, ...]) -> list[Text]:
+		texts = []
+		for i, cell in enumerate(cells):
+			width = self.widths[i] - padding[i] - 1
+			texts.append(Text(self.fonts, [Run(cell, bold=bold)], width, align='left' if i < 2 else 'right'))
+		return texts
+
+	def _draw_row(self, texts: list[Text], padding: tuple[float, ...], top: float) -> None:
+		x = 0.0
+		for i, text in enumerate(texts):
+			text.draw(self.flow, x + padding[i], top)
+			x += self.widths[i]
+
+	def header(self) -> None:
+		texts = self._row(self.HEADERS, True, (1,) * 5)
+		height = 1 + 10 + max(t.height for t in texts) + 1
+		top = self.flow.reserve(height)
+		self.flow.hline(0, top, self.flow.width, 1)
+		self._draw_row(texts, (1,) * 5, top + 11)
+
+	def category(self, tcat: str, title: str, label: str) -> None:
+		flow, data = self.flow, self.transcript[tcat]
+		flow.space(20)
+
+		text = Text(self.fonts, markup(escape(title.format(**data)), bold=True), flow.width)
+		top = flow.reserve(1 + 5 + text.height + 5 + 1)
+		flow.rect(0, top, flow.width, text.height + 12, TITLE_BG)
+		flow.hline(0, top, flow.width, 1)
+		flow.hline(0, top + 11 + text.height, flow.width, 1)
+		text.draw(flow, 0, top + 6)
+
+		for project in data['projects'] or [None]:
+			texts = self._row(self._cells(project), False, self.PADDING)
+			height = 1 + max(t.height for t in texts) + 1 + 1
+			top = flow.reserve(height)
+			self._draw_row(texts, self.PADDING, top + 1)
+			flow.hline(0, top + height - 1, flow.width, 1, RULE)
+
+		spans = [
+			Text(self.fonts, markup(f'<b>{label} Total Credits:</b> <i>{data['totalCredits']} / {data['maxCredits']}</i>', bold=True), flow.width / 4, align='center'),
+			Text(self.fonts, markup(f'<b>{label} GPA:</b> <i>{data['gpa']}</i>', bold=True), flow.width / 4, align='center'),
+		]
+		top = flow.reserve(2 + 1 + max(s.height for s in spans) + 1)
+		flow.hline(0, top, flow.width, 2)
+		for i, span in enumerate(spans):
+			span.draw(flow, flow.width / 4 * (1 + i), top + 3)
+
+	def final(self) -> None:
+		flow = self.flow
+		flow.space(20)
+		left = sum(self.widths[:3])
+		for label, value in (
+				('Total Credits Earned:', f'{self.transcript['totalCredits']} / {self.transcript['maxCredits']}'),
+				('Overall Cumulative GPA:', f'{self.transcript['gpa']}'),
+				):
+			texts = [
+				Text(self.fonts, markup(escape(label), bold=True), left - 20, align='right'),
+				Text(self.fonts, markup(f'<i>{escape(value)}</i>', bold=True), flow.width - left - 20),
+			]
+			top = flow.reserve(max(t.height for t in texts))
+			flow.rect(0, top, flow.width, max(t.height for t in texts), FINAL_BG)
+			texts[0].draw(flow, 10, top)
+			texts[1].draw(flow, left + 10, top)
+
+	def draw(self) -> None:
+		self.header()
+		self.flow.repeat = self.header
+		for tcat, title, label in CATEGORY_TITLES:
+			self.category(tcat, title, label)
+		self.final()
+		self.flow.repeat = None
+
+
+def _header(flow: Flow) -> None:
+	fonts = flow.fonts
+	inner = flow.width / 2
+	title = Text(fonts, markup(TITLE, bold=True), inner, size=24, align='center')
+	height = 2 + 10 + 10 + title.height + 6 + 10 + 2
+	x = (flow.width - inner - 24) / 2
+	top = flow.reserve(height)
+	flow.page.round_rect(flow.x(x + 1), flow.top(top + height - 1), (inner + 22) * PX, (height - 2) * PX, 9 * PX, 2 * PX)
+	title.draw(flow, x + 12, top + 22)
+	flow.page.image(get_logo(), flow.x(flow.width - 150), flow.top(150), 150 * PX, 150 * PX)
+
+
+def _column(fonts: list[Font], width: float, title: str, paragraphs: list[str]) -> tuple[list[tuple[float, Text]], float]:
+	"""
+	A heading and paragraphs stacked with collapsing margins: their offsets and total height.
+	"""
+	blocks = [Text(fonts, markup(escape(title), bold=True), width, size=16, margin=(10, 6))]
+	blocks += [Text(fonts, markup(p), width, margin=(6, 6)) for p in paragraphs]
+	placed, y, margin = [], 0.0, 0.0
+	for block in blocks:
+		y += max(margin, block.margin[0])
+		placed.append((y, block))
+		y += block.height
+		margin = block.margin[1]
+	return placed, y + margin
+
+
+def _about(flow: Flow, data: dict) -> None:
+	campus = {k: escape(str(v)) for k, v in data['campus'].items()}
+	student = {k: escape(str(v)) for k, v in data['student'].items()}
+	width = flow.width * 0.48
+	columns = [
+		_column(flow.fonts, width, '42 School', [
+			f'<b>Campus - {campus['name']}</b>',
+			f'{campus['address']}<br>{campus['zip']} - {campus['city']},<br>{campus['country']}',
+			f'<b>Website:</b> <a href="{campus['website']}">{campus['website']}</a><br>'
+			f'<b>TORN<sup>(1)</sup>:</b> {TORN}<br>'
+			f'<b>Institute RRN<sup>(2)</sup>:</b> {RRN}',
+		]),
+		_column(flow.fonts, width, 'Student Information', [
+			f'<b>Last Name:</b> {student['lastName']}<br>'
+			f'<b>First Name:</b> {student['firstName']}<br>'
+			f'<b>Student ID:</b> {student['login']}<br>'
+			f'<b>Email:</b> {student['email']}',
+			f'<b>Active:</b> {student['active']}<br>'
+			f'<b>Alumni date:</b> {student['alumniDate']}',
+		]),
+	]
+	height = max(h for _, h in columns)
+	top = flow.reserve(height)
+	for x, (blocks, h) in zip((0, flow.width - width), columns):
+		# Both columns are as tall as the tallest, their content at the bottom
+		for y, block in blocks:
+			block.draw(flow, x, top + height - h + y)
+
+
+def _notes(flow: Flow) -> None:
+	fonts = flow.fonts
+	flow.space(20)
+	flow.text(Text(fonts, markup('Additional Notes', bold=True), flow.width, size=16, margin=(10, 6)))
+	flow.text(Text(fonts, markup(NOTES), flow.width, margin=(6, 6)))
+	flow.space(6)
+	for stage in STAGES:
+		item = Text(fonts, markup(stage), flow.width - 40)
+		first = True
+		for line in item.lines:
+			top = flow.reserve(item.line_height)
+			if first:
+				bullet = Text(fonts, [Run('•')], 20)
+				bullet.draw(flow, 40 - 13, top)
+				first = False
+			flow.draw_line(item, line, 40, top)
+	flow.space(6)
+	flow.text(Text(fonts, markup(JURY), flow.width))
+	flow.space(20)
+
+
+def _footer(flow: Flow, data: dict) -> None:
+	fonts = flow.fonts
+	flow.space(5)
+	top = flow.reserve(2)
+	flow.hline(0, top, flow.width, 1, HR_DARK)
+	flow.hline(0, top + 1, flow.width, 1, HR_LIGHT)
+	flow.space(5)
+
+	marks = [markup(m) for m, _ in FOOTNOTES]
+	mark_width = max(Text(fonts, m, flow.width, size=10).natural_width for m in marks)
+	# A table 20px in, its cells 2px apart with 1px of padding
+	for runs, (_, note) in zip(marks, FOOTNOTES):
+		mark = Text(fonts, runs, mark_width, size=10, align='right')
+		text = Text(fonts, markup(note), flow.width - 20 - mark_width - 10, size=10)
+		top = flow.reserve(2 + 1 + max(mark.height, text.height) + 1)
+		mark.draw(flow, 20 + 3, top + 3)
+		text.draw(flow, 20 + 3 + mark_width + 4, top + 3)
+	flow.space(2)
+
+	flow.text(Text(fonts, markup(
+		f'{CREDIT} | Edited on: {escape(str(data['date']))} | v{escape(str(data['version']))}<br>{PURPOSE}'
+	), flow.width, size=10))
+
+
+def render_transcript(data: dict, out: BinaryIO) -> int:
+	"""
+	Write the transcript PDF of `data` (as returned by `get_transcript_data`) into the binary
+	file `out`, laid out like `transcript.html` but without any HTML engine. Returns its size.
+	"""
+	config = get_config()
+	doc = PdfDocument(title=data.get('name'), producer=f'{config.title} v{config.version}')
+	flow = Flow(doc, get_fonts())
+	_header(flow)
+	_about(flow, data)
+	flow.text(Text(flow.fonts, markup('Transcript', bold=True), flow.width, size=16, margin=(10, 6)))
+	_Table(flow, data['transcript']).draw()
+	_notes(flow)
+	_footer(flow, data)
+	return doc.write(out)
+
+
+_fonts: list[Font] | None = None
+_logo: PngImage | None = None
+_assets_lock = threading.Lock()
+
+
+def get_fonts() -> list[Font]:
+	"""
+	The regular, bold, italic and bold italic fonts of `PDF_FONT_*`, loaded once per process.
+	A font that cannot be loaded is replaced by the matching standard Helvetica.
+	"""
+	global _fonts
+	with _assets_lock:
+		if _fonts is None:
+			fonts = []
+			for style, path, standard in zip(STYLES, get_config().pdf_fonts, STANDARD_FONTS):
+				try:
+					fonts.append(TrueTypeFont(path))
+				except (OSError, PdfError) as e:
+					log.warning("Using %s as the %s font of the native PDF engine: %s", standard, style, e)
+					fonts.append(StandardFont(standard))
+			_fonts = fonts
+		return _fonts
+
+
+def get_logo() -> PngImage:
+	global _logo
+	with _assets_lock:
+		if _logo is None:
+			_logo = PngImage.open(LOGO_PATH)
+		return _logo
@@ -0,0 +1,732 @@
+import zlib
+import struct
+import hashlib
+import unicodedata
+from typing import BinaryIO
+
+
+COMPRESSION = 6
+
+
+class PdfError(Exception):
+	pass
+
+
+class Name(str):
+	"""
+	A PDF name, serialized as `/Name`.
+	"""
+
+
+class Ref:
+	def __init__(self, num: int):
+		self.num = num
+
+
+def _num(v: float) -> str:
+	if isinstance(v, int):
+		return str(v)
+	s = f'{v:.3f}'.rstrip('0').rstrip('.')
+	return '0' if s == '-0' else s
+
+
+def _text(s: str) -> bytes:
+	"""
+	A PDF text string: a literal in PDFDocEncoding's ASCII subset, UTF-16BE otherwise.
+	"""
+	if s.isascii():
+		return b'(' + s.encode('ascii').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+	return b'<feff' + s.encode('utf-16-be').hex().encode('ascii') + b'>'
+
+
+def serialize(obj) -> bytes:
+	if isinstance(obj, Name):
+		return b'/' + obj.encode('ascii')
+	if isinstance(obj, str):
+		return _text(obj)
+	if isinstance(obj, bool):
+		return b'true' if obj else b'false'
+	if isinstance(obj, (int, float)):
+		return _num(obj).encode('ascii')
+	if isinstance(obj, Ref):
+		return b'%d 0 R' % obj.num
+	if isinstance(obj, bytes):
+		return b'<' + obj.hex().encode('ascii') + b'>'
+	if isinstance(obj, (list, tuple)):
+		return b'[' + b' '.join(serialize(v) for v in obj) + b']'
+	if isinstance(obj, dict):
+		return b'<<' + b''.join(b'/' + k.encode('ascii') + b' ' + serialize(v) for k, v in obj.items()) + b'>>'
+	if obj is None:
+		return b'null'
+	raise PdfError(f"Cannot serialize {type(obj).__name__} to PDF.")
+
+
+class Font:
+	"""
+	Base of the fonts a document can use. Sizes are in points, metrics in em.
+	"""
+
+	name: str
+	ascent: float
+	descent: float
+	line_gap: float
+
+	@property
+	def line_height(self) -> float:
+		return self.ascent + self.descent + self.line_gap
+
+	def width(self, text: str, size: float) -> float:
+		raise NotImplementedError
+
+	def encode(self, text: str, used: dict[int, str]) -> bytes:
+		"""
+		Encode `text` for `Tj`, recording the glyphs it uses into `used`.
+		"""
+		raise NotImplementedError
+
+	def embed(self, doc: 'PdfDocument', used: dict[int, str]) -> Ref:
+		raise NotImplementedError
+
+
+# Widths of the printable ASCII characters in the standard fonts, from their AFM metrics
+_HELVETICA_WIDTHS = (
+	'278 278 355 556 556 889 667 191 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 '
+	'278 278 584 584 584 556 1015 667 667 722 722 667 611 778 722 278 500 667 556 833 722 778 667 778 722 667 '
+	'611 722 667 944 667 667 611 278 278 278 469 556 333 556 556 500 556 556 278 556 556 222 222 500 222 833 '
+	'556 556 556 556 333 500 278 556 500 722 500 500 500 334 260 334 584'
+)
+_HELVETICA_BOLD_WIDTHS = (
+	'278 333 474 556 556 889 722 238 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 '
+	'333 333 584 584 584 611 975 722 722 722 722 667 611 778 722 278 556 722 611 833 722 778 667 778 722 667 '
+	'611 722 667 944 667 667 611 333 278 333 584 556 333 556 611 556 611 556 333 611 611 278 278 556 278 889 '
+	'611 611 611 611 389 556 333 611 556 778 556 556 500 389 280 389 584'
+)
+# Other WinAnsi characters that are not accented letters: (regular, bold)
+_HELVETICA_EXTRA_WIDTHS = {
+	'\u2018': (222, 278), '\u2019': (222, 278), '\u201c': (333, 500), '\u201d': (333, 500),
+	'\u2013': (556, 556), '\u2014': (1000, 1000), '\u2022': (350, 350), '\u2026': (1000, 1000),
+	'\u20ac': (556, 556), '\u00a0': (278, 278), '\u00b0': (400, 400), '\u00ab': (556, 556), '\u00bb': (556, 556),
+}
+
+
+class StandardFont(Font):
+	"""
+	One of the Helvetica standard fonts, which every viewer provides: nothing is embedded.
+	Only covers WinAnsi (Western European) text; other characters are replaced by `?`.
+	"""
+
+	def __init__(self, name: str = 'Helvetica'):
+		self.name = name
+		bold = 'Bold' in name
+		self._widths = dict(zip(map(chr, range(32, 127)), map(int, (_HELVETICA_BOLD_WIDTHS if bold else _HELVETICA_WIDTHS).split())))
+		self._widths |= {c: w[bold] for c, w in _HELVETICA_EXTRA_WIDTHS.items()}
+		# Metrics of Arial, so that a layout does not depend on the fallback
+		self.ascent, self.descent, self.line_gap = 0.905, 0.212, 0.033
+
+	def _width(self, c: str) -> int:
+		if (w := self._widths.get(c)) is None:
+			# Accented letters are as wide as their base letter
+			w = self._widths[c] = self._widths.get(unicodedata.normalize('NFKD', c)[:1], 556)
+		return w
+
+	def width(self, text: str, size: float) -> float:
+		return sum(map(self._width, text)) * size / 1000
+
+	def encode(self, text: str, used: dict[int, str]) -> bytes:
+		data = text.encode('cp1252', 'replace')
+		return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'\\r') + b')'
+
+	def embed(self, doc: 'PdfDocument', used: dict[int, str]) -> Ref:
+		return doc.add({
+			'Type': Name('Font'),
+			'Subtype': Name('Type1'),
+			'BaseFont': Name(self.name),
+			'Encoding': Name('WinAnsiEncoding'),
+		})
+
+
+class TrueTypeFont(Font):
+	"""
+	A TrueType (`glyf` outlines) font file, embedded as a subset of the glyphs a document uses.
+
+	The subset keeps the original glyph ids (the glyphs that are not used are emptied), so
+	that text is written as glyph ids with the `Identity-H` encoding, and a `ToUnicode` map
+	keeps it searchable and copyable.
+
+	Raises:
+		PdfError: If the file is not a TrueType font, or its license forbids embedding it.
+	"""
+
+	def __init__(self, path: str):
+		with open(path, 'rb') as f:
+			self.data = f.read()
+		try:
+			version, count = struct.unpack_from('>IH', self.data)
+			if version not in (0x00010000, 0x74727565):
+				raise PdfError(f"{path} is not a TrueType font (CFF outlines are not supported).")
+			self.tables = {}
+			for i in range(count):
+				tag, _, offset, length = struct.unpack_from('>4sIII', self.data, 12 + 16 * i)
+				self.tables[tag.decode('latin-1')] = (offset, length)
+			self._parse(path)
+		except (struct.error, KeyError) as e:
+			raise PdfError(f"{path} is not a valid TrueType font: {e!r}.")
+
+	def _table(self, tag: str) -> bytes:
+		offset, length = self.tables[tag]
+		return self.data[offset:offset + length]
+
+	def _parse(self, path: str) -> None:
+		head = self._table('head')
+		self.units = struct.unpack_from('>H', head, 18)[0]
+		self.bbox = [v * 1000 // self.units for v in struct.unpack_from('>hhhh', head, 36)]
+		self._long_loca = struct.unpack_from('>h', head, 50)[0] == 1
+
+		hhea = self._table('hhea')
+		ascent, descent, line_gap = struct.unpack_from('>hhh', hhea, 4)
+		self.ascent, self.descent, self.line_gap = ascent / self.units, -descent / self.units, line_gap / self.units
+		self._hmetrics = struct.unpack_from('>H', hhea, 34)[0]
+		self.glyphs = struct.unpack_from('>H', self._table('maxp'), 4)[0]
+
+		hmtx = self._table('hmtx')
+		self._metrics = [struct.unpack_from('>Hh', hmtx, 4 * i) for i in range(self._hmetrics)]
+		last = self._metrics[-1][0]
+		lsbs = struct.unpack_from(f'>{self.glyphs - self._hmetrics}h', hmtx, 4 * self._hmetrics)
+		self._metrics += [(last, lsb) for lsb in lsbs]
+		# Every glyph with a full metric, for the subsets
+		self._hmtx = b''.join(struct.pack('>Hh', *m) for m in self._metrics)
+
+		loca = self._table('loca')
+		if self._long_loca:
+			self._loca = struct.unpack_from(f'>{self.glyphs + 1}I', loca)
+		else:
+			self._loca = [o * 2 for o in struct.unpack_from(f'>{self.glyphs + 1}H', loca)]
+
+		post = self._table('post')
+		self.italic_angle = struct.unpack_from('>i', post, 4)[0] / 65536
+		self.fixed_pitch = struct.unpack_from('>I', post, 12)[0] != 0
+
+		self.cap_height = self.ascent
+		self.weight = 400
+		if 'OS/2' in self.tables:
+			os2 = self._table('OS/2')
+			self.weight, fs_type = struct.unpack_from('>HH', os2, 4)
+			if fs_type & 0x000f == 0x0002:
+				raise PdfError(f"The license of {path} forbids embedding it.")
+			if struct.unpack_from('>H', os2)[0] >= 2 and len(os2) >= 90:
+				self.cap_height = struct.unpack_from('>h', os2, 88)[0] / self.units
+
+		self.name = self._postscript_name() or 'Font'
+		self.cmap = self._parse_cmap()
+
+	def _postscript_name(self) -> str | None:
+		if 'name' not in self.tables:
+			return None
+		name = self._table('name')
+		count, strings = struct.unpack_from('>HH', name, 2)
+		for i in range(count):
+			platform, encoding, _, name_id, length, offset = struct.unpack_from('>HHHHHH', name, 6 + 12 * i)
+			if name_id != 6:
+				continue
+			raw = name[strings + offset:strings + offset + length]
+			value = raw.decode('utf-16-be' if platform in (0, 3) else 'latin-1', 'ignore')
+			if value := ''.join(c for c in value if c.isascii() and c.isalnum() or c in '-_'):
+				return value
+		return None
+
+	def _parse_cmap(self) -> dict[int, int]:
+		cmap = self._table('cmap')
+		subtables = {}
+		for i in range(struct.unpack_from('>H', cmap, 2)[0]):
+			platform, encoding, offset = struct.unpack_from('>HHI', cmap, 4 + 8 * i)
+			subtables[(platform, encoding)] = offset
+		for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+			if (offset := subtables.get(key)) is None:
+				continue
+			fmt = struct.unpack_from('>H', cmap, offset)[0]
+			if fmt == 12:
+				mapping = {}
+				for g in range(struct.unpack_from('>I', cmap, offset + 12)[0]):
+					start, end, gid = struct.unpack_from('>III', cmap, offset + 16 + 12 * g)
+					mapping.update(zip(range(start, end + 1), range(gid, gid + end - start + 1)))
+				return mapping
+			if fmt == 4:
+				segments = struct.unpack_from('>H', cmap, offset + 6)[0] // 2
+				ends = struct.unpack_from(f'>{segments}H', cmap, offset + 14)
+				starts = struct.unpack_from(f'>{segments}H', cmap, offset + 16 + 2 * segments)
+				deltas = struct.unpack_from(f'>{segments}h', cmap, offset + 16 + 4 * segments)
+				ranges_at = offset + 16 + 6 * segments
+				ranges = struct.unpack_from(f'>{segments}H', cmap, ranges_at)
+				mapping = {}
+				for s in range(segments):
+					for c in range(starts[s], min(ends[s], 0xfffe) + 1):
+						if ranges[s] == 0:
+							gid = (c + deltas[s]) & 0xffff
+						else:
+							gid = struct.unpack_from('>H', cmap, ranges_at + 2 * s + ranges[s] + 2 * (c - starts[s]))[0]
+							gid = (gid + deltas[s]) & 0xffff if gid else 0
+						if gid:
+							mapping[c] = gid
+				return mapping
+		raise PdfError("The font has no Unicode cmap.")
+
+	def width(self, text: str, size: float) -> float:
+		cmap, metrics = self.cmap, self._metrics
+		return sum(metrics[cmap.get(ord(c), 0)][0] for c in text) * size / self.units
+
+	def encode(self, text: str, used: dict[int, str]) -> bytes:
+		gids = [self.cmap.get(ord(c), 0) for c in text]
+		for gid, c in zip(gids, text):
+			used.setdefault(gid, c)
+		return b'<' + struct.pack(f'>{len(gids)}H', *gids).hex().encode('ascii') + b'>'
+
+	def _glyph(self, gid: int) -> bytes:
+		offset = self.tables['glyf'][0]
+		return self.data[offset + self._loca[gid]:offset + self._loca[gid + 1]]
+
+	def _closure(self, gids) -> set[int]:
+		"""
+		`gids`, `.notdef` and the components of the composite glyphs among them.
+		"""
+		gids = {0, *gids}
+		todo = list(gids)
+		while todo:
+			glyph = self._glyph(todo.pop())
+			if len(glyph) < 10 or struct.unpack_from('>h', glyph)[0] >= 0:
+				continue
+			pos = 10
+			while True:
+				flags, component = struct.unpack_from('>HH', glyph, pos)
+				if component not in gids:
+					gids.add(component)
+					todo.append(component)
+				pos += 4 + (4 if flags & 0x0001 else 2)
+				if flags & 0x0008:
+					pos += 2
+				elif flags & 0x0040:
+					pos += 4
+				elif flags & 0x0080:
+					pos += 8
+				if not flags & 0x0020:
+					break
+		return gids
+
+	def subset(self, gids) -> bytes:
+		"""
+		The font file restricted to `gids`, glyph ids unchanged.
+		"""
+		gids = sorted(self._closure(gids))
+		count = gids[-1] + 1
+		glyf, loca = bytearray(), []
+		for gid in gids:
+			loca += [len(glyf)] * (gid + 1 - len(loca))
+			glyph = self._glyph(gid)
+			glyf += glyph + b'\0' * (-len(glyph) % 4)
+		loca.append(len(glyf))
+
+		head = bytearray(self._table('head'))
+		struct.pack_into('>I', head, 8, 0)
+		struct.pack_into('>h', head, 50, 1)
+		hhea = bytearray(self._table('hhea'))
+		struct.pack_into('>H', hhea, 34, count)
+		maxp = bytearray(self._table('maxp'))
+		struct.pack_into('>H', maxp, 4, count)
+		tables = {
+			'head': bytes(head),
+			'hhea': bytes(hhea),
+			'maxp': bytes(maxp),
+			'hmtx': self._hmtx[:4 * count],
+			'loca': struct.pack(f'>{count + 1}I', *loca),
+			'glyf': bytes(glyf),
+			# No glyph names
+			'post': struct.pack('>I', 0x00030000) + self._table('post')[4:32],
+		}
+		for tag in ('cvt ', 'fpgm', 'prep'):
+			if tag in self.tables:
+				tables[tag] = self._table(tag)
+		return _sfnt(tables)
+
+	def embed(self, doc: 'PdfDocument', used: dict[int, str]) -> Ref:
+		gids = sorted(used)
+		# Same glyphs, same subset name: byte-stable output
+		digest = hashlib.sha256(self.name.encode() + struct.pack(f'>{len(gids)}H', *gids)).digest()
+		name = Name(''.join(chr(65 + b % 26) for b in digest[:6]) + '+' + self.name)
+		font_file = doc.add({}, self.subset(gids))
+		descriptor = doc.add({
+			'Type': Name('FontDescriptor'),
+			'FontName': name,
+			'Flags': 32 | (1 if self.fixed_pitch else 0) | (64 if self.italic_angle else 0),
+			'FontBBox': self.bbox,
+			'ItalicAngle': self.italic_angle,
+			'Ascent': round(self.ascent * 1000),
+			'Descent': -round(self.descent * 1000),
+			'CapHeight': round(self.cap_height * 1000),
+			'StemV': 120 if self.weight >= 600 else 80,
+			'FontFile2': font_file,
+		})
+		widths = []
+		for gid in gids:
+			w = round(self._metrics[gid][0] * 1000 / self.units)
+			if widths and widths[-2] + len(widths[-1]) == gid:
+				widths[-1].append(w)
+			else:
+				widths += [gid, [w]]
+		cid_font = doc.add({
+			'Type': Name('Font'),
+			'Subtype': Name('CIDFontType2'),
+			'BaseFont': name,
+			'CIDSystemInfo': {'Registry': 'Adobe', 'Ordering': 'Identity', 'Supplement': 0},
+			'FontDescriptor': descriptor,
+			'W': widths,
+			'CIDToGIDMap': Name('Identity'),
+		})
+		return doc.add({
+			'Type': Name('Font'),
+			'Subtype': Name('Type0'),
+			'BaseFont': name,
+			'Encoding': Name('Identity-H'),
+			'DescendantFonts': [cid_font],
+			'ToUnicode': doc.add({}, _to_unicode(used)),
+		})
+
+
+def _sfnt(tables: dict[str, bytes]) -> bytes:
+	def checksum(data: bytes) -> int:
+		data += b'\0' * (-len(data) % 4)
+		return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xffffffff
+
+	tags = sorted(tables)
+	power = 1 << (len(tags).bit_length() - 1)
+	header = struct.pack('>IHHHH', 0x00010000, len(tags), power * 16, power.bit_length() - 1, (len(tags) - power) * 16)
+	offset = len(header) + 16 * len(tags)
+	directory, body = b'', b''
+	for tag in tags:
+		data = tables[tag]
+		if tag == 'head':
+			head = offset + len(body)
+		directory += struct.pack('>4sIII', tag.encode('latin-1'), checksum(data), offset + len(body), len(data))
+		body += data + b'\0' * (-len(data) % 4)
+	font = bytearray(header + directory + body)
+	struct.pack_into('>I', font, head + 8, (0xb1b0afba - checksum(bytes(font))) & 0xffffffff)
+	return bytes(font)
+
+
+def _to_unicode(used: dict[int, str]) -> bytes:
+	lines = [
+		'/CIDInit /ProcSet findresource begin 12 dict begin begincmap',
+		'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def',
+		'/CMapName /Adobe-Identity-UCS def /CMapType 2 def',
+		'1 begincodespacerange <0000> <ffff> endcodespacerange',
+	]
+	mapping = sorted(used.items())
+	for i in range(0, len(mapping), 100):
+		chunk = mapping[i:i + 100]
+		lines.append(f'{len(chunk)} beginbfchar')
+		lines += [f'<{gid:04x}> <{c.encode('utf-16-be').hex()}>' for gid, c in chunk]
+		lines.append('endbfchar')
+	lines.append('endcmap CMapName currentdict /CMap defineresource pop end end')
+	return '\n'.join(lines).encode('ascii')
+
+
+class PngImage:
+	"""
+	A PNG file as an image XObject, encoded once and shared by every document that draws it.
+
+	The compressed pixels are passed through as they are (PDF's Flate decoder understands the
+	PNG row filters), except for an alpha channel, which becomes a separate soft mask.
+
+	Raises:
+		PdfError: On an interlaced or 16-bit PNG with alpha.
+	"""
+
+	def __init__(self, data: bytes):
+		if data[:8] != b'\x89PNG\r\n\x1a\n':
+			raise PdfError("Not a PNG image.")
+		chunks: dict[bytes, bytes] = {}
+		pos = 8
+		while pos + 8 <= len(data):
+			length, kind = struct.unpack_from('>I4s', data, pos)
+			chunks[kind] = chunks.get(kind, b'') + data[pos + 8:pos + 8 + length]
+			pos += 12 + length
+		self.width, self.height, depth, color, _, _, interlace = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+		if interlace:
+			raise PdfError("Interlaced PNG images are not supported.")
+		colors = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color]
+		idat = chunks[b'IDAT']
+
+		image: dict = {
+			'Type': Name('XObject'),
+			'Subtype': Name('Image'),
+			'Width': self.width,
+			'Height': self.height,
+			'BitsPerComponent': depth,
+			'Filter': Name('FlateDecode'),
+		}
+		mask = None
+		if color in (4, 6):
+			if depth != 8:
+				raise PdfError("Only 8-bit PNG images with alpha are supported.")
+			pixels = _unfilter(zlib.decompress(idat), self.width, self.height, colors, depth)
+			color_bytes = colors - 1
+			stream = b''.join(pixels[i:i + color_bytes] for i in range(0, len(pixels), colors))
+			alpha = pixels[color_bytes::colors]
+			image['ColorSpace'] = Name('DeviceGray' if color == 4 else 'DeviceRGB')
+			stream = zlib.compress(stream, COMPRESSION)
+			mask = alpha
+		else:
+			stream = idat
+			image['DecodeParms'] = {'Predictor': 15, 'Colors': colors, 'BitsPerComponent': depth, 'Columns': self.width}
+			if color == 3:
+				palette = chunks[b'PLTE']
+				image['ColorSpace'] = [Name('Indexed'), Name('DeviceRGB'), len(palette) // 3 - 1, palette]
+				if b'tRNS' in chunks:
+					alphas = chunks[b'tRNS'] + b'\xff' * (256 - len(chunks[b'tRNS']))
+					mask = _indexed_alpha(_unfilter(zlib.decompress(idat), self.width, self.height, 1, depth), self.width, self.height, depth, alphas)
+			else:
+				image['ColorSpace'] = Name('DeviceGray' if color == 0 else 'DeviceRGB')
+		self._image = (image, stream)
+		self._mask = None
+		if mask is not None:
+			self._mask = ({
+				'Type': Name('XObject'),
+				'Subtype': Name('Image'),
+				'Width': self.width,
+				'Height': self.height,
+				'ColorSpace': Name('DeviceGray'),
+				'BitsPerComponent': 8,
+				'Filter': Name('FlateDecode'),
+			}, zlib.compress(mask, COMPRESSION))
+
+	@classmethod
+	def open(cls, path: str) -> 'PngImage':
+		with open(path, 'rb') as f:
+			return cls(f.read())
+
+	def embed(self, doc: 'PdfDocument') -> Ref:
+		image, stream = self._image
+		if self._mask is not None:
+			image = image | {'SMask': doc.add(*self._mask, compressed=True)}
+		return doc.add(image, stream, compressed=True)
+
+
+def _unfilter(raw: bytes, width: int, height: int, colors: int, depth: int) -> bytes:
+	"""
+	Undo the PNG row filters of `raw`, returning the packed rows without their filter bytes.
+	"""
+	stride = (width * colors * depth + 7) // 8
+	bpp = max(1, colors * depth // 8)
+	out = bytearray()
+	prev = bytearray(stride)
+	for y in range(height):
+		start = y * (stride + 1)
+		kind, row = raw[start], bytearray(raw[start + 1:start + 1 + stride])
+		if kind == 1:
+			for i in range(bpp, stride):
+				row[i] = (row[i] + row[i - bpp]) & 0xff
+		elif kind == 2:
+			row = bytearray((a + b) & 0xff for a, b in zip(row, prev))
+		elif kind == 3:
+			for i in range(stride):
+				row[i] = (row[i] + ((row[i - bpp] if i >= bpp else 0) + prev[i]) // 2) & 0xff
+		elif kind == 4:
+			for i in range(stride):
+				a = row[i - bpp] if i >= bpp else 0
+				b = prev[i]
+				c = prev[i - bpp] if i >= bpp else 0
+				p = a + b - c
+				pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+				row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+		out += row
+		prev = row
+	return bytes(out)
+
+
+def _indexed_alpha(pixels: bytes, width: int, height: int, depth: int, alphas: bytes) -> bytes:
+	"""
+	One alpha byte per pixel of the packed palette indices `pixels`, from the PNG `tRNS` table.
+	"""
+	if depth == 8:
+		return pixels.translate(alphas)
+	per_byte = 8 // depth
+	mask = (1 << depth) - 1
+	# Alphas of the pixels packed in each possible byte
+	table = [bytes(alphas[(b >> (8 - depth * (i + 1))) & mask] for i in range(per_byte)) for b in range(256)]
+	stride = (width * depth + 7) // 8
+	return b''.join(
+		b''.join(map(table.__getitem__, pixels[y * stride:(y + 1) * stride]))[:width]
+		for y in range(height)
+	)
+
+
+class Page:
+	"""
+	Content of one page, in points from its bottom-left corner as in PDF.
+	"""
+
+	def __init__(self, doc: 'PdfDocument', width: float, height: float):
+		self.doc = doc
+		self.width = width
+		self.height = height
+		self.ops: list[bytes] = []
+		self.fonts: dict[str, Font] = {}
+		self.images: dict[str, PngImage] = {}
+		self.links: list[tuple[list[float], str]] = []
+
+	def _op(self, *args) -> None:
+		self.ops.append(b' '.join(a if isinstance(a, bytes) else _num(a).encode('ascii') if isinstance(a, (int, float)) else a.encode('ascii') for a in args))
+
+	def text(self, x: float, y: float, text: str, font: Font, size: float, color: tuple[float, float, float] = (0, 0, 0)) -> None:
+		"""
+		Draw `text` with its baseline starting at `(x, y)`.
+		"""
+		name = self.doc.font_resource(font)
+		self.fonts[name] = font
+		self.ops.append(
+			f'{_num(color[0])} {_num(color[1])} {_num(color[2])} rg BT /{name} {_num(size)} Tf {_num(x)} {_num(y)} Td '.encode('ascii')
+			+ self.doc.encode(font, text) + b' Tj ET'
+		)
+
+	def rect(self, x: float, y: float, w: float, h: float, color: tuple[float, float, float]) -> None:
+		self._op(*color, 'rg')
+		self._op(x, y, w, h, 're', 'f')
+
+	def line(self, x1: float, y1: float, x2: float, y2: float, width: float, color: tuple[float, float, float] = (0, 0, 0)) -> None:
+		self._op(*color, 'RG')
+		self._op(width, 'w', x1, y1, 'm', x2, y2, 'l', 'S')
+
+	def round_rect(self, x: float, y: float, w: float, h: float, r: float, width: float, color: tuple[float, float, float] = (0, 0, 0)) -> None:
+		"""
+		Stroke a rectangle with corners rounded by `r`.
+		"""
+		k = r * 0.5523
+		self._op(*color, 'RG')
+		self._op(width, 'w', x + r, y, 'm', x + w - r, y, 'l')
+		self._op(x + w - r + k, y, x + w, y + r - k, x + w, y + r, 'c', x + w, y + h - r, 'l')
+		self._op(x + w, y + h - r + k, x + w - r + k, y + h, x + w - r, y + h, 'c', x + r, y + h, 'l')
+		self._op(x + r - k, y + h, x, y + h - r + k, x, y + h - r, 'c', x, y + r, 'l')
+		self._op(x, y + r - k, x + r - k, y, x + r, y, 'c', 'h', 'S')
+
+	def image(self, image: PngImage, x: float, y: float, w: float, h: float) -> None:
+		name = self.doc.image_resource(image)
+		self.images[name] = image
+		self._op('q', w, 0, 0, h, x, y, 'cm', f'/{name}', 'Do', 'Q')
+
+	def link(self, x: float, y: float, w: float, h: float, uri: str) -> None:
+		self.links.append(([x, y, x + w, y + h], uri))
+
+
+class PdfDocument:
+	"""
+	A PDF built in memory and written in one go.
+
+	The output only depends on what was drawn: no dates, subset names and the file ID are
+	derived from the content, so the same document always gives the same bytes.
+	"""
+
+	def __init__(self, title: str | None = None, producer: str | None = None):
+		self.title = title
+		self.producer = producer
+		self._objects: list[bytes | None] = []
+		self._pages: list[Page] = []
+		self._fonts: dict[int, tuple[str, Font, dict[int, str]]] = {}
+		self._images: dict[int, tuple[str, PngImage]] = {}
+
+	def _reserve(self) -> Ref:
+		self._objects.append(None)
+		return Ref(len(self._objects))
+
+	def add(self, obj: dict, stream: bytes | None = None, compressed: bool = False, ref: Ref | None = None) -> Ref:
+		"""
+		Add an object, or a stream with `obj` as its dictionary. Streams are compressed unless
+		`compressed` says they already are.
+		"""
+		ref = self._reserve() if ref is None else ref
+		if stream is None:
+			body = serialize(obj)
+		else:
+			if not compressed:
+				stream = zlib.compress(stream, COMPRESSION)
+				obj = obj | {'Filter': Name('FlateDecode')}
+			body = serialize(obj | {'Length': len(stream)}) + b'\nstream\n' + stream + b'\nendstream'
+		self._objects[ref.num - 1] = b'%d 0 obj\n' % ref.num + body + b'\nendobj\n'
+		return ref
+
+	def font_resource(self, font: Font) -> str:
+		if id(font) not in self._fonts:
+			self._fonts[id(font)] = (f'F{len(self._fonts) + 1}', font, {})
+		return self._fonts[id(font)][0]
+
+	def image_resource(self, image: PngImage) -> str:
+		if id(image) not in self._images:
+			self._images[id(image)] = (f'Im{len(self._images) + 1}', image)
+		return self._images[id(image)][0]
+
+	def encode(self, font: Font, text: str) -> bytes:
+		return font.encode(text, self._fonts[id(font)][2])
+
+	def add_page(self, width: float, height: float) -> Page:
+		page = Page(self, width, height)
+		self._pages.append(page)
+		return page
+
+	def write(self, out: BinaryIO) -> int:
+		"""
+		Write the document to the binary file `out`. Returns its size.
+		"""
+		catalog, pages = self._reserve(), self._reserve()
+		fonts = {name: font.embed(self, used) for name, font, used in self._fonts.values()}
+		images = {name: image.embed(self) for name, image in self._images.values()}
+
+		kids = []
+		for page in self._pages:
+			ref = self._reserve()
+			content = self.add({}, b'\n'.join(page.ops))
+			resources = {}
+			if page.fonts:
+				resources['Font'] = {name: fonts[name] for name in page.fonts}
+			if page.images:
+				resources['XObject'] = {name: images[name] for name in page.images}
+			obj = {
+				'Type': Name('Page'),
+				'Parent': pages,
+				'MediaBox': [0, 0, page.width, page.height],
+				'Resources': resources,
+				'Contents': content,
+			}
+			if page.links:
+				obj['Annots'] = [
+					self.add({
+						'Type': Name('Annot'),
+						'Subtype': Name('Link'),
+						'Rect': rect,
+						'Border': [0, 0, 0],
+						'A': {'S': Name('URI'), 'URI': uri},
+					})
+					for rect, uri in page.links
+				]
+			self.add(obj, ref=ref)
+			kids.append(ref)
+		self.add({'Type': Name('Pages'), 'Kids': kids, 'Count': len(kids)}, ref=pages)
+		self.add({'Type': Name('Catalog'), 'Pages': pages}, ref=catalog)
+		info = {}
+		if self.title:
+			info['Title'] = self.title
+		if self.producer:
+			info['Producer'] = self.producer
+		info = self.add(info)
+
+		h = hashlib.md5()
+		size = out.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+		offsets = []
+		for obj in self._objects:
+			offsets.append(size)
+			h.update(obj)
+			size += out.write(obj)
+		xref = size
+		size += out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+		size += out.write(b''.join(b'%010d 00000 n \n' % o for o in offsets))
+		size += out.write(
+			b'trailer\n' + serialize({'Size': len(offsets) + 1, 'Root': catalog, 'Info': info, 'ID': [h.digest(), h.digest()]})
+			+ b'\nstartxref\n%d\n%%%%EOF\n' % xref
+		)
+		return size
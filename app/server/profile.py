@@ -0,0 +1,273 @@
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import quote
+from datetime import datetime, timedelta, timezone
+
+from .config import get_config
+from .connections import Connections
+from .session import Session
+from .campuses import CAMPUS_FIELDS, get_campuses
+from .metrics import PROFILE_FETCHES
+from .log import get_logger
+
+
+log = get_logger('profile')
+
+
+PROFILE_FIELDS = (
+	'id', 'login', 'first_name', 'last_name', 'email',
+	'active?', 'alumni?', 'alumnized_at', 'pool_month', 'pool_year',
+)
+CURSUS_USER_FIELDS = ('begin_at', 'grade', 'level')
+CAMPUS_USER_FIELDS = ('campus_id', 'is_primary')
+PROJECT_USER_FIELDS = ('id', 'final_mark', 'current_team_id', 'updated_at')
+PROJECT_FIELDS = ('id', 'name', 'parent_id')
+
+
+def _pick(obj: dict, fields: tuple) -> dict:
+	return {k: obj.get(k) for k in fields}
+
+
+def trim_profile(me: dict) -> dict:
+	"""
+	Keep only the parts of a `/v2/me` payload used by `/auth` and `get_transcript_data`.
+	"""
+	return _pick(me, PROFILE_FIELDS) | {
+		'image': {'link': (me.get('image') or {}).get('link')},
+		'cursus_users': [_pick(cu, CURSUS_USER_FIELDS) for cu in me.get('cursus_users', [])],
+		'campus_users': [_pick(cpu, CAMPUS_USER_FIELDS) for cpu in me.get('campus_users', [])],
+		'campus': [trim_campus(cp) for cp in me.get('campus', [])],
+		'projects_users': [trim_project_user(p) for p in me.get('projects_users', [])],
+	}
+
+
+def trim_campus(cp: dict) -> dict:
+	# Campuses known to the directory are resolved from it: keep their id only
+	if get_campuses().get(cp.get('id')) is not None:
+		return {'id': cp.get('id')}
+	return _pick(cp, CAMPUS_FIELDS)
+
+
+def trim_project_user(p: dict) -> dict:
+	return _pick(p, PROJECT_USER_FIELDS) | {'project': _pick(p['project'], PROJECT_FIELDS)}
+
+
+def merge_projects(profile: dict, delta: list[dict]) -> dict:
+	"""
+	Copy of `profile` with the (trimmed) projects_users of `delta` added, or replacing the ones
+	with the same id.
+	"""
+	projects = {p['id']: p for p in profile['projects_users']}
+	for p in delta:
+		projects[p['id']] = p
+	return profile | {'projects_users': list(projects.values())}
+
+
+def projects_cursor(profile: dict) -> str | None:
+	"""
+	Latest `updated_at` of the profile's projects_users: what a delta has to be fetched from.
+	None if the projects_users cannot be merged with a delta (no id or `updated_at`).
+	"""
+	projects = profile['projects_users']
+	if any(p.get('id') is None or not p.get('updated_at') for p in projects):
+		return None
+	return max((p['updated_at'] for p in projects), default=None)
+
+
+class SnapshotStore:
+	"""
+	SQLite (WAL) table of the last trimmed profile of each user, shared by all the workers and
+	kept across restarts.
+
+	A snapshot younger than `ttl` (since its last full `/v2/me`) is brought up to date with only
+	the projects_users updated since its cursor. Older ones are fetched in full again, which also
+	picks up the changes deltas cannot see (profile fields, deleted projects_users).
+	Snapshots not used for `max_age` seconds are dropped.
+	"""
+
+	def __init__(self, path: str, ttl: float = 86400, max_age: float = 30 * 86400):
+		self.path = path
+		self.ttl = ttl
+		self.max_age = max_age
+		self._connections = Connections(self.path, self._setup)
+
+	@staticmethod
+	def _setup(db: sqlite3.Connection) -> None:
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS snapshots ('
+			'uid INTEGER PRIMARY KEY, profile TEXT NOT NULL, full REAL NOT NULL, updated REAL NOT NULL)'
+		)
+
+	def _db(self) -> sqlite3.Connection:
+		return self._connections.get()
+
+	def get(self, uid: int) -> dict | None:
+		"""
+		Return the snapshot of `uid` if it can still be refreshed with a delta.
+		"""
+		row = self._db().execute(
+			'SELECT profile FROM snapshots WHERE uid = ? AND full > ?', (uid, time.time() - self.ttl)
+		).fetchone()
+		return json.loads(row[0]) if row is not None else None
+
+	def put(self, uid: int, profile: dict, full: bool) -> None:
+		now = time.time()
+		db = self._db()
+		profile = json.dumps(profile, ensure_ascii=False, separators=(',', ':'))
+		if full:
+			db.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)', (uid, profile, now, now))
+			db.execute('DELETE FROM snapshots WHERE updated < ?', (now - self.max_age,))
+		else:
+			db.execute('UPDATE snapshots SET profile = ?, updated = ? WHERE uid = ?', (profile, now, uid))
+
+	def touch(self, uid: int) -> None:
+		self._db().execute('UPDATE snapshots SET updated = ? WHERE uid = ?', (time.time(), uid))
+
+	def expire(self, uid: int) -> None:
+		"""
+		Make the next `get` of `uid` miss, so that its profile is fetched in full again.
+		"""
+		self._db().execute('UPDATE snapshots SET full = 0 WHERE uid = ?', (uid,))
+
+
+class ProfileCache:
+	"""
+	Per-process TTL cache of trimmed user profiles, keyed by 42 user id.
+	"""
+
+	def __init__(self, ttl: float = 300):
+		self.ttl = ttl
+		self._entries: dict[int, tuple[float, dict]] = {}
+		self._lock = threading.Lock()
+
+	def get(self, uid: int | None) -> dict | None:
+		if uid is None:
+			return None
+		with self._lock:
+			entry = self._entries.get(uid)
+			if entry is None:
+				return None
+			if entry[0] < time.time():
+				del self._entries[uid]
+				return None
+			return entry[1]
+
+	def put(self, uid: int, profile: dict) -> None:
+		with self._lock:
+			now = time.time()
+			# Opportunistic sweep so that users who never come back do not pile up
+			for k in [k for k, (exp, _) in self._entries.items() if exp < now]:
+				del self._entries[k]
+			self._entries[uid] = (now + self.ttl, profile)
+
+	def invalidate(self, uid: int | None) -> None:
+		with self._lock:
+			self._entries.pop(uid, None)
+
+
+_cache: ProfileCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ProfileCache:
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			_cache = ProfileCache(ttl=get_config().profile_ttl)
+		return _cache
+
+
+_snapshots: SnapshotStore | None = None
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshots() -> SnapshotStore:
+	global _snapshots
+	with _snapshots_lock:
+		if _snapshots is None:
+			config = get_config()
+			_snapshots = SnapshotStore(config.profile_db, ttl=config.profile_snapshot_ttl)
+		return _snapshots
+
+
+def _refresh_snapshot(sess: dict, uid: int, feedback_error: bool = True) -> dict | None:
+	"""
+	Bring the snapshot of `uid` up to date with the projects_users updated since it was taken.
+
+	Returns:
+		dict | None: The updated profile, the API error dict, or None if there is no usable snapshot.
+	"""
+	snapshots = get_snapshots()
+	if (profile := snapshots.get(uid)) is None or (cursor := projects_cursor(profile)) is None:
+		return None
+	# Day-aligned so that the URL, hence its cached response, stays the same all day long
+	until = (datetime.now(timezone.utc).date() + timedelta(days=2)).strftime('%Y-%m-%dT00:00:00.000Z')
+	delta = Session.get(
+		sess, f'/v2/users/{uid}/projects_users',
+		fetch_all=True, feedback_error=feedback_error,
+		**{'range[updated_at]': f'{cursor},{until}'},
+	)
+	if 'error' in delta:
+		return delta
+	PROFILE_FETCHES.inc(kind='delta')
+	log.debug("<%s> %d projects_users updated since %s", uid, len(delta['data']), cursor)
+	if delta['data']:
+		profile = merge_projects(profile, [trim_project_user(p) for p in delta['data']])
+		snapshots.put(uid, profile, full=False)
+	else:
+		snapshots.touch(uid)
+	return profile
+
+
+def get_profile(sess: dict, refresh: bool = False, feedback_error: bool = True, login: str | None = None) -> dict:
+	"""
+	Return the trimmed `/v2/me` profile of the session's user, fetching it only on a cache miss.
+	A known user is served from its snapshot, refreshed with the projects_users updated since.
+	Sets `sess['uid']` once the user is known.
+
+	With `login`, return the `/v2/users/:login` profile of that user instead, as seen by `sess`
+	(e.g. an app session). Those are neither cached nor tied to the session.
+
+	Returns:
+		dict: The trimmed profile, or the API error dict.
+	"""
+	if login is not None:
+		user = Session.get(sess, f'/v2/users/{quote(login, safe='')}', feedback_error=feedback_error)
+		if 'error' in user:
+			return user
+		if user.get('status_code') == 404:
+			# The API answers an unknown login with an empty object
+			return {'status_code': 404, 'error': 'Not Found', 'text': f'No user {login}.'}
+		return trim_profile(user)
+
+	cache = get_cache()
+	uid = sess.get('uid')
+	if not refresh and (profile := cache.get(uid)) is not None:
+		return profile
+	if not refresh and uid is not None and (profile := _refresh_snapshot(sess, uid, feedback_error)) is not None:
+		if 'error' not in profile:
+			cache.put(uid, profile)
+		return profile
+
+	me = Session.get(sess, '/v2/me', feedback_error=feedback_error)
+	if 'error' in me:
+		return me
+	PROFILE_FETCHES.inc(kind='full')
+	profile = trim_profile(me)
+	sess['uid'] = profile['id']
+	cache.put(profile['id'], profile)
+	get_snapshots().put(profile['id'], profile, full=True)
+	return profile
+
+
+def invalidate_profile(sess: dict | None) -> None:
+	"""
+	Forget the profile of the session's user: its snapshot, shared by all the workers, is expired
+	so that the next login fetches it in full. Other workers may still serve it from their own
+	cache for up to PROFILE_TTL seconds.
+	"""
+	if sess is not None and (uid := sess.get('uid')) is not None:
+		get_cache().invalidate(uid)
+		get_snapshots().expire(uid)
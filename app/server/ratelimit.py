@@ -0,0 +1,186 @@
+import time
+import math
+import sqlite3
+import threading
+import requests
+
+from .config import get_config
+from .connections import Connections
+from .metrics import REGISTRY
+
+
+class RateLimited(requests.RequestException):
+	"""
+	Raised when a request cannot be scheduled before its deadline.
+	"""
+
+	def __init__(self, retry_after: float, *args, **kwargs):
+		self.retry_after = retry_after
+		super().__init__(f"Rate limit reached, retry in {retry_after:.1f}s.", *args, **kwargs)
+
+
+class RateLimiter:
+	"""
+	Token-bucket scheduler shared by all the workers of the host through a SQLite file.
+
+	Implemented as a GCRA: the bucket only stores its theoretical arrival time (`tat`).
+	Each caller atomically reserves the next free slot and then sleeps until it, so callers
+	are served in the order they asked, whichever worker they live in. A caller whose slot
+	would fall after its deadline does not reserve anything and gets `RateLimited` instead.
+
+	Responses are fed back through `feedback` to honour `Retry-After` and the 42 API's
+	`X-Secondly-Ratelimit-*`/`X-Hourly-Ratelimit-*` headers by blocking the bucket.
+	"""
+
+	def __init__(
+			self,
+			path: str,
+			rate: float = 2,
+			burst: int = 2,
+			deadline: float = 10,
+			name: str = 'api',
+			clock=time.time,
+			sleep=time.sleep,
+			):
+		self.path = path
+		self.rate = rate
+		self.burst = max(1, burst)
+		self.deadline = deadline
+		self.name = name
+		# Injectable, for tests
+		self.clock = clock
+		self.sleep = sleep
+		self.interval = 1 / rate if rate > 0 else 0
+		self.tolerance = (self.burst - 1) * self.interval
+		self.acquired = 0
+		self.rejected = 0
+		self.throttled = 0
+		self.waited = 0.0
+		self._lock = threading.Lock()
+		self._connections = Connections(self.path, self._setup)
+
+	def _setup(self, db: sqlite3.Connection) -> None:
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS buckets ('
+			'name TEXT PRIMARY KEY, tat REAL NOT NULL, blocked_until REAL NOT NULL)'
+		)
+		db.execute('INSERT OR IGNORE INTO buckets VALUES (?, 0, 0)', (self.name,))
+
+	def _db(self) -> sqlite3.Connection:
+		return self._connections.get()
+
+	def acquire(self, deadline: float | None = None) -> float:
+		"""
+		Wait for a slot.
+
+		Args:
+			deadline (float | None): Max seconds to wait, defaults to the limiter's deadline.
+
+		Returns:
+			float: The time waited, in seconds.
+
+		Raises:
+			RateLimited: If no slot is available before the deadline.
+		"""
+		if self.interval == 0:
+			return 0.0
+		deadline = self.deadline if deadline is None else deadline
+		with self._connections.transaction() as db:
+			tat, blocked_until = db.execute(
+				'SELECT tat, blocked_until FROM buckets WHERE name = ?', (self.name,)
+			).fetchone()
+			now = self.clock()
+			tat = max(tat, now, blocked_until + self.tolerance)
+			allow_at = tat - self.tolerance
+			if allow_at - now > deadline:
+				with self._lock:
+					self.rejected += 1
+				raise RateLimited(allow_at - now)
+			db.execute('UPDATE buckets SET tat = ? WHERE name = ?', (tat + self.interval, self.name))
+		wait = max(0.0, allow_at - now)
+		if wait > 0:
+			self.sleep(wait)
+		with self._lock:
+			self.acquired += 1
+			self.waited += wait
+		return wait
+
+	def block(self, until: float) -> None:
+		"""
+		Hold every caller until the timestamp `until`.
+		"""
+		db = self._db()
+		db.execute(
+			'UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?',
+			(until, self.name),
+		)
+
+	def feedback(self, res: requests.Response) -> None:
+		"""
+		Update the bucket from the rate-limit headers of an upstream response.
+		"""
+		now = self.clock()
+		until = 0.0
+		if res.status_code == 429:
+			with self._lock:
+				self.throttled += 1
+			try:
+				until = now + float(res.headers.get('Retry-After', 1))
+			except ValueError:
+				until = now + 1
+		if res.headers.get('X-Secondly-Ratelimit-Remaining') == '0':
+			until = max(until, math.floor(now) + 1)
+		if res.headers.get('X-Hourly-Ratelimit-Remaining') == '0':
+			until = max(until, now - now % 3600 + 3600)
+		if until > now:
+			self.block(until)
+
+	def stats(self) -> dict:
+		tat, blocked_until = self._db().execute(
+			'SELECT tat, blocked_until FROM buckets WHERE name = ?', (self.name,)
+		).fetchone()
+		now = self.clock()
+		with self._lock:
+			return {
+				'rate': self.rate,
+				'burst': self.burst,
+				'delay': max(0.0, max(tat, blocked_until + self.tolerance) - self.tolerance - now),
+				'blocked': max(0.0, blocked_until - now),
+				'acquired': self.acquired,
+				'rejected': self.rejected,
+				'throttled': self.throttled,
+				'waited': self.waited,
+			}
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+	global _limiter
+	with _limiter_lock:
+		if _limiter is None:
+			config = get_config()
+			_limiter = RateLimiter(
+				path=config.rate_limit_db,
+				rate=config.rate_limit,
+				burst=config.rate_burst,
+				deadline=config.rate_deadline,
+			)
+		return _limiter
+
+
+@REGISTRY.collector
+def _collect() -> dict:
+	if _limiter is None:
+		return {}
+	stats = _limiter.stats()
+	return {
+		'ft_rate_limit_delay_seconds': ('Wait a new 42 API request would have for a slot.', stats['delay']),
+		'ft_rate_limit_blocked_seconds': ('Remaining time the 42 API asked us to back off.', stats['blocked']),
+		'ft_rate_limit_acquired_total': ('42 API slots granted to this worker.', stats['acquired']),
+		'ft_rate_limit_rejected_total': ('42 API requests of this worker rejected past their deadline.', stats['rejected']),
+		'ft_rate_limit_throttled_total': ('429 answers received by this worker.', stats['throttled']),
+		'ft_rate_limit_waited_seconds_total': ('Total time this worker waited for slots.', stats['waited']),
+	}
@@ -0,0 +1,353 @@
+import io
+import os
+import queue
+import signal
+import threading
+import subprocess
+from math import ceil
+from typing import BinaryIO
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+from .config import get_config
+from .metrics import REGISTRY
+from .templates import get_assets_dir
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Slack given to a waiting caller on top of the render timeouts, see `RenderPool.result`
+RESULT_MARGIN = 5
+
+PDF_OPTIONS = {
+	'page-size': 'A4',
+	'margin-top': '0.15in',
+	'margin-right': '0.15in',
+	'margin-bottom': '0.15in',
+	'margin-left': '0.15in',
+	'encoding': 'UTF-8',
+	'no-outline': None,
+}
+
+
+class RenderError(Exception):
+	pass
+
+
+class RenderTimeout(RenderError):
+	pass
+
+
+class RenderQueueFull(RenderError):
+	pass
+
+
+class RenderPool:
+	"""
+	Bounded pool of warm wkhtmltopdf renderers.
+
+	Each slot keeps one wkhtmltopdf process already spawned and blocked on its stdin, so the
+	fork/exec and Qt start-up are paid in the background instead of inside the request.
+	A job hands its HTML to a warm process, copies the PDF from its stdout to the job's output
+	file as it comes, and the slot immediately spawns the next process. Dead or hung processes are killed and replaced.
+	"""
+
+	def __init__(
+			self,
+			size: int = 2,
+			queue_size: int = 16,
+			timeout: float = 30,
+			options: dict | None = None,
+			):
+		self.size = max(1, size)
+		self.queue_size = max(1, queue_size)
+		self.timeout = timeout
+		self.options = PDF_OPTIONS if options is None else options
+
+		import pdfkit
+		self._configuration = pdfkit.configuration()
+		self._command = list(pdfkit.PDFKit('', 'string', options=self.options, configuration=self._configuration).command())
+		self._jobs: queue.Queue = queue.Queue(maxsize=self.queue_size)
+		self._workers: list[threading.Thread] = []
+		self._lock = threading.Lock()
+		self._closed = False
+		self._busy = 0
+		self._restarts = 0
+		self._rendered = 0
+		self._failed = 0
+
+	def _spawn(self) -> subprocess.Popen:
+		try:
+			return subprocess.Popen(
+				self._command,
+				stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+				# Own process group, so a kill also reaches any helper holding stdout open
+				start_new_session=True,
+			)
+		except OSError as e:
+			raise RenderError(f"Could not start wkhtmltopdf: [{e.__class__.__name__}] {e}") from e
+
+	def _kill(self, proc: subprocess.Popen | None) -> None:
+		if proc is None or proc.poll() is not None:
+			return
+		try:
+			os.killpg(proc.pid, signal.SIGKILL)
+		except OSError:
+			proc.kill()
+		try:
+			proc.wait(timeout=1)
+		except Exception:
+			pass
+
+	def _render(self, proc: subprocess.Popen, html: str, timeout: float, out: BinaryIO) -> int:
+		"""
+		Feed `html` to `proc` and copy the PDF to `out` chunk by chunk as wkhtmltopdf writes it,
+		so the document is never held in memory. Returns the PDF size.
+		"""
+		expired = threading.Event()
+
+		def expire():
+			expired.set()
+			self._kill(proc)
+
+		def feed():
+			try:
+				proc.stdin.write(html.encode('utf-8'))
+				proc.stdin.close()
+			except OSError:
+				pass
+
+		err = []
+		timer = threading.Timer(timeout, expire)
+		threads = [
+			threading.Thread(target=feed, daemon=True),
+			threading.Thread(target=lambda: err.append(proc.stderr.read()), daemon=True),
+		]
+		timer.start()
+		for t in threads:
+			t.start()
+		head = b''
+		size = 0
+		try:
+			while chunk := proc.stdout.read(CHUNK_SIZE):
+				if len(head) < 4:
+					head += chunk[:4 - len(head)]
+				out.write(chunk)
+				size += len(chunk)
+			proc.wait()
+		finally:
+			timer.cancel()
+			for t in threads:
+				t.join(timeout=1)
+		if expired.is_set():
+			raise RenderTimeout(f"wkhtmltopdf did not finish within {timeout}s.")
+		# wkhtmltopdf exits with 1 on non-fatal warnings (e.g. a missing remote asset) but still writes the PDF
+		if head != b'%PDF':
+			raise RenderError(f"wkhtmltopdf exited with code {proc.returncode}: {b''.join(err).decode('utf-8', 'replace').strip()}")
+		return size
+
+	def _respawn(self) -> subprocess.Popen | None:
+		"""
+		Spawn the next warm process. If that fails, fail every queued job rather than leaving
+		it waiting, and return None: the next job tries again.
+		"""
+		try:
+			return self._spawn()
+		except Exception as e:
+			self._fail_pending(e if isinstance(e, RenderError) else RenderError(f"[{e.__class__.__name__}] {e}"))
+			return None
+
+	def _fail_pending(self, error: RenderError) -> None:
+		stops = 0
+		while True:
+			try:
+				job = self._jobs.get_nowait()
+			except queue.Empty:
+				break
+			if job is None:
+				stops += 1
+				continue
+			if job[0].set_running_or_notify_cancel():
+				job[0].set_exception(error)
+				with self._lock:
+					self._failed += 1
+		# Shutdown sentinels are for the workers
+		for _ in range(stops):
+			self._jobs.put(None)
+
+	def _worker(self) -> None:
+		proc = self._respawn()
+		while True:
+			job = self._jobs.get()
+			if job is None:
+				self._kill(proc)
+				return
+			future, html, timeout, out = job
+			if not future.set_running_or_notify_cancel():
+				continue
+			with self._lock:
+				self._busy += 1
+			try:
+				if proc is None or proc.poll() is not None:
+					# The warm process crashed while idle, or could not be started
+					proc = self._spawn()
+					with self._lock:
+						self._restarts += 1
+				start = out.tell()
+				try:
+					result = self._render(proc, html, timeout, out)
+				except RenderTimeout:
+					raise
+				except RenderError:
+					if proc.returncode is None or proc.returncode >= 0:
+						raise
+					# Killed by a signal: retry once on a fresh process
+					proc = self._spawn()
+					with self._lock:
+						self._restarts += 1
+					out.seek(start)
+					out.truncate()
+					result = self._render(proc, html, timeout, out)
+				future.set_result(result)
+				with self._lock:
+					self._rendered += 1
+			except BaseException as e:
+				future.set_exception(e)
+				with self._lock:
+					self._failed += 1
+			finally:
+				with self._lock:
+					self._busy -= 1
+				self._kill(proc)
+				proc = self._respawn()
+
+	def _ensure_workers(self) -> None:
+		with self._lock:
+			if self._closed:
+				raise RenderError("Render pool is shut down.")
+			self._workers = [w for w in self._workers if w.is_alive()]
+			while len(self._workers) < self.size:
+				w = threading.Thread(target=self._worker, name=f'render-{len(self._workers)}', daemon=True)
+				w.start()
+				self._workers.append(w)
+
+	def submit(self, html: str, out: BinaryIO, timeout: float | None = None) -> Future:
+		"""
+		Queue an HTML document for rendering into the binary file `out`.
+		The future resolves to the size of the PDF.
+
+		Raises:
+			RenderQueueFull: If `queue_size` jobs are already waiting.
+		"""
+		self._ensure_workers()
+		future = Future()
+		try:
+			self._jobs.put_nowait((future, html, self.timeout if timeout is None else timeout, out))
+		except queue.Full:
+			raise RenderQueueFull(f"Render queue is full ({self.queue_size} jobs waiting).")
+		return future
+
+	def render(self, html: str, timeout: float | None = None) -> bytes:
+		"""
+		Render `html` to PDF bytes, blocking until done.
+
+		`timeout` bounds the render itself; the wait in the queue is bounded by the queue size.
+		"""
+		out = io.BytesIO()
+		self.result(self.submit(html, out, timeout), timeout)
+		return out.getvalue()
+
+	def render_to(self, html: str, out: BinaryIO, timeout: float | None = None) -> int:
+		"""
+		Render `html` into the binary file `out`, blocking until done. Returns the PDF size.
+		"""
+		return self.result(self.submit(html, out, timeout), timeout)
+
+	def result(self, future: Future, timeout: float | None = None) -> int:
+		"""
+		Wait for a submitted job: at most the render timeouts of the jobs that can be ahead of
+		it and its own, plus `RESULT_MARGIN`, so that a wedged pool never blocks the caller.
+
+		Raises:
+			RenderTimeout: If the job did not complete in time. It is cancelled if still queued.
+		"""
+		timeout = max(self.timeout, self.timeout if timeout is None else timeout)
+		bound = timeout * (1 + ceil(self.queue_size / self.size)) + RESULT_MARGIN
+		try:
+			return future.result(bound)
+		except FutureTimeout:
+			future.cancel()
+			raise RenderTimeout(f"The render did not complete within {bound:.0f}s.")
+
+	def shutdown(self) -> None:
+		with self._lock:
+			if self._closed:
+				return
+			self._closed = True
+			workers = list(self._workers)
+		for _ in workers:
+			self._jobs.put(None)
+		for w in workers:
+			w.join(timeout=self.timeout)
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				'size': self.size,
+				'busy': self._busy,
+				'queued': self._jobs.qsize(),
+				'queue_size': self.queue_size,
+				'rendered': self._rendered,
+				'failed': self._failed,
+				'restarts': self._restarts,
+			}
+
+
+_pool: RenderPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> RenderPool:
+	"""
+	Return the render pool of the current process, creating it on first use.
+	Created lazily (and per PID) so that each forked worker owns its own renderers.
+	"""
+	global _pool, _pool_pid
+	with _pool_lock:
+		if _pool is None or _pool_pid != os.getpid():
+			config = get_config()
+			_pool = RenderPool(
+				size=config.render_pool_size,
+				queue_size=config.render_queue_size,
+				timeout=config.render_timeout,
+				# Images of the built templates are local files
+				options=PDF_OPTIONS | {'allow': get_assets_dir()},
+			)
+			_pool_pid = os.getpid()
+		return _pool
+
+
+def render_pdf(html: str, timeout: float | None = None) -> bytes:
+	return get_pool().render(html, timeout)
+
+
+def render_pdf_to(html: str, out: BinaryIO, timeout: float | None = None) -> int:
+	return get_pool().render_to(html, out, timeout)
+
+
+@REGISTRY.collector
+def _collect() -> dict:
+	if _pool is None or _pool_pid != os.getpid():
+		return {}
+	stats = _pool.stats()
+	return {
+		'ft_render_pool_size': ('Renderers of this worker.', stats['size']),
+		'ft_render_pool_busy': ('Renderers currently rendering.', stats['busy']),
+		'ft_render_queue_depth': ('Render jobs waiting for a renderer.', stats['queued']),
+		'ft_render_rendered_total': ('PDFs rendered by this worker.', stats['rendered']),
+		'ft_render_failed_total': ('PDF renders that failed in this worker.', stats['failed']),
+		'ft_render_restarts_total': ('Renderers restarted after a crash.', stats['restarts']),
+	}
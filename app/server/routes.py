@@ -1,16 +1,28 @@
-import io
+import os
+import hmac
 import json
-import pdfkit
-from flask import Blueprint, redirect, request, session, send_file, Response
+import mimetypes
+from flask import Blueprint, abort, current_app, redirect, request, session, send_file, send_from_directory, Response
+from werkzeug.wsgi import wrap_file
 
 from .data import Data
 from .utils import render_template, session_error, session_success
 from .session import Session
-from .transcript import get_transcript_data
+from .transcript import get_transcript_data, get_transcript_pdf, transcript_etag, render_transcript_html
+from .templates import get_assets_dir
+from .assets import get_assets
+from .profile import get_profile, invalidate_profile
+from .jobs import get_manager
+from .metrics import REGISTRY
+from .config import get_config
 
 
 main_bp = Blueprint('main', __name__)
 
+ASSET_MAX_AGE = 365 * 86400
+# Static files, cached publicly: no session storage or cookie, see `sessionstore.SessionlessEndpoints`
+SESSIONLESS_ENDPOINTS = ('static', 'main.asset', 'main.transcript_asset')
+
 """
 Jinja variables:
 
@@ -60,7 +72,7 @@ def auth():
 		return redirect('/')
 
 	try:
-		me = Session.get(sess, '/v2/me')
+		me = get_profile(sess, refresh=True)
 		if 'error' in me:
 			raise Exception()
 
@@ -86,13 +98,13 @@ def auth():
 				'grade_title': '',
 				'level': '--.--',
 			}
-	session[Data.S_SESSION] = sess
+	session[Data.S_SESSION] = Session.compact(sess)
 	return redirect('/')
 
 
 @main_bp.route('/logout')
 def logout():
-	session.pop(Data.S_SESSION, None)
+	invalidate_profile(session.pop(Data.S_SESSION, None))
 	return redirect('/')
 
 
@@ -105,18 +117,169 @@ def transcript():
 	data = get_transcript_data(sess)
 	if 'error' in data:
 		return Response(json.dumps(data, ensure_ascii=False), mimetype='application/json')
-	html = render_template('transcript.html', **data)
-	result = pdfkit.from_string(html, False, options={
-		'page-size': 'A4',
-		'margin-top': '0.15in',
-		'margin-right': '0.15in',
-		'margin-bottom': '0.15in',
-		'margin-left': '0.15in',
-		'encoding': 'UTF-8',
-		'no-outline': None,
-	})
-	return send_file(
-		io.BytesIO(result),
-		download_name=f'{data['name']}.pdf',
-		mimetype='application/pdf'
+
+	path, temporary, hit = get_transcript_pdf(data)
+	response = send_pdf(path, f'{data['name']}.pdf', temporary)
+	response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+	return response
+
+
+@main_bp.route('/transcript.json')
+def transcript_json():
+	sess = Session.get_current()
+	if sess is None or not sess['valid']:
+		return json_response({'error': 'Unauthorized', 'status_code': 401}, 401)
+
+	data = get_transcript_data(sess)
+	if 'error' in data:
+		return json_response(data, data.get('status_code', 502))
+	return revalidate(transcript_etag(data), lambda: json_response(data))
+
+
+@main_bp.route('/transcript/preview')
+def transcript_preview():
+	sess = Session.get_current()
+	if sess is None or not sess['valid']:
+		return redirect('/')
+
+	data = get_transcript_data(sess)
+	if 'error' in data:
+		return json_response(data, data.get('status_code', 502))
+	return revalidate(
+		transcript_etag(data, preview=True),
+		lambda: Response(render_transcript_html(data, '/transcript/assets/'), mimetype='text/html'),
+	)
+
+
+@main_bp.route('/transcript/assets/<name>')
+def transcript_asset(name: str):
+	# Named after their content, see `templates.extract_images`
+	response = send_from_directory(get_assets_dir(), name, max_age=ASSET_MAX_AGE)
+	response.cache_control.immutable = True
+	return response
+
+
+@main_bp.route('/assets/<path:name>')
+def asset(name: str):
+	# Fingerprinted, see `assets.Assets`
+	assets = get_assets()
+	if (variant := assets.variant(name, request.accept_encodings)) is None:
+		abort(404)
+	path, encoding = variant
+	response = send_from_directory(
+		assets.build_dir, path,
+		mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+		max_age=ASSET_MAX_AGE,
 	)
+	response.cache_control.immutable = True
+	if encoding is not None:
+		response.headers['Content-Encoding'] = encoding
+	if assets.encodings[name]:
+		response.vary.add('Accept-Encoding')
+	return response
+
+
+def revalidate(etag: str, render) -> Response:
+	"""
+	Answer 304 without calling `render` when the client already holds `etag`, or the response
+	returned by `render` otherwise. Both are tagged with `etag`, private, and revalidated on
+	every view.
+	"""
+	if request.if_none_match.contains_weak(etag):
+		response = Response(status=304)
+	else:
+		response = render()
+	response.set_etag(etag)
+	response.cache_control.private = True
+	response.cache_control.no_cache = True
+	response.vary.add('Cookie')
+	return response
+
+
+def send_pdf(path: str, name: str, temporary: bool = False) -> Response:
+	"""
+	Serve the PDF at `path` from disk.
+
+	Cached PDFs go through `send_file` (zero-copy `wsgi.file_wrapper`, or X-Sendfile when
+	`SENDFILE=x-sendfile`), or are handed to nginx with `X-Accel-Redirect` when
+	`SENDFILE=x-accel-redirect`. A temporary PDF is unlinked as soon as it is opened and
+	streamed from the open file.
+	"""
+	if temporary:
+		f = open(path, 'rb')
+		os.remove(path)
+		response = Response(wrap_file(request.environ, f), mimetype='application/pdf', direct_passthrough=True)
+		response.content_length = os.fstat(f.fileno()).st_size
+	elif get_config().sendfile == 'x-accel-redirect':
+		if not os.path.isfile(path):
+			raise FileNotFoundError(path)
+		response = Response(mimetype='application/pdf')
+		response.headers['X-Accel-Redirect'] = f'{get_config().sendfile_prefix.rstrip('/')}/{os.path.basename(path)}'
+	else:
+		return send_file(path, download_name=name, mimetype='application/pdf')
+	response.headers.set('Content-Disposition', 'inline', filename=name)
+	return response
+
+
+def json_response(data: dict, status: int = 200) -> Response:
+	return Response(json.dumps(data, ensure_ascii=False), status=status, mimetype='application/json')
+
+
+def job_status(job: dict) -> dict:
+	return {
+		'id': job['id'],
+		'status': job['status'],
+		'error': job['error'],
+		'download': f'/transcript/jobs/{job['id']}/download' if job['status'] == 'done' else None,
+	}
+
+
+def get_job(job_id: str) -> tuple[dict | None, Response | None]:
+	sess = Session.get_current()
+	if sess is None or not sess['valid']:
+		return None, json_response({'error': 'Unauthorized', 'status_code': 401}, 401)
+	job = get_manager().get(job_id)
+	if job is None or job['owner'] != sess.get('uid'):
+		return None, json_response({'error': 'Not Found', 'status_code': 404}, 404)
+	return job, None
+
+
+@main_bp.route('/transcript/jobs', methods=['POST'])
+def transcript_job_create():
+	sess = Session.get_current()
+	if sess is None or not sess['valid']:
+		return json_response({'error': 'Unauthorized', 'status_code': 401}, 401)
+	if sess.get('uid') is None and 'error' in (me := get_profile(sess)):
+		return json_response(me, me.get('status_code', 502))
+
+	job_id = get_manager().submit(current_app._get_current_object(), sess)
+	return json_response(job_status(get_manager().get(job_id)), 202)
+
+
+@main_bp.route('/transcript/jobs/<job_id>')
+def transcript_job_status(job_id: str):
+	job, error = get_job(job_id)
+	if error is not None:
+		return error
+	return json_response(job_status(job))
+
+
+@main_bp.route('/transcript/jobs/<job_id>/download')
+def transcript_job_download(job_id: str):
+	job, error = get_job(job_id)
+	if error is not None:
+		return error
+	if job['status'] != 'done':
+		return json_response(job_status(job), 409)
+	try:
+		return send_pdf(job['path'], job['name'])
+	except FileNotFoundError:
+		return json_response(job_status(job) | {'error': 'The transcript expired, please generate it again.'}, 410)
+
+
+@main_bp.route('/metrics')
+def metrics():
+	if token := get_config().metrics_token:
+		if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+			return json_response({'error': 'Unauthorized', 'status_code': 401}, 401)
+	return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -1,20 +1,39 @@
-import os
 import time
-import json
 import requests
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import session
 from urllib.parse import quote
 
 from .data import Data
 from .utils import session_error, session_success
 from .utils import get_url, strbool
+from .httpclient import get_client, upstream_error
+from .httpcache import get_http_cache, cache_scope
+from .metrics import STAGE_SECONDS
+from .log import get_logger, Payload
+from .config import get_config
+from .tokens import get_token_manager
+
+
+log = get_logger('session')
 
 
 class Session:
+	STORED_FIELDS = (
+		'token', 'refresh', 'expires', 'valid', 'uid',
+		'first_name', 'last_name', 'login', 'pic', 'grade_title', 'level',
+	)
+
 	@staticmethod
 	def get_current() -> dict | None:
 		sess = session.get(Data.S_SESSION, None)
 		if sess is not None:
+			if sess.get('token') is not None:
+				# Picks up tokens rotated by another worker and refreshes ahead of expiry,
+				# failures are reported by the first API call
+				if get_token_manager().ensure_fresh(sess)[0]:
+					session[Data.S_SESSION] = sess
 			Session.is_valid(sess)
 		return sess
 		# sess = session.get(Data.S_SESSION)
@@ -29,7 +48,6 @@ class Session:
 			'code': code,
 			'token': None,
 			'refresh': None,
-			'created': None,
 			'expires': None,
 			'valid': False,
 			'host': host,
@@ -43,33 +61,49 @@ class Session:
 	@staticmethod
 	def is_valid(sess: dict, split_time_validity: bool = False) -> bool | tuple[bool, bool]:
 		if split_time_validity:
-			r = sess.get('code') is not None and sess.get('expires') is not None, sess.get('expires', 0) > time.time()
+			r = sess.get('token') is not None and sess.get('expires') is not None, (sess.get('expires') or 0) > time.time()
 			sess['valid'] = r[0] and r[1]
 		else:
-			r = sess.get('code') is not None and sess.get('expires') is not None and sess.get('expires') > time.time()
+			r = sess.get('token') is not None and sess.get('expires') is not None and sess.get('expires') > time.time()
 			sess['valid'] = r
 		return r
 
+	@staticmethod
+	def compact(sess: dict) -> dict:
+		"""
+		Strip a session down to what is worth persisting in the session store:
+		the tokens, their expiry, the user id and the fields displayed in the header card.
+		The OAuth `code` and `host` are only needed for the initial token exchange.
+		"""
+		return {k: sess[k] for k in Session.STORED_FIELDS if k in sess}
+
+	@staticmethod
+	def _upstream_error(e: requests.RequestException) -> dict:
+		return upstream_error(e)
+
 	@staticmethod
 	def fetch_token(sess: dict, code: str | None = None, session_feedback: bool = True) -> tuple[bool, dict]:
 		if code is not None:
 			sess['code'] = code
-		res = requests.post(
-			os.environ.get(Data.X_API_TOKEN_URL),
-			data={
-				'grant_type': 'authorization_code',
-				'client_id': os.environ.get(Data.X_FT_UID),
-				'client_secret': os.environ.get(Data.X_FT_SECRET),
-				'code': sess.get('code'),
-				'redirect_uri': os.environ.get(Data.X_REDIRECT_URI).replace('$HOST', sess.get('host', '')),
-			},
-		)
-		res = res.json() | {'status_code': res.status_code}
+		config = get_config()
+		try:
+			res = get_client().post(
+				config.api_token_url,
+				data={
+					'grant_type': 'authorization_code',
+					'client_id': config.ft_uid,
+					'client_secret': config.ft_secret,
+					'code': sess.get('code'),
+					'redirect_uri': config.redirect_uri.replace('$HOST', sess.get('host', '')),
+				},
+			)
+			res = res.json() | {'status_code': res.status_code}
+		except requests.RequestException as e:
+			res = Session._upstream_error(e)
 		if 'access_token' in res:
 			sess['token'] = res['access_token']
 			sess['refresh'] = res.get('refresh_token')
-			sess['created'] = time.time()
-			sess['expires'] = sess['created'] + res.get('expires_in', 3600)
+			sess['expires'] = time.time() + res.get('expires_in', 3600)
 			sess['valid'] = True
 			if session_feedback:
 				session_success("Successfully authenticated.")
@@ -78,42 +112,42 @@ class Session:
 			success = False
 			if session_feedback:
 				session_error(res)
-		if Data.DEBUG:
-			print(f"[DEBUG] ({sess.get('code')}) authorization_code: {json.dumps(res, indent=4, ensure_ascii=False)}")
+		log.debug("authorization_code: %s", Payload(res))
 		return success, res
 
 	@staticmethod
 	def refresh_token(sess: dict, refresh: str | None = None, session_feedback: bool = True) -> tuple[bool, dict]:
 		if refresh is not None:
 			sess['refresh'] = refresh
-		res = requests.post(
-			os.environ.get(Data.X_API_TOKEN_URL),
-			data={
-				'grant_type': 'refresh_token',
-				'client_id': os.environ.get(Data.X_FT_UID),
-				'client_secret': os.environ.get(Data.X_FT_SECRET),
-				'refresh_token': sess.get('refresh'),
-			},
-		)
-		res = res.json() | {'status_code': res.status_code}
-		if 'access_token' in res:
-			sess['token'] = res['access_token']
-			sess['refresh'] = res.get('refresh_token', sess.get('refresh'))
-			sess['created'] = time.time()
-			sess['expires'] = sess['created'] + res.get('expires_in', 3600)
-			sess['valid'] = True
+		_, error = get_token_manager().ensure_fresh(sess, force=True)
+		if error is None:
+			res = {k: sess.get(k) for k in ('token', 'refresh', 'expires')}
 			if session_feedback:
 				session_success("Session token successfully refreshed.")
-			success = True
 		else:
-			success = False
+			res = error
 			if session_feedback:
 				session_error(res)
-		if Data.DEBUG:
-			print(f"[DEBUG] <{sess.get('token')}> refresh_token: {json.dumps(res, indent=4, ensure_ascii=False)}")
-		return success, res
+		log.debug("<%s> refresh_token: %s", sess.get('uid'), Payload(res))
+		return error is None, res
 
 	@staticmethod
+	def app_session() -> dict:
+		"""
+		Session authenticated as the app itself (client credentials), for API calls not made on
+		behalf of a user. Usable with `Session.get` like any user session.
+
+		Returns:
+			dict: The session, or the API error dict if no app token could be obtained.
+		"""
+		res = get_token_manager().app_token()
+		if 'token' not in res:
+			log.warning("Could not get an app token: %s %s", res.get('status_code'), res.get('error'))
+			return res
+		return res | {'valid': True, 'app': True, 'uid': 'app'}
+
+	@staticmethod
+	@STAGE_SECONDS.timed(stage='api')
 	def _send(
 			sess: dict,
 			endpoint: str,
@@ -125,27 +159,26 @@ class Session:
 			*query,
 			**kwquery
 			) -> dict:
-		v_syntax, v_time = Session.is_valid(sess, split_time_validity=True)
+		v_syntax, _ = Session.is_valid(sess, split_time_validity=True)
 		if not v_syntax:
 			raise Exception("Session is not valid.")
 
-		def __refresh(v_time):
-			nonlocal sess
-			if not v_time:
-				if Session.refresh_token(sess, session_feedback=feedback_error)[0]:
-					return None
-				res = {
-					'status_code': 401,
-					'error': 'Unauthorized',
-					'text': 'Failed to refresh token.',
-				}
-				if feedback_error:
-					session_error(res)
-				return res
-			return None
+		def __refresh(force: bool = False):
+			_, error = get_token_manager().ensure_fresh(sess, force=force)
+			if error is None:
+				return None
+			log.debug("<%s> refresh_token: %s", sess.get('uid'), Payload(error))
+			res = {
+				'status_code': 401,
+				'error': 'Unauthorized',
+				'text': 'Failed to refresh token.',
+			}
+			if feedback_error:
+				session_error(res)
+			return res
 
-		# In case the token is expired, try to refresh it
-		if (r := __refresh(v_time)) is not None:
+		# Only blocks if the token is (about to be) expired, otherwise refreshes in the background
+		if (r := __refresh()) is not None:
 			return r
 
 		if 'page[number]' not in kwquery and 'page' not in kwquery and page != 1:
@@ -154,15 +187,22 @@ class Session:
 			kwquery['page[size]'] = page_size
 
 		url = get_url(endpoint, *query, **kwquery)
-		method, res = res_callback(url)
-		if Data.DEBUG and fetch_all:
-			print(f"[DEBUG] <{sess.get('token')}> {method} '{url}'")
-
-		if res.status_code >= 401:
-			# Maybe it has expired in a span of .1 sec... Refreshing again might solve the issue...
-			if (r := __refresh(Session.is_valid(sess, split_time_validity=True)[1])) is not None:
-				return r
+		try:
+			method, res = res_callback(url)
+			if res.status_code == 401:
+				# Revoked, or rotated by another worker: refresh and retry once
+				if (r := __refresh(force=True)) is not None:
+					return r
+				method, res = res_callback(url)
+		except requests.RequestException as e:
+			res = Session._upstream_error(e)
+			if feedback_error:
+				session_error(res)
+			return res
+		if fetch_all:
+			log.debug("<%s> %s '%s'", sess.get('uid'), method, url)
 
+		raw = res
 		try:
 			res, status = res.json(), res.status_code
 			if not isinstance(res, dict):
@@ -175,15 +215,23 @@ class Session:
 				if not isinstance(res.get('data'), list):
 					raise Exception("Cannot fetch all pages of a non-list response.")
 				all_data = res
-				page = kwquery.get('page[number]', kwquery.get('page', 1))
-				page_size = kwquery.get('page[size]', kwquery.get('per_page', 30))
+				page = int(kwquery.get('page[number]', kwquery.get('page', 1)))
+				page_size = int(kwquery.get('page[size]', kwquery.get('per_page', 30)))
 				kwquery.pop('page', None)
-				while len(res['data']) == page_size:
-					page += 1
-					kwquery['page[number]'] = page
-					_, res = res_callback(get_url(endpoint, *query, **kwquery))
-					if Data.DEBUG:
-						print(f"[DEBUG] <{sess.get('token')}> {method} '{get_url(endpoint, *query, **kwquery)}'")
+				if (last := Session._last_page(raw, page_size)) is not None:
+					# The page count is known: fetch the remaining pages concurrently, then merge them in order
+					pages = dict(Session._fetch_pages(sess, endpoint, res_callback, range(page + 1, last + 1), *query, **kwquery))
+					responses = [pages[p] for p in sorted(pages)]
+				else:
+					responses = None
+				while responses or (responses is None and len(res['data']) == page_size):
+					if responses:
+						res = responses.pop(0)
+					else:
+						page += 1
+						kwquery['page[number]'] = page
+						_, res = res_callback(get_url(endpoint, *query, **kwquery))
+						log.debug("<%s> %s '%s'", sess.get('uid'), method, get_url(endpoint, *query, **kwquery))
 					if res.status_code != all_data.get('status_code'):
 						all_data |= res.json()
 						all_data['status_code'] = res.status_code
@@ -194,19 +242,161 @@ class Session:
 					all_data['total'] += res['total']
 				res = all_data
 
+		except requests.RequestException as e:
+			res = Session._upstream_error(e)
+			if feedback_error:
+				session_error(res)
 		except Exception as e:
 			res = {
-				'status_code': res.status_code,
+				'status_code': raw.status_code,
 				'error': str(e),
-				'text': res.text,
+				'text': raw.text,
 			}
 			if feedback_error:
 				session_error(res)
 
-		if Data.DEBUG:
-			print(f"[DEBUG] <{sess.get('token')}> {method} '{url}': {json.dumps(res, indent=4, ensure_ascii=False)}")
+		log.debug("<%s> %s '%s': %s", sess.get('uid'), method, url, Payload(res))
 		return res
 
+	@staticmethod
+	def _last_page(res: requests.Response, page_size: int) -> int | None:
+		"""
+		Number of the last page of a paginated response, from its `X-Total`/`X-Per-Page` headers.
+		"""
+		try:
+			total = int(res.headers['X-Total'])
+			per_page = int(res.headers.get('X-Per-Page', page_size))
+		except (KeyError, ValueError):
+			return None
+		if per_page <= 0:
+			return None
+		return max(1, ceil(total / per_page))
+
+	@staticmethod
+	def _fetch_pages(sess: dict, endpoint: str, res_callback, pages, *query, **kwquery):
+		"""
+		Fetch `pages` with at most `FETCH_CONCURRENCY` requests in flight.
+		Yields `(page, response)` tuples in completion order.
+		"""
+		pages = list(pages)
+		if not pages:
+			return
+
+		def fetch(page: int):
+			url = get_url(endpoint, *query, **(kwquery | {'page[number]': page}))
+			try:
+				method, res = res_callback(url)
+			except requests.RequestException as e:
+				e.page = page  # For callers to tell which page failed
+				raise
+			log.debug("<%s> %s '%s'", sess.get('uid'), method, url)
+			return page, res
+
+		workers = max(1, min(get_config().fetch_concurrency, len(pages)))
+		executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch')
+		try:
+			for future in as_completed([executor.submit(fetch, p) for p in pages]):
+				yield future.result()
+		finally:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	@staticmethod
+	def iter_pages(
+			sess: dict,
+			endpoint: str,
+			page_size: int = 100,
+			feedback_error: bool = True,
+			*query,
+			**kwquery
+			):
+		"""
+		Streaming variant of `Session.get(..., fetch_all=True)`.
+
+		Yields one dict per page (`{'page': int, 'data': list, 'total': int, 'status_code': int}`)
+		as soon as it arrives, so pages after the first may come out of order. On failure, the
+		error dict is yielded and the iteration stops.
+		"""
+		first = {}
+		get_callback = Session._get_callback(sess)
+
+		def res_callback(url):
+			# Called again after a 401, keep the response the first page came from
+			method, res = get_callback(url)
+			first['res'] = res
+			return method, res
+
+		res = Session._send(
+			sess=sess,
+			endpoint=endpoint,
+			res_callback=res_callback,
+			page_size=page_size,
+			feedback_error=feedback_error,
+			*query,
+			**kwquery,
+		)
+		yield res | {'page': 1}
+		if 'error' in res or not isinstance(res.get('data'), list):
+			return
+
+		kwquery.setdefault('page[size]', page_size)
+		page_size = int(kwquery.get('page[size]', kwquery.get('per_page', 30)))
+		if (last := Session._last_page(first['res'], page_size)) is not None:
+			try:
+				for page, r in Session._fetch_pages(sess, endpoint, get_callback, range(2, last + 1), *query, **kwquery):
+					yield (item := Session._page_result(page, r, feedback_error))
+					if 'error' in item:
+						return
+			except requests.RequestException as e:
+				yield Session._page_error(getattr(e, 'page', None), e, feedback_error)
+		else:
+			page, count = 1, len(res['data'])
+			while count == page_size:
+				page += 1
+				url = get_url(endpoint, *query, **(kwquery | {'page[number]': page}))
+				try:
+					r = get_callback(url)[1]
+				except requests.RequestException as e:
+					yield Session._page_error(page, e, feedback_error)
+					return
+				yield (item := Session._page_result(page, r, feedback_error))
+				if 'error' in item:
+					return
+				count = item['total']
+
+	@staticmethod
+	def _page_error(page: int, e: requests.RequestException, feedback_error: bool = True) -> dict:
+		err = Session._upstream_error(e) | {'page': page}
+		if feedback_error:
+			session_error(err)
+		return err
+
+	@staticmethod
+	def _page_result(page: int, res: requests.Response, feedback_error: bool = True) -> dict:
+		try:
+			data = res.json()
+		except Exception as e:
+			data = {'error': str(e), 'text': res.text}
+		if res.status_code != 200 or not isinstance(data, list):
+			err = (data if isinstance(data, dict) else {'data': data}) | {'status_code': res.status_code, 'page': page}
+			err.setdefault('error', 'Unexpected response')
+			if feedback_error:
+				session_error(err)
+			return err
+		return {'page': page, 'data': data, 'total': len(data), 'status_code': res.status_code}
+
+	@staticmethod
+	def _get_callback(sess: dict):
+		return lambda url: (
+			'GET',
+			get_http_cache().get(
+				url=url,
+				headers={
+					'Authorization': f'Bearer {sess.get('token')}',
+				},
+				scope=cache_scope(sess),
+			),
+		)
+
 	@staticmethod
 	def post(
 			sess: dict,
@@ -224,7 +414,7 @@ class Session:
 			endpoint=endpoint,
 			res_callback=lambda url: (
 				'POST',
-				requests.post(
+				get_client().post(
 					url=url,
 					json=data,
 					headers={
@@ -254,15 +444,7 @@ class Session:
 		return Session._send(
 			sess=sess,
 			endpoint=endpoint,
-			res_callback=lambda url: (
-				'GET',
-				requests.get(
-					url=url,
-					headers={
-						'Authorization': f'Bearer {sess.get('token')}',
-					},
-				),
-			),
+			res_callback=Session._get_callback(sess),
 			page=page,
 			page_size=page_size,
 			fetch_all=fetch_all,
@@ -0,0 +1,76 @@
+import time
+import sqlite3
+from datetime import timedelta
+from flask import Flask, Response, request
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+
+from .connections import Connections
+
+
+class SqliteSessionInterface(ServerSideSessionInterface):
+	"""
+	Flask-Session backend storing msgpack-encoded sessions in a SQLite (WAL) database.
+
+	One database file can be shared by all the workers of a host. SQLite has no native TTL,
+	so expired rows are ignored on read and swept on average every `cleanup_n_requests`
+	requests.
+	"""
+
+	ttl = False
+
+	def __init__(self, app: Flask, path: str, cleanup_n_requests: int = 100, **kwargs):
+		self.path = path
+		# Sessions hold the users' tokens
+		self._connections = Connections(self.path, self._setup, mode=0o600)
+		super().__init__(app, cleanup_n_requests=cleanup_n_requests, **kwargs)
+
+	@staticmethod
+	def _setup(db: sqlite3.Connection) -> None:
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS sessions ('
+			'id TEXT PRIMARY KEY, data BLOB NOT NULL, expiry REAL NOT NULL)'
+		)
+		db.execute('CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expiry)')
+
+	def _db(self) -> sqlite3.Connection:
+		return self._connections.get()
+
+	def _retrieve_session_data(self, store_id: str) -> dict | None:
+		row = self._db().execute(
+			'SELECT data FROM sessions WHERE id = ? AND expiry > ?', (store_id, time.time())
+		).fetchone()
+		return self.serializer.decode(row[0]) if row is not None else None
+
+	def _delete_session(self, store_id: str) -> None:
+		self._db().execute('DELETE FROM sessions WHERE id = ?', (store_id,))
+
+	def _upsert_session(self, session_lifetime: timedelta, session: ServerSideSession, store_id: str) -> None:
+		self._db().execute(
+			'INSERT OR REPLACE INTO sessions (id, data, expiry) VALUES (?, ?, ?)',
+			(store_id, self.serializer.encode(session), time.time() + session_lifetime.total_seconds()),
+		)
+
+	def _delete_expired_sessions(self) -> None:
+		self._db().execute('DELETE FROM sessions WHERE expiry <= ?', (time.time(),))
+
+
+class SessionlessEndpoints:
+	"""
+	Wraps the session interface `interface` to leave the session alone on `endpoints`: no
+	storage write, no `Set-Cookie` and no `Vary: Cookie`.
+
+	Meant for static files, the same for every visitor and cached publicly: a permanent
+	session would otherwise be rewritten and its cookie refreshed on each of them.
+	"""
+
+	def __init__(self, interface, endpoints: tuple[str, ...]):
+		self.interface = interface
+		self.endpoints = endpoints
+
+	def __getattr__(self, name: str):
+		return getattr(self.interface, name)
+
+	def save_session(self, app: Flask, session, response: Response) -> None:
+		if request.endpoint in self.endpoints:
+			return
+		self.interface.save_session(app, session, response)
@@ -0,0 +1,192 @@
+import os
+import re
+import base64
+import hashlib
+from urllib.parse import quote
+from jinja2 import BaseLoader, Environment, TemplateNotFound
+
+from .config import get_config
+
+
+# Templates only ever handed to the PDF renderer: built, never served to browsers
+BUILT_TEMPLATES = ('transcript.html',)
+
+# Whitespace next to these tags does not render
+BLOCK_TAGS = {
+	'!doctype', 'html', 'head', 'body', 'meta', 'title', 'link', 'style', 'script',
+	'header', 'footer', 'section', 'div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'ul', 'ol', 'li',
+	'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'colgroup', 'col',
+}
+
+TOKEN_PATTERN = re.compile(
+	r'(?P<raw><(?P<rawtag>style|script|pre|textarea)\b[^>]*>.*?</(?P=rawtag)\s*>)'
+	r'|(?P<stmt>\{%.*?%\}|\{#.*?#\})'
+	r'|(?P<expr>\{\{.*?\}\})'
+	r'|(?P<comment><!--.*?-->)'
+	r'|(?P<tag><[^>]*>)',
+	re.DOTALL | re.IGNORECASE,
+)
+TAG_NAME = re.compile(r'</?\s*([!\w-]+)')
+DATA_URI = re.compile(r'data:([\w/+.-]*);base64,([A-Za-z0-9+/=]+)')
+IMAGE_TYPES = (
+	(b'\x89PNG', 'png'),
+	(b'\xff\xd8', 'jpg'),
+	(b'GIF8', 'gif'),
+	(b'<svg', 'svg'),
+	(b'<?xml', 'svg'),
+)
+
+
+def minify_css(css: str) -> str:
+	css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+	css = re.sub(r'\s+', ' ', css)
+	css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+	css = re.sub(r':\s+', ':', css)
+	return css.replace(';}', '}').strip()
+
+
+def _tokens(html: str) -> list[tuple[str, str]]:
+	tokens, pos = [], 0
+	for m in TOKEN_PATTERN.finditer(html):
+		if m.start() > pos:
+			tokens.append(('text', html[pos:m.start()]))
+		tokens.append((m.lastgroup if m.lastgroup != 'rawtag' else 'raw', m.group()))
+		pos = m.end()
+	if pos < len(html):
+		tokens.append(('text', html[pos:]))
+	return tokens
+
+
+def _is_block(token: tuple[str, str]) -> bool:
+	if token[0] == 'raw':
+		return True
+	if token[0] != 'tag':
+		return False
+	m = TAG_NAME.match(token[1])
+	return m is not None and m.group(1).lower() in BLOCK_TAGS
+
+
+def _neighbour(tokens: list[tuple[str, str]], i: int, step: int) -> tuple[str, str] | None:
+	# Jinja statements and comments produce no output: look through them
+	i += step
+	while 0 <= i < len(tokens) and (tokens[i][0] in ('stmt', 'comment') or (tokens[i][0] == 'text' and not tokens[i][1].strip())):
+		i += step
+	return tokens[i] if 0 <= i < len(tokens) else None
+
+
+def minify_html(html: str) -> str:
+	"""
+	Minify a Jinja HTML template without changing what it renders.
+
+	HTML comments are dropped, whitespace is collapsed, and removed entirely next to block-level
+	tags where it does not render. `<style>` blocks are minified. Jinja tags are kept verbatim, and
+	`<pre>`, `<textarea>` and `<script>` contents are left untouched.
+	"""
+	tokens = _tokens(html)
+	out = []
+	for i, (kind, value) in enumerate(tokens):
+		if kind == 'comment':
+			if value.startswith('<!--['):
+				out.append(value)  # Conditional comment
+			continue
+		if kind == 'raw' and value[1:6].lower() == 'style':
+			start = value.index('>') + 1
+			end = value.lower().rindex('</style')
+			value = '<style>' + minify_css(value[start:end]) + '</style>'
+		elif kind == 'tag':
+			value = re.sub(r'\s*\n\s*', ' ', value)
+		elif kind == 'text':
+			value = re.sub(r'\s+', ' ', value)
+			if (prev := _neighbour(tokens, i, -1)) is None or _is_block(prev):
+				value = value.lstrip()
+			if (nxt := _neighbour(tokens, i, 1)) is None or _is_block(nxt):
+				value = value.rstrip()
+		out.append(value)
+	return ''.join(out)
+
+
+def extract_images(html: str, assets_dir: str) -> str:
+	"""
+	Move base64 `data:` images out to `assets_dir`, one file per distinct image, and point to
+	them with `file://` URLs instead.
+	"""
+	def extract(m: re.Match) -> str:
+		data = base64.b64decode(m.group(2))
+		ext = next((e for magic, e in IMAGE_TYPES if data.lstrip()[:len(magic)] == magic), None)
+		if ext is None:
+			ext = (m.group(1).split('/')[-1].split('+')[0] or 'bin')
+		path = os.path.join(assets_dir, f'{hashlib.sha256(data).hexdigest()[:16]}.{ext}')
+		if not os.path.exists(path):
+			_write(path, data)
+		return 'file://' + quote(os.path.abspath(path))
+
+	return DATA_URI.sub(extract, html)
+
+
+def _write(path: str, data: bytes | str) -> None:
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp = f'{path}.{os.getpid()}.tmp'
+	with open(tmp, 'wb') as f:
+		f.write(data.encode('utf-8') if isinstance(data, str) else data)
+	os.replace(tmp, path)
+
+
+def get_assets_dir() -> str:
+	"""
+	Absolute path of the images extracted from the built templates, to be allowed to the renderer.
+	"""
+	return os.path.abspath(os.path.join(get_config().template_cache_dir, 'assets'))
+
+
+def build_template(src: str, dst: str, assets_dir: str) -> None:
+	with open(src, 'r', encoding='utf-8') as f:
+		html = f.read()
+	_write(dst, extract_images(minify_html(html), assets_dir))
+
+
+class BuildLoader(BaseLoader):
+	"""
+	Serves the `BUILT_TEMPLATES` of `search_path` minified and with their embedded images moved
+	to `<build_dir>/assets`, rebuilding them whenever their source changes.
+	Other templates are not found here, so put this loader first in a `ChoiceLoader`.
+	"""
+
+	def __init__(self, search_path: str, build_dir: str, templates: tuple[str, ...] = BUILT_TEMPLATES):
+		self.search_path = search_path
+		self.build_dir = build_dir
+		self.assets_dir = os.path.join(build_dir, 'assets')
+		self.templates = templates
+
+	def build(self, template: str) -> str:
+		"""
+		Build `template` if it is missing or stale, and return the path of the built file.
+		"""
+		src = os.path.join(self.search_path, template)
+		dst = os.path.join(self.build_dir, 'html', template)
+		# Also rebuild when the build itself changed
+		if not os.path.exists(dst) or os.path.getmtime(dst) < max(os.path.getmtime(src), os.path.getmtime(__file__)):
+			build_template(src, dst, self.assets_dir)
+		return dst
+
+	def get_source(self, environment: Environment, template: str):
+		if template not in self.templates:
+			raise TemplateNotFound(template)
+		src = os.path.join(self.search_path, template)
+		try:
+			mtime = os.path.getmtime(src)
+			path = self.build(template)
+		except FileNotFoundError:
+			raise TemplateNotFound(template)
+		with open(path, 'r', encoding='utf-8') as f:
+			source = f.read()
+
+		def uptodate() -> bool:
+			try:
+				return os.path.getmtime(src) == mtime
+			except OSError:
+				return False
+
+		return source, path, uptodate
+
+	def list_templates(self) -> list[str]:
+		return [t for t in self.templates if os.path.exists(os.path.join(self.search_path, t))]
@@ -0,0 +1,253 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .config import get_config
+from .connections import Connections
+from .httpclient import get_client, upstream_error
+from .metrics import TOKEN_REFRESHES
+from .log import get_logger
+
+
+log = get_logger('tokens')
+
+
+def _digest(refresh: str) -> str:
+	return hashlib.sha256(refresh.encode('utf-8')).hexdigest()
+
+
+class RotationStore:
+	"""
+	SQLite (WAL) table mapping a refresh token (by digest) to the tokens it was exchanged for.
+
+	42 rotates the refresh token on every refresh, so the first worker to refresh a session
+	records the result here: a concurrent refresh of the same session in another worker or
+	tab, or a later request still holding the old tokens, picks it up instead of failing with
+	`invalid_grant` or paying for another OAuth round trip.
+
+	The tokens are stored as is, so the file is only readable by its owner.
+	"""
+
+	def __init__(self, path: str, ttl: float = 86400):
+		self.path = path
+		self.ttl = ttl
+		self._connections = Connections(self.path, self._setup, mode=0o600)
+
+	@staticmethod
+	def _setup(db: sqlite3.Connection) -> None:
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS rotations ('
+			'old TEXT PRIMARY KEY, token TEXT NOT NULL, refresh TEXT, expires REAL NOT NULL, created REAL NOT NULL)'
+		)
+
+	def _db(self) -> sqlite3.Connection:
+		return self._connections.get()
+
+	def get(self, refresh: str) -> dict | None:
+		row = self._db().execute(
+			'SELECT token, refresh, expires FROM rotations WHERE old = ? AND created > ?',
+			(_digest(refresh), time.time() - self.ttl),
+		).fetchone()
+		if row is None:
+			return None
+		return {'token': row[0], 'refresh': row[1], 'expires': row[2]}
+
+	def put(self, refresh: str, tokens: dict) -> None:
+		now = time.time()
+		db = self._db()
+		db.execute(
+			'INSERT OR REPLACE INTO rotations VALUES (?, ?, ?, ?, ?)',
+			(_digest(refresh), tokens['token'], tokens['refresh'], tokens['expires'], now),
+		)
+		db.execute('DELETE FROM rotations WHERE created < ?', (now - self.ttl,))
+
+
+class TokenManager:
+	"""
+	Keeps OAuth tokens fresh so that user requests almost never wait for the token endpoint.
+
+	- `ensure_fresh` swaps in tokens already refreshed by anyone else, refreshes synchronously
+	  only when the token expires within `margin` seconds, and otherwise schedules a
+	  background refresh once it expires within `lead` seconds.
+	- Refreshes are single-flight per refresh token: concurrent callers in this worker share
+	  the same request, other workers find the result in the `RotationStore`.
+	- The app's client-credentials token is cached until shortly before it expires.
+
+	Tokens are handled as `{'token', 'refresh', 'expires'}` dicts, `expires` being a timestamp.
+	"""
+
+	def __init__(self, store: RotationStore, margin: float = 60, lead: float = 600, workers: int = 2):
+		self.store = store
+		self.margin = margin
+		self.lead = lead
+		self._inflight: dict[str, Future] = {}
+		self._lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='token')
+		self._app_token: dict | None = None
+		self._app_lock = threading.Lock()
+
+	@staticmethod
+	def _post(data: dict) -> dict:
+		config = get_config()
+		try:
+			res = get_client().post(
+				config.api_token_url,
+				data=data | {'client_id': config.ft_uid, 'client_secret': config.ft_secret},
+			)
+			res = res.json() | {'status_code': res.status_code}
+		except requests.RequestException as e:
+			return upstream_error(e)
+		if 'access_token' not in res:
+			return res
+		return {
+			'token': res['access_token'],
+			'refresh': res.get('refresh_token'),
+			'expires': time.time() + res.get('expires_in', 3600),
+		}
+
+	def successor(self, refresh: str | None) -> dict | None:
+		"""
+		Latest tokens `refresh` was (transitively) exchanged for, if any.
+		"""
+		tokens = None
+		for _ in range(8):
+			if refresh is None or (found := self.store.get(refresh)) is None:
+				break
+			tokens = found
+			if found['refresh'] == refresh:
+				break
+			refresh = found['refresh']
+		return tokens
+
+	def _refresh(self, refresh: str) -> dict:
+		if (tokens := self.successor(refresh)) is not None:
+			return tokens
+		res = self._post({'grant_type': 'refresh_token', 'refresh_token': refresh})
+		if 'token' in res:
+			self.store.put(refresh, res)
+			TOKEN_REFRESHES.inc(result='success')
+			return res
+		# Another worker may have rotated this refresh token in the meantime
+		if (tokens := self.successor(refresh)) is not None:
+			return tokens
+		TOKEN_REFRESHES.inc(result='failure')
+		log.debug("Token refresh failed: %s %s", res.get('status_code'), res.get('error'))
+		return res
+
+	def _flight(self, refresh: str) -> tuple[Future, bool]:
+		with self._lock:
+			if (future := self._inflight.get(refresh)) is not None:
+				return future, False
+			future = self._inflight[refresh] = Future()
+			return future, True
+
+	def _run(self, refresh: str, future: Future) -> None:
+		try:
+			future.set_result(self._refresh(refresh))
+		except BaseException as e:
+			future.set_exception(e)
+		finally:
+			with self._lock:
+				self._inflight.pop(refresh, None)
+
+	def refresh(self, refresh: str) -> dict:
+		"""
+		Exchange `refresh` for new tokens, sharing the request with concurrent callers.
+
+		Returns:
+			dict: The new tokens, or the API error dict.
+		"""
+		future, owner = self._flight(refresh)
+		if owner:
+			self._run(refresh, future)
+		return future.result()
+
+	def refresh_async(self, refresh: str) -> None:
+		future, owner = self._flight(refresh)
+		if owner:
+			self._executor.submit(self._run, refresh, future)
+
+	def ensure_fresh(self, sess: dict, force: bool = False) -> tuple[bool, dict | None]:
+		"""
+		Make sure the tokens of `sess` are usable, updating it in place.
+
+		Args:
+			force (bool): Refresh even if the token does not look expired (e.g. after a 401).
+
+		Returns:
+			tuple: `(changed, error)`: whether the tokens of `sess` changed, and the API error
+				dict if they needed a refresh which failed.
+		"""
+		if sess.get('app'):
+			return self._ensure_app(sess, force)
+		refresh = sess.get('refresh')
+		if (tokens := self.successor(refresh)) is not None and tokens['expires'] > (sess.get('expires') or 0):
+			sess.update(tokens, valid=True)
+			return True, None
+		remaining = (sess.get('expires') or 0) - time.time()
+		if not force and remaining > self.margin:
+			if remaining <= self.lead and refresh is not None:
+				self.refresh_async(refresh)
+			return False, None
+		if refresh is None:
+			return False, {'status_code': 401, 'error': 'Unauthorized', 'text': 'No refresh token.'}
+		res = self.refresh(refresh)
+		if 'token' not in res:
+			return False, res
+		sess.update(res, valid=True)
+		return True, None
+
+	def _ensure_app(self, sess: dict, force: bool) -> tuple[bool, dict | None]:
+		if not force and (sess.get('expires') or 0) - time.time() > self.margin:
+			return False, None
+		if force:
+			with self._app_lock:
+				if self._app_token is not None and self._app_token['token'] == sess.get('token'):
+					self._app_token = None
+		res = self.app_token()
+		if 'token' not in res:
+			return False, res
+		sess.update(res, valid=True)
+		return True, None
+
+	def app_token(self) -> dict:
+		"""
+		Client-credentials token of the app, for calls not made on behalf of a user.
+
+		Returns:
+			dict: The tokens, or the API error dict.
+		"""
+		tokens = self._app_token
+		if tokens is not None and tokens['expires'] - self.margin > time.time():
+			return tokens
+		with self._app_lock:
+			tokens = self._app_token
+			if tokens is not None and tokens['expires'] - self.margin > time.time():
+				return tokens
+			res = self._post({'grant_type': 'client_credentials'})
+			if 'token' in res:
+				self._app_token = res
+			return res
+
+
+_manager: TokenManager | None = None
+_manager_pid: int | None = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager() -> TokenManager:
+	global _manager, _manager_pid
+	with _manager_lock:
+		if _manager is None or _manager_pid != os.getpid():
+			config = get_config()
+			_manager = TokenManager(
+				RotationStore(config.token_db),
+				margin=config.token_refresh_margin,
+				lead=config.token_refresh_lead,
+			)
+			_manager_pid = os.getpid()
+		return _manager
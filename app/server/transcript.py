@@ -1,30 +1,49 @@
 import os
 import json
+import hashlib
 from math import ceil
+from urllib.parse import quote
+from typing import BinaryIO
 from datetime import datetime
 
-from .data import Data
-from .session import Session
+from .config import get_config
+from .utils import render_template
+from .profile import get_profile
+from .campuses import get_campuses
+from .render import render_pdf_to
+from .pdflayout import render_transcript
+from .pdfcache import get_cache, _template_digest
+from .templates import get_assets_dir
+from .metrics import STAGE_SECONDS
+from .catalogue import CATEGORIES, DEFAULT_MULT, DEFAULT_EXP, get_catalogue, project_credits
 
 
-def get_transcript_data(session: dict, mult: float = 2, exp: float = 0.25) -> dict:
+@STAGE_SECONDS.timed(stage='transcript_data')
+def get_transcript_data(
+		session: dict,
+		mult: float = DEFAULT_MULT,
+		exp: float = DEFAULT_EXP,
+		login: str | None = None,
+		feedback_error: bool = True,
+		) -> dict:
+	"""
+	Transcript of the session's user, or of the user `login` as seen by `session`.
+	"""
 	if session is None or not session['valid']:
 		return {}
 
-	if 'error' in (me := Session.get(session, '/v2/me')):
+	get_campuses().refresh_if_stale()
+
+	if 'error' in (me := get_profile(session, feedback_error=feedback_error, login=login)):
 		return me
+	return compute_transcript(me, mult, exp)
 
-	campus = {}
-	for cpu in me['campus_users']:
-		if cpu['is_primary']:
-			for cp in me['campus']:
-				if cp['id'] == cpu['campus_id']:
-					campus = cp
-					break
-			break
-	if campus == {} and me.get('campus'):
-		campus = me['campus'][0]
 
+def graded_projects(me: dict) -> dict[int, dict]:
+	"""
+	The projects of a trimmed profile that count in its transcript, by project id:
+	`{'id', 'tid', 'name', 'mark'}`, keeping the lowest mark of a project done several times.
+	"""
 	me_projects = {}
 	for p in me['projects_users']:
 		if p['final_mark'] is None or p['project']['parent_id'] is not None:
@@ -50,45 +69,68 @@ def get_transcript_data(session: dict, mult: float = 2, exp: float = 0.25) -> di
 			'tid': 5951447,
 			'mark': 125,
 		}
+	return me_projects
+
+
+def primary_campus(me: dict) -> dict:
+	"""
+	The primary campus of a trimmed profile, or its first campus if it has no primary one.
+	Campuses are looked up in the campus directory, then in the profile itself (where
+	`profile.trim_campus` only leaves those the directory did not know).
+	"""
+	directory = get_campuses()
+	embedded = {cp['id']: cp for cp in me.get('campus') or [] if 'name' in cp}
+	primary = next((cpu['campus_id'] for cpu in me['campus_users'] if cpu['is_primary']), None)
+	for cid in [primary, *(cp['id'] for cp in me.get('campus') or [])]:
+		if (campus := directory.get(cid) or embedded.get(cid)) is not None:
+			return campus
+	return {}
+
 
-	with open('app/server/static/projects.json', 'r') as f:
-		projects = json.load(f)
+def compute_transcript(me: dict, mult: float = DEFAULT_MULT, exp: float = DEFAULT_EXP) -> dict:
+	"""
+	Transcript data of a trimmed profile (see `profile.trim_profile`).
+	`engine.CreditEngine` computes the same credits and GPAs for many users at once.
+	"""
+	campus = primary_campus(me)
+	me_projects = graded_projects(me)
+
+	index = get_catalogue().index()
+	tprojects = {tcat: [] for tcat in CATEGORIES}
+	for pid, up in me_projects.items():
+		if (entry := index.get(pid)) is None:
+			continue
+		tproject = up | entry['project']
+		if mult == DEFAULT_MULT and exp == DEFAULT_EXP:
+			tproject['base'] = entry['credits']
+		else:
+			tproject['base'] = project_credits(tproject['base'], mult, exp)
+		tproject['credits'] = ceil(tproject['mark'] / 100 * tproject['base'])
+		if tproject['credits'] > tproject['base']:
+			tproject['credits'] = tproject['base']
+		tprojects[entry['category']].append((entry['pos'], tproject))
 
 	transcript = {}
 	tmcredits = 0
 	ttcredits = 0
 	tgpa = 0.0
 	tgcount = 0
-	for tcat in ('piscine', 'commonCore', 'postCore'):
-		tprojects = []
-		mcredits = 0
-		tcredits = 0
-		gpa = 0.0
-		count = 0
-		for cat_name, cat in projects[tcat].items():
-			for p in cat:
-				if p['id'] in me_projects:
-					tproject = me_projects[p['id']] | p
-					tproject['base'] = ceil(tproject['base'] ** exp * mult)
-					mcredits += tproject['base']
-					tmcredits += tproject['base']
-					tproject['credits'] = ceil(tproject['mark'] / 100 * tproject['base'])
-					if tproject['credits'] > tproject['base']:
-						tproject['credits'] = tproject['base']
-					tcredits += tproject['credits']
-					ttcredits += tproject['credits']
-					gpa += tproject['mark']
-					count += 1
-					tgpa += tproject['mark']
-					tgcount += 1
-					tprojects.append(tproject)
-					del me_projects[p['id']]
-		gpa = round(gpa / count, 2) if tprojects else 0.0
+	for tcat in CATEGORIES:
+		projects = [tp for _, tp in sorted(tprojects[tcat], key=lambda x: x[0])]
+		mcredits = sum(tp['base'] for tp in projects)
+		tcredits = sum(tp['credits'] for tp in projects)
+		gpa = float(sum(tp['mark'] for tp in projects))
+		count = len(projects)
+		tmcredits += mcredits
+		ttcredits += tcredits
+		tgpa += gpa
+		tgcount += count
+		gpa = round(gpa / count, 2) if projects else 0.0
 		transcript[tcat] = {
 			'maxCredits': mcredits,
 			'totalCredits': tcredits,
 			'gpa': gpa,
-			'projects': tprojects,
+			'projects': projects,
 		}
 	transcript['maxCredits'] = tmcredits
 	transcript['totalCredits'] = ttcredits
@@ -118,5 +160,69 @@ def get_transcript_data(session: dict, mult: float = 2, exp: float = 0.25) -> di
 		},
 		'transcript': transcript,
 		'date': date,
-		'version': os.environ.get(Data.X_VERSION, '0.0.0'),
+		'version': get_config().version,
 	}
+
+
+def transcript_etag(data: dict, preview: bool = False) -> str:
+	"""
+	Strong ETag of the JSON of `data` (as returned by `get_transcript_data`), or of its HTML
+	preview with `preview`. Derived from the data and the template only, so that it is known
+	before anything is rendered.
+	"""
+	h = hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+	if preview:
+		h.update(b'\0' + _template_digest().encode())
+		h.update(b'\0' + json.dumps(dict(get_config().template_env), sort_keys=True, default=dict).encode())
+	return h.hexdigest()[:32]
+
+
+def render_transcript_html(data: dict, assets_url: str) -> str:
+	"""
+	Render `transcript.html` of `data` for browsers. Its images, moved out to `file://` URLs for
+	the PDF renderer (see `templates.extract_images`), are pointed to `assets_url` instead.
+	"""
+	with STAGE_SECONDS.time(stage='jinja'):
+		html = render_template('transcript.html', pop_feedbacks=False, **data)
+	return html.replace('file://' + quote(get_assets_dir()) + '/', assets_url)
+
+
+def write_transcript_pdf(data: dict, out: BinaryIO, engine: str | None = None) -> int:
+	"""
+	Render the transcript PDF of `data` into the binary file `out`, with the `PDF_ENGINE`
+	(or `engine`): `transcript.html` through wkhtmltopdf, or the native layout.
+	Needs an app context for wkhtmltopdf. Returns the PDF size.
+	"""
+	if (engine or get_config().pdf_engine) == 'native':
+		with STAGE_SECONDS.time(stage='pdf'):
+			return render_transcript(data, out)
+	with STAGE_SECONDS.time(stage='jinja'):
+		html = render_template('transcript.html', pop_feedbacks=False, **data)
+	with STAGE_SECONDS.time(stage='pdf'):
+		return render_pdf_to(html, out)
+
+
+def get_transcript_pdf(data: dict) -> tuple[str, bool, bool]:
+	"""
+	Render the transcript PDF of `data` (as returned by `get_transcript_data`), going through the PDF cache.
+	The PDF is streamed to disk as it is rendered, never held in memory.
+	Needs an app context, not a request context.
+
+	Returns:
+		tuple: `(path, temporary, hit)`: the path of the PDF, whether it is a temporary file that
+			could not be cached (to be deleted by the caller), and whether it was a cache hit.
+	"""
+	cache = get_cache()
+	key = cache.key(data)
+	if (path := cache.get(key)) is not None:
+		return path, False, True
+	fd, tmp = cache.tempfile()
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			write_transcript_pdf(data, f)
+	except BaseException:
+		os.remove(tmp)
+		raise
+	if (path := cache.commit(key, tmp)) is not None:
+		return path, False, False
+	return tmp, True, False
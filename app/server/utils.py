@@ -1,9 +1,8 @@
-import os
-import sys
 import urllib.parse
-from flask import session, render_template as flask_render_template
+from flask import session, has_request_context, render_template as flask_render_template
 
 from .data import Data
+from .config import get_config
 
 
 def strbool(s: str | int | bool | None, strict: bool = False) -> bool | None:
@@ -21,7 +20,7 @@ def strbool(s: str | int | bool | None, strict: bool = False) -> bool | None:
 		return None if strict else False
 	if isinstance(s, bool):
 		return s
-	if not isinstance(s, int | float):
+	if isinstance(s, int | float):
 		return s != 0
 	if s.lower() in ('true', '1', 'yes', 'y', 'on'):
 		return True
@@ -30,31 +29,6 @@ def strbool(s: str | int | bool | None, strict: bool = False) -> bool | None:
 	return None
 
 
-def set_default(var: str, value, env: dict | os._Environ | None = None) -> None:
-	"""
-	Set the environment variable `var` to `value` if it is not already set in `env`.
-
-	Args:
-		var (str): The name of the environment variable.
-		value: The value to set if the variable is not already set.
-		env (dict | os._Environ | None): The environment dictionary (e.g., os.environ).
-	"""
-	if env is None:
-		env = os.environ
-	if var not in env:
-		env[var] = str(value)
-
-
-def os_assert(variable: str) -> None:
-	"""
-	Assert that the environment variable `variable` is set.
-	If not, print an error message and exit the program.
-	"""
-	if os.environ.get(variable) is None:
-		print(f"[FATAL] Environment variable {variable} must be set.")
-		sys.exit(1)
-
-
 def get_url(url, *args, **kwargs):
 	"""
 	Construct a URL with optional query parameters and an optional base API URL.
@@ -84,7 +58,7 @@ def get_url(url, *args, **kwargs):
 	if args or kwargs:
 		url = url[:-1]
 	if url.startswith('/'):
-		url = os.environ.get(Data.X_API_URL) + url
+		url = get_config().api_url + url
 	elif url.startswith('~/'):
 		url = url[1:]
 	return url
@@ -138,14 +112,18 @@ def session_error(
 		'code': c,
 	}
 
-	if not Data.S_ERRORS in session:
-		session[Data.S_ERRORS] = []
-	session[Data.S_ERRORS].append(kwargs | obj)
+	# Background jobs have no user session to report to
+	if has_request_context():
+		if not Data.S_ERRORS in session:
+			session[Data.S_ERRORS] = []
+		session[Data.S_ERRORS].append(kwargs | obj)
 
 	return kwargs | (error if is_dict else obj)
 
 
 def session_success(message: str, **kwargs) -> None:
+	if not has_request_context():
+		return
 	if not Data.S_SUCCESSES in session:
 		session[Data.S_SUCCESSES] = []
 	session[Data.S_SUCCESSES].append(kwargs | {
@@ -182,7 +160,7 @@ def render_template(template_name: str, /, pop_feedbacks: bool = True, **context
 		str: The rendered template as a string.
 	"""
 	if 'env' not in context:
-		context['env'] = os.environ
+		context['env'] = get_config().template_env
 	if pop_feedbacks and 'errors' not in context and 'successes' not in context:
 		context['errors'] = pop_session_errors()
 		context['successes'] = pop_session_successes()
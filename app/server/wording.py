@@ -0,0 +1,53 @@
+from types import MappingProxyType
+
+
+# Fixed wording of the transcript, shared by `transcript.html` (as `env.WORDING`) and the native
+# layout of `pdflayout`, so that both engines print the same text. Values are inline HTML
+# (`strong`, `em`, `sup`, `a` and `br`), rendered unescaped.
+
+TITLE = 'Unofficial 42 School Transcript'
+
+# French Training Organization Registration Number
+TORN = '11 75 50234 75'
+# Institution Registration Number with the Regional Education Authority
+RRN = '0755733Z'
+
+NOTES = (
+	'Since École 42 does not issue official transcripts, this document has been prepared by a student. <br>'
+	' The curriculum at 42 is divided into three stages:'
+)
+STAGES = (
+	'The “Piscine” (literally “swimming pool”): the entrance exam, during which students spend one full month completing daily projects and taking weekly exams.',
+	'The Common Core: based on the same principle, but with five exams (Rank 02 to Rank 06 — there are no 00 or 01) spread across the first two years of study.',
+	'Post-Core (or Specialization): after completing the final Common Core project, <em>Transcendence</em>, students move on to the last stage before the Master\'s degree, which involves completing additional projects and undertaking two professional experiences.',
+)
+JURY = 'After fulfilling all requirements, students appear before a jury, which decides whether to award the diploma.'
+
+FOOTNOTES = (
+	('<sup>(1)</sup>', 'French Training Organization Registration Number'),
+	('<sup>(2)</sup>', 'Institution Registration Number with the Regional Education Authority (Rectorate)'),
+	('(*)', 'Grades are still out of 100, but up to 25 bonus points may be awarded for outstanding work.'),
+)
+
+# Followed by the edition date and version
+CREDIT = (
+	'This is an unofficial transcript generated by '
+	'<a href="https://github.com/Luzog78/42TranscriptGenerator">Luzog78/42TranscriptGenerator</a>.'
+	' | It is calculated from real data retrieved from the official 42 Intern API.'
+)
+PURPOSE = (
+	'Its purpose is to provide information demonstrating that a student is active, continuously learning, and expanding their experience and skills.<br>'
+	'Because 42 includes many projects, this transcript lists only the most significant ones, such as the exams, <em>Transcendence</em>, and professional experiences.'
+)
+
+WORDING = MappingProxyType({
+	'TITLE': TITLE,
+	'TORN': TORN,
+	'RRN': RRN,
+	'NOTES': NOTES,
+	'STAGES': STAGES,
+	'JURY': JURY,
+	'FOOTNOTES': FOOTNOTES,
+	'CREDIT': CREDIT,
+	'PURPOSE': PURPOSE,
+})
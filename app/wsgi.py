@@ -1,5 +1,5 @@
-import sys
+from main import create_app, load_env
 
-sys.argv = ["main.py", ".env", "secrets.txt"]
+load_env([".env", "secrets.txt"])
 
-from main import app
+app = create_app()
@@ -0,0 +1,90 @@
+"""
+Benchmark of the array-backed credit engine against `compute_transcript`.
+
+Builds `--users` synthetic profiles (see `fake_api.py`), computes their credits and GPAs for
+every `(mult, exp)` of the grid with both implementations, checks that every figure is
+identical, and reports the time each took. Exits with 1 on any difference.
+
+Needs numpy.
+
+Usage:
+	python bench/credits.py --users 20000 --mults 1,2,3 --exps 0.25,0.5
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_api import FakeApi
+
+
+def setup_env() -> None:
+	# `compute_transcript` reads the config (for the version) but never calls the API
+	for key in ('API_URL', 'API_TOKEN_URL', 'API_OAUTH_URL', 'REDIRECT_URI', 'FT_UID', 'FT_SECRET'):
+		os.environ.setdefault(key, 'bench')
+
+
+def figures(transcript: dict) -> dict:
+	from server.catalogue import CATEGORIES
+
+	return {
+		k: ({f: v[f] for f in ('maxCredits', 'totalCredits', 'gpa')} if k in CATEGORIES else v)
+		for k, v in transcript.items()
+	}
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description='Compare the credit engine with compute_transcript.')
+	parser.add_argument('--users', type=int, default=5000, help='number of synthetic users')
+	parser.add_argument('--projects', type=int, default=60, help='projects_users per synthetic user')
+	parser.add_argument('--mults', default='1,2,3', help='comma-separated mult values')
+	parser.add_argument('--exps', default='0.25,0.5,1', help='comma-separated exp values')
+	args = parser.parse_args()
+	setup_env()
+
+	from server.profile import trim_profile
+	from server.transcript import compute_transcript
+	from server.engine import CreditEngine
+
+	params = [(float(m), float(e)) for m in args.mults.split(',') for e in args.exps.split(',')]
+	api = FakeApi(projects=args.projects)
+	# 156645 is special-cased by `graded_projects`
+	profiles = [trim_profile(api.user(n)) for n in [*range(1, args.users), 56645]]
+
+	start = time.perf_counter()
+	expected = [[figures(compute_transcript(me, mult, exp)['transcript']) for mult, exp in params] for me in profiles]
+	reference = time.perf_counter() - start
+
+	start = time.perf_counter()
+	engine = CreditEngine()
+	for me in profiles:
+		engine.add_user(me)
+	ingest = time.perf_counter() - start
+	start = time.perf_counter()
+	results = engine.compute(params)
+	compute = time.perf_counter() - start
+
+	mismatches = 0
+	for row in range(len(profiles)):
+		for k in range(len(params)):
+			if (got := results.transcript(row, k)) != expected[row][k]:
+				mismatches += 1
+				if mismatches <= 5:
+					print(f"MISMATCH user {results.users[row]} {params[k]}:\n  expected {expected[row][k]}\n  got      {got}")
+
+	n = len(profiles) * len(params)
+	print(f"{len(profiles)} users x {len(params)} parameter sets = {n} transcripts")
+	print(f"{'compute_transcript':<24}{reference * 1000:>10.1f} ms  ({n / reference:,.0f} transcripts/s)")
+	print(f"{'engine ingest':<24}{ingest * 1000:>10.1f} ms  (once per user)")
+	print(f"{'engine compute':<24}{compute * 1000:>10.1f} ms  ({n / compute:,.0f} transcripts/s, x{reference / compute:.1f})")
+	print(f"{'engine total':<24}{(ingest + compute) * 1000:>10.1f} ms  (x{reference / (ingest + compute):.1f})")
+	print('identical' if mismatches == 0 else f'{mismatches} MISMATCHES')
+	return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Local stand-in for the 42 API, serving synthetic users.
+
+The OAuth code `user-<n>` logs in as the n-th synthetic user, whose access token is `token-<n>`.
+The client-credentials grant gets the app token `token-app`, which can read any user through
+`/v2/users/user<n>`, list the `campuses` campuses and the `population` users of every campus
+and cursus.
+Every user is generated deterministically from its number, with `projects` projects_users
+drawn from `projects.json`, `campuses` campus memberships and `cursus` cursus memberships.
+"""
+import os
+import json
+import random
+import logging
+import threading
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+
+
+PROJECTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'server', 'static', 'projects.json')
+
+
+class FakeApi:
+	def __init__(
+			self,
+			projects: int = 60,
+			campuses: int = 1,
+			cursus: int = 2,
+			latency: float = 0.0,
+			seed: int = 42,
+			population: int = 100,
+			):
+		self.projects = projects
+		self.population = population
+		self.campuses = max(1, campuses)
+		self.cursus = max(1, cursus)
+		self.latency = latency
+		self.seed = seed
+		self.calls: dict[str, int] = {}
+		self._lock = threading.Lock()
+		self._users: dict[int, bytes] = {}
+
+		with open(PROJECTS_PATH, 'r') as f:
+			catalogue = json.load(f)
+		self.project_ids = [p['id'] for tcat in catalogue.values() for cat in tcat.values() for p in cat]
+
+		self.app = Flask(__name__)
+		self.app.add_url_rule('/oauth/token', 'token', self.token, methods=['POST'])
+		self.app.add_url_rule('/v2/me', 'me', self.me)
+		self.app.add_url_rule('/v2/users/<login>', 'user', self.user_by_login)
+		self.app.add_url_rule('/v2/users/<int:uid>/projects_users', 'projects_users', self.projects_users)
+		self.app.add_url_rule('/v2/campus', 'campus', self.campus_list)
+		self.app.add_url_rule('/v2/campus/<int:cid>/users', 'campus_users', self.users)
+		self.app.add_url_rule('/v2/cursus/<int:cid>/users', 'cursus_users', self.users)
+		self._server = None
+
+	def _count(self, name: str) -> None:
+		with self._lock:
+			self.calls[name] = self.calls.get(name, 0) + 1
+
+	def _wait(self) -> None:
+		if self.latency > 0:
+			threading.Event().wait(self.latency)
+
+	def campus(self, cid: int) -> dict:
+		return {
+			'id': cid,
+			'name': f'Campus {cid}',
+			'time_zone': 'Europe/Paris',
+			'language': {'id': 1, 'name': 'Français', 'identifier': 'fr'},
+			'users_count': 4242,
+			'vogsphere_id': cid,
+			'country': 'France',
+			'address': f'{cid} rue de la Paix',
+			'zip': '75000',
+			'city': 'Paris',
+			'website': f'https://campus{cid}.example.org',
+			'facebook': '',
+			'twitter': '',
+			'active': True,
+			'public': True,
+			'email_extension': '42.fr',
+			'default_hidden_phone': False,
+		}
+
+	def user(self, n: int) -> dict:
+		rnd = random.Random(self.seed * 1_000_003 + n)
+		projects_users = []
+		for i in range(self.projects):
+			pid = rnd.choice(self.project_ids)
+			projects_users.append({
+				'id': n * 100_000 + i,
+				'occurrence': rnd.randint(0, 2),
+				'final_mark': rnd.choice([None, 0, 50, 80, 100, 100, 115, 125]),
+				'status': 'finished',
+				'validated?': True,
+				'current_team_id': n * 100_000 + i,
+				'project': {
+					'id': pid,
+					'name': f'Project {pid}',
+					'slug': f'project-{pid}',
+					'parent_id': rnd.choice([None, None, None, None, 1]),
+				},
+				'cursus_ids': [21],
+				'marked_at': '2024-01-01T00:00:00.000Z',
+				'marked': True,
+				'retriable_at': None,
+				'created_at': '2023-09-01T00:00:00.000Z',
+				'updated_at': f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00.000Z',
+			})
+		return {
+			'id': 100_000 + n,
+			'email': f'user{n}@student.42.fr',
+			'login': f'user{n}',
+			'first_name': f'first{n}',
+			'last_name': f'last{n}',
+			'usual_full_name': f'first{n} last{n}',
+			'url': f'https://api.intra.42.fr/v2/users/user{n}',
+			'image': {'link': f'https://cdn.intra.42.fr/users/user{n}.jpg', 'versions': {}},
+			'staff?': False,
+			'correction_point': rnd.randint(0, 20),
+			'pool_month': rnd.choice(['july', 'august', 'september']),
+			'pool_year': str(rnd.randint(2018, 2024)),
+			'wallet': rnd.randint(0, 1000),
+			'active?': True,
+			'alumni?': False,
+			'alumnized_at': None,
+			'cursus_users': [
+				{
+					'id': n * 10 + c,
+					'begin_at': f'20{18 + c}-10-01T00:00:00.000Z',
+					'end_at': None,
+					'grade': 'Learner' if c else None,
+					'level': round(rnd.uniform(0, 21), 2),
+					'skills': [{'id': s, 'name': f'Skill {s}', 'level': rnd.uniform(0, 15)} for s in range(12)],
+					'cursus_id': 21 if c else 9,
+					'cursus': {'id': 21 if c else 9, 'name': f'Cursus {c}', 'slug': f'cursus-{c}'},
+				}
+				for c in range(self.cursus)
+			],
+			'campus_users': [
+				{'id': n * 10 + c, 'user_id': 100_000 + n, 'campus_id': c + 1, 'is_primary': c == self.campuses - 1}
+				for c in range(self.campuses)
+			],
+			'campus': [self.campus(c + 1) for c in range(self.campuses)],
+			'projects_users': projects_users,
+			'achievements': [{'id': a, 'name': f'Achievement {a}', 'description': 'x' * 64} for a in range(30)],
+			'languages_users': [{'id': n, 'language_id': 1}],
+		}
+
+	def _json(self, payload: bytes | str, status: int = 200) -> Response:
+		res = Response(payload, status=status, mimetype='application/json')
+		if request.method == 'GET' and status == 200:
+			# Like the API: weak ETag of the body, revalidated on every read
+			res.headers['Cache-Control'] = 'max-age=0, private, must-revalidate'
+			res.add_etag(weak=True)
+			res.make_conditional(request)
+			if res.status_code == 304:
+				self._count('not_modified')
+		return res
+
+	def _user_of_token(self) -> int | None:
+		auth = request.headers.get('Authorization', '')
+		if not auth.startswith('Bearer token-'):
+			return None
+		try:
+			return int(auth.removeprefix('Bearer token-'))
+		except ValueError:
+			return None
+
+	def token(self):
+		self._count('token')
+		self._wait()
+		if request.form.get('grant_type') == 'client_credentials':
+			return self._json(json.dumps({
+				'access_token': 'token-app',
+				'token_type': 'bearer',
+				'expires_in': 7200,
+				'scope': 'public',
+				'created_at': 0,
+			}))
+		code = request.form.get('code') or request.form.get('refresh_token') or ''
+		n = code.rsplit('-', 1)[-1]
+		if not n.isdigit():
+			return self._json(json.dumps({'error': 'invalid_grant', 'error_description': 'Bad code.'}), 400)
+		return self._json(json.dumps({
+			'access_token': f'token-{n}',
+			'refresh_token': f'refresh-{n}',
+			'token_type': 'bearer',
+			'expires_in': 7200,
+			'scope': 'public',
+			'created_at': 0,
+		}))
+
+	def _user_json(self, n: int) -> bytes:
+		if n not in self._users:
+			with self._lock:
+				self._users[n] = json.dumps(self.user(n)).encode('utf-8')
+		return self._users[n]
+
+	def user_by_login(self, login: str):
+		self._count('user')
+		self._wait()
+		if self._user_of_token() is None and request.headers.get('Authorization') != 'Bearer token-app':
+			return self._json(json.dumps({'error': 'Not authorized'}), 401)
+		n = login.removeprefix('user')
+		if not login.startswith('user') or not n.isdigit():
+			return self._json(json.dumps({}), 404)
+		return self._json(self._user_json(int(n)))
+
+	def projects_users(self, uid: int):
+		self._count('projects_users')
+		self._wait()
+		if self._user_of_token() is None and request.headers.get('Authorization') != 'Bearer token-app':
+			return self._json(json.dumps({'error': 'Not authorized'}), 401)
+		projects = json.loads(self._user_json(uid - 100_000))['projects_users']
+		if (updated := request.args.get('range[updated_at]')) is not None:
+			start, end = updated.split(',')
+			projects = [p for p in projects if start <= p['updated_at'] <= end]
+		page = int(request.args.get('page[number]', 1))
+		size = int(request.args.get('page[size]', 30))
+		res = self._json(json.dumps(projects[(page - 1) * size:page * size]))
+		res.headers['X-Total'] = str(len(projects))
+		res.headers['X-Per-Page'] = str(size)
+		return res
+
+	def campus_list(self):
+		self._count('campus')
+		self._wait()
+		if request.headers.get('Authorization') != 'Bearer token-app':
+			return self._json(json.dumps({'error': 'Not authorized'}), 401)
+		page = int(request.args.get('page[number]', 1))
+		size = int(request.args.get('page[size]', 30))
+		ids = range((page - 1) * size + 1, min(page * size, self.campuses) + 1)
+		res = self._json(json.dumps([self.campus(c) for c in ids]))
+		res.headers['X-Total'] = str(self.campuses)
+		res.headers['X-Per-Page'] = str(size)
+		return res
+
+	def users(self, cid: int):
+		self._count('users')
+		self._wait()
+		if request.headers.get('Authorization') != 'Bearer token-app':
+			return self._json(json.dumps({'error': 'Not authorized'}), 401)
+		page = int(request.args.get('page[number]', 1))
+		size = int(request.args.get('page[size]', 30))
+		ns = range((page - 1) * size + 1, min(page * size, self.population) + 1)
+		res = self._json(json.dumps([{'id': 100_000 + n, 'login': f'user{n}'} for n in ns]))
+		res.headers['X-Total'] = str(self.population)
+		res.headers['X-Per-Page'] = str(size)
+		return res
+
+	def me(self):
+		self._count('me')
+		self._wait()
+		if (n := self._user_of_token()) is None:
+			return self._json(json.dumps({'error': 'Not authorized'}), 401)
+		return self._json(self._user_json(n))
+
+	def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+		logging.getLogger('werkzeug').setLevel(logging.WARNING)
+		self._server = make_server(host, port, self.app, threaded=True)
+		threading.Thread(target=self._server.serve_forever, daemon=True).start()
+		return f'http://{host}:{self._server.server_port}'
+
+	def stop(self) -> None:
+		if self._server is not None:
+			self._server.shutdown()
+			self._server = None
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--port', type=int, default=5042)
+	parser.add_argument('--projects', type=int, default=60)
+	parser.add_argument('--campuses', type=int, default=1)
+	parser.add_argument('--cursus', type=int, default=2)
+	parser.add_argument('--latency', type=float, default=0.0)
+	args = parser.parse_args()
+
+	api = FakeApi(args.projects, args.campuses, args.cursus, args.latency)
+	api.app.run(host='127.0.0.1', port=args.port, threaded=True)
@@ -0,0 +1,125 @@
+"""
+Visual diff of the native PDF engine against `transcript.html` rendered by wkhtmltopdf.
+
+Renders the transcripts of `--users` synthetic users (see `fake_api.py`) with both engines,
+rasterizes every page at `--dpi` and compares them pixel by pixel: a pixel differs when its
+gray levels are more than `--tolerance` apart after a `--blur` px box blur, which absorbs
+antialiasing and subpixel placement. Reports the share of differing pixels of each page and
+the render times, and writes an overlay of every page over `--threshold` into `--out`
+(red: only in the native PDF, cyan: only in the HTML one). Exits with 1 when the page
+counts differ or a page is over the threshold.
+
+Needs wkhtmltopdf, pypdfium2 and numpy.
+
+Usage:
+	python bench/pdfdiff.py --users 5 --out /tmp/pdfdiff
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pypdfium2 as pdfium
+
+from fake_api import FakeApi
+from run import setup_app
+
+
+def rasterize(pdf: bytes, dpi: float) -> list[np.ndarray]:
+	doc = pdfium.PdfDocument(pdf)
+	pages = []
+	for page in doc:
+		bitmap = page.render(scale=dpi / 72, grayscale=True)
+		pages.append(bitmap.to_numpy().reshape(bitmap.height, bitmap.width).astype(np.float32))
+	return pages
+
+
+def blur(img: np.ndarray, radius: int) -> np.ndarray:
+	if radius <= 0:
+		return img
+	size = 2 * radius + 1
+	padded = np.pad(img, radius, mode='edge')
+	sums = padded.cumsum(0).cumsum(1)
+	sums = np.pad(sums, ((1, 0), (1, 0)))
+	return (sums[size:, size:] - sums[:-size, size:] - sums[size:, :-size] + sums[:-size, :-size]) / (size * size)
+
+
+def compare(a: np.ndarray, b: np.ndarray, radius: int, tolerance: float) -> float:
+	"""
+	Share of the pixels that differ between the two pages.
+	"""
+	h, w = max(a.shape[0], b.shape[0]), max(a.shape[1], b.shape[1])
+	a = np.pad(a, ((0, h - a.shape[0]), (0, w - a.shape[1])), constant_values=255)
+	b = np.pad(b, ((0, h - b.shape[0]), (0, w - b.shape[1])), constant_values=255)
+	return float((np.abs(blur(a, radius) - blur(b, radius)) > tolerance).mean())
+
+
+def write_overlay(path: str, native: np.ndarray, html: np.ndarray) -> None:
+	h, w = max(native.shape[0], html.shape[0]), max(native.shape[1], html.shape[1])
+	rgb = np.full((h, w, 3), 255, dtype=np.uint8)
+	rgb[:native.shape[0], :native.shape[1], 1] = rgb[:native.shape[0], :native.shape[1], 2] = native
+	rgb[:html.shape[0], :html.shape[1], 0] = html
+	with open(path, 'wb') as f:
+		f.write(b'P6 %d %d 255\n' % (w, h) + rgb.tobytes())
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description='Compare the native PDF engine with transcript.html.')
+	parser.add_argument('--users', type=int, default=3, help='number of synthetic users')
+	parser.add_argument('--projects', type=int, default=60, help='projects_users per synthetic user')
+	parser.add_argument('--dpi', type=float, default=72, help='rasterization resolution')
+	parser.add_argument('--blur', type=int, default=2, help='box blur radius before comparing, in pixels')
+	parser.add_argument('--tolerance', type=float, default=64, help='gray level difference of a differing pixel')
+	parser.add_argument('--threshold', type=float, default=0.03, help='tolerated share of differing pixels per page')
+	parser.add_argument('--out', metavar='DIR', help='write the overlays of the pages over the threshold to DIR')
+	args = parser.parse_args()
+
+	api = FakeApi(projects=args.projects)
+	app = setup_app(api.start(), tempfile.mkdtemp(prefix='42tg-pdfdiff-'), cold=True, engine='wkhtmltopdf')
+	if args.out:
+		os.makedirs(args.out, exist_ok=True)
+
+	from server.profile import trim_profile
+	from server.transcript import compute_transcript, write_transcript_pdf
+
+	failed = 0
+	times = {'native': 0.0, 'wkhtmltopdf': 0.0}
+	with app.app_context():
+		for n in range(1, args.users + 1):
+			data = compute_transcript(trim_profile(api.user(n)))
+			pdfs = {}
+			for engine in times:
+				out = io.BytesIO()
+				start = time.perf_counter()
+				write_transcript_pdf(data, out, engine)
+				times[engine] += time.perf_counter() - start
+				pdfs[engine] = out.getvalue()
+			native, html = rasterize(pdfs['native'], args.dpi), rasterize(pdfs['wkhtmltopdf'], args.dpi)
+			if len(native) != len(html):
+				print(f"user{n}: {len(native)} native pages, {len(html)} HTML pages")
+				failed += 1
+			for p, (a, b) in enumerate(zip(native, html)):
+				score = compare(a, b, args.blur, args.tolerance)
+				over = score > args.threshold
+				print(f"user{n} page {p + 1}: {score * 100:6.2f}% of pixels differ{'  OVER THRESHOLD' if over else ''}")
+				if over:
+					failed += 1
+					if args.out:
+						write_overlay(os.path.join(args.out, f'user{n}-page{p + 1}.ppm'), a, b)
+	api.stop()
+
+	for engine, total in times.items():
+		print(f"{engine:<12}{total / args.users * 1000:>10.1f} ms per transcript")
+	print('identical enough' if failed == 0 else f'{failed} DIFFERENCES')
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Benchmark of the transcript pipeline against a local fake 42 API.
+
+Every virtual user logs in through `/auth`, then downloads its transcript `--transcripts`
+times through `/transcript`, all driven through the real Flask app with `--concurrency`
+users in flight. Reports the latency percentiles and throughput of each route and the
+time spent in each stage of the pipeline (stages nest: `transcript_data` includes the
+`api` calls it makes).
+
+Usage:
+	python bench/run.py --users 50 --concurrency 8 --save bench/baseline.json
+	python bench/run.py --users 50 --concurrency 8 --baseline bench/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_api import FakeApi
+
+
+class Recorder:
+	def __init__(self):
+		self.samples: dict[str, list[float]] = {}
+		self._lock = threading.Lock()
+
+	def add(self, name: str, seconds: float) -> None:
+		with self._lock:
+			self.samples.setdefault(name, []).append(seconds)
+
+	def wrap(self, name: str, fn):
+		def timed(*args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				self.add(name, time.perf_counter() - start)
+		return timed
+
+
+def percentile(values: list[float], p: float) -> float:
+	if not values:
+		return 0.0
+	values = sorted(values)
+	k = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+	return values[k]
+
+
+def summarize(values: list[float]) -> dict:
+	return {
+		'count': len(values),
+		'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+		'p50_ms': round(percentile(values, 50) * 1000, 3),
+		'p95_ms': round(percentile(values, 95) * 1000, 3),
+		'p99_ms': round(percentile(values, 99) * 1000, 3),
+		'max_ms': round(max(values) * 1000, 3) if values else 0.0,
+	}
+
+
+def setup_app(api_url: str, workdir: str, cold: bool, engine: str):
+	os.environ.update({
+		'TITLE': '42TG bench',
+		'VERSION': 'bench',
+		'DEBUG': 'False',
+		'API_URL': api_url,
+		'API_TOKEN_URL': f'{api_url}/oauth/token',
+		'API_OAUTH_URL': f'{api_url}/oauth/authorize?client_id=$FT_UID&redirect_uri=$REDIRECT_URI&response_type=code',
+		'REDIRECT_URI': '$HOST/auth',
+		'FT_UID': 'bench',
+		'FT_SECRET': 'bench',
+		'SECRET_KEY': 'bench',
+		'RATE_LIMIT': '0',
+		'RATE_LIMIT_DB': os.path.join(workdir, 'ratelimit.sqlite3'),
+		'SESSION_DB': os.path.join(workdir, 'sessions.sqlite3'),
+		'JOB_DB': os.path.join(workdir, 'jobs.sqlite3'),
+		'TOKEN_DB': os.path.join(workdir, 'tokens.sqlite3'),
+		'PROFILE_DB': os.path.join(workdir, 'profiles.sqlite3'),
+		'CAMPUS_FILE': os.path.join(workdir, 'campuses.json'),
+		'PDF_CACHE_DIR': os.path.join(workdir, 'pdf'),
+		'PDF_ENGINE': engine,
+	})
+	if cold:
+		os.environ['PDF_CACHE_SIZE'] = '0'
+		os.environ['PROFILE_TTL'] = '0'
+		os.environ['HTTP_CACHE_SIZE'] = '0'
+
+	from main import create_app
+	return create_app()
+
+
+def instrument(rec: Recorder) -> None:
+	import server.routes
+	import server.transcript
+	from server.session import Session
+
+	Session.fetch_token = staticmethod(rec.wrap('token', Session.fetch_token))
+	Session._send = staticmethod(rec.wrap('api', Session._send))
+	server.routes.get_transcript_data = rec.wrap('transcript_data', server.routes.get_transcript_data)
+	server.transcript.render_template = rec.wrap('jinja', server.transcript.render_template)
+	server.transcript.render_pdf_to = rec.wrap('pdf', server.transcript.render_pdf_to)
+	server.transcript.render_transcript = rec.wrap('pdf', server.transcript.render_transcript)
+
+
+def run_user(app, rec: Recorder, n: int, transcripts: int) -> list[str]:
+	errors = []
+	client = app.test_client()
+	start = time.perf_counter()
+	res = client.get(f'/auth?code=user-{n}')
+	rec.add('route:/auth', time.perf_counter() - start)
+	if res.status_code != 302:
+		errors.append(f'/auth user-{n}: HTTP {res.status_code}')
+		return errors
+	for _ in range(transcripts):
+		start = time.perf_counter()
+		res = client.get('/transcript')
+		rec.add('route:/transcript', time.perf_counter() - start)
+		if res.status_code != 200 or res.mimetype != 'application/pdf':
+			errors.append(f'/transcript user-{n}: HTTP {res.status_code} {res.mimetype} {res.data[:200]!r}')
+	return errors
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+	regressions = []
+	for section in ('routes', 'stages'):
+		for name, cur in report[section].items():
+			if (base := baseline.get(section, {}).get(name)) is None:
+				continue
+			for metric in ('p50_ms', 'p95_ms'):
+				if base[metric] > 0 and cur[metric] > base[metric] * (1 + threshold):
+					regressions.append(
+						f'{section}/{name} {metric}: {base[metric]:.2f} -> {cur[metric]:.2f} ms '
+						f'(+{(cur[metric] / base[metric] - 1) * 100:.0f}%)'
+					)
+	if baseline.get('throughput_rps', 0) > 0 and report['throughput_rps'] < baseline['throughput_rps'] / (1 + threshold):
+		regressions.append(f'throughput: {baseline['throughput_rps']:.2f} -> {report['throughput_rps']:.2f} req/s')
+	return regressions
+
+
+def print_report(report: dict) -> None:
+	print(f"{'':<24}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+	for section in ('routes', 'stages'):
+		for name, s in report[section].items():
+			print(f"{name:<24}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+	print(f"throughput: {report['throughput_rps']:.2f} req/s over {report['wall_s']:.2f}s, upstream calls: {report['upstream_calls']}")
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description='Benchmark the transcript pipeline against a local fake 42 API.')
+	parser.add_argument('--users', type=int, default=20, help='number of synthetic users')
+	parser.add_argument('--transcripts', type=int, default=2, help='transcripts downloaded per user')
+	parser.add_argument('--concurrency', type=int, default=4, help='users in flight at once')
+	parser.add_argument('--projects', type=int, default=60, help='projects_users per synthetic user')
+	parser.add_argument('--campuses', type=int, default=1, help='campuses per synthetic user')
+	parser.add_argument('--cursus', type=int, default=2, help='cursus per synthetic user')
+	parser.add_argument('--latency', type=float, default=0.0, help='added latency of the fake API, in seconds')
+	parser.add_argument('--engine', choices=('wkhtmltopdf', 'native'), default='wkhtmltopdf', help='PDF engine')
+	parser.add_argument('--cold', action='store_true', help='disable the PDF, profile and upstream response caches')
+	parser.add_argument('--save', metavar='FILE', help='write the report to FILE, to be used as a baseline')
+	parser.add_argument('--baseline', metavar='FILE', help='compare against a baseline report')
+	parser.add_argument('--threshold', type=float, default=0.2, help='tolerated slowdown vs. the baseline (0.2 = 20%%)')
+	args = parser.parse_args()
+
+	api = FakeApi(args.projects, args.campuses, args.cursus, args.latency)
+	api_url = api.start()
+	workdir = tempfile.mkdtemp(prefix='42tg-bench-')
+	app = setup_app(api_url, workdir, args.cold, args.engine)
+	rec = Recorder()
+	instrument(rec)
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+		results = list(executor.map(lambda n: run_user(app, rec, n, args.transcripts), range(args.users)))
+	wall = time.perf_counter() - start
+	api.stop()
+
+	errors = [e for r in results for e in r]
+	requests_count = sum(len(v) for k, v in rec.samples.items() if k.startswith('route:'))
+	report = {
+		'params': vars(args) | {'save': None, 'baseline': None},
+		'routes': {k.removeprefix('route:'): summarize(v) for k, v in rec.samples.items() if k.startswith('route:')},
+		'stages': {
+			k: summarize(rec.samples[k])
+			for k in ('token', 'api', 'transcript_data', 'jinja', 'pdf')
+			if k in rec.samples
+		},
+		'throughput_rps': round(requests_count / wall, 3) if wall > 0 else 0.0,
+		'wall_s': round(wall, 3),
+		'upstream_calls': dict(api.calls),
+		'errors': len(errors),
+	}
+
+	print_report(report)
+	for e in errors[:10]:
+		print(f'[ERROR] {e}', file=sys.stderr)
+
+	if args.save:
+		with open(args.save, 'w') as f:
+			json.dump(report, f, indent='\t')
+		print(f'[INFO] Report saved to {args.save}.')
+
+	if args.baseline:
+		with open(args.baseline, 'r') as f:
+			regressions = compare(report, json.load(f), args.threshold)
+		for r in regressions:
+			print(f'[REGRESSION] {r}')
+		if regressions:
+			return 1
+		print('[INFO] No regression against the baseline.')
+
+	return 1 if errors else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
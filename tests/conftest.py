@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+# Settings are read lazily from the environment: keep every store out of the working tree
+_tmp = tempfile.mkdtemp(prefix='42tg-tests-')
+os.environ.update({
+	'API_URL': 'http://127.0.0.1:9',
+	'API_TOKEN_URL': 'http://127.0.0.1:9/oauth/token',
+	'API_OAUTH_URL': 'http://127.0.0.1:9/oauth/authorize?client_id=$FT_UID&redirect_uri=$REDIRECT_URI',
+	'REDIRECT_URI': '$HOST/auth',
+	'FT_UID': 'uid',
+	'FT_SECRET': 'secret',
+	'LOG_LEVEL': 'WARNING',
+	'SESSION_DB': os.path.join(_tmp, 'sessions.sqlite3'),
+	'RATE_LIMIT_DB': os.path.join(_tmp, 'ratelimit.sqlite3'),
+	'PROFILE_DB': os.path.join(_tmp, 'profiles.sqlite3'),
+	'TOKEN_DB': os.path.join(_tmp, 'tokens.sqlite3'),
+	'JOB_DB': os.path.join(_tmp, 'jobs.sqlite3'),
+	'CAMPUS_FILE': os.path.join(_tmp, 'campuses.json'),
+	'PDF_CACHE_DIR': os.path.join(_tmp, 'pdf'),
+	'TEMPLATE_CACHE_DIR': os.path.join(_tmp, 'templates'),
+	'ASSET_DIR': os.path.join(_tmp, 'assets'),
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+	from main import create_app
+	# A fresh campus directory, so that starting the app does not fetch one
+	with open(os.environ['CAMPUS_FILE'], 'w') as f:
+		f.write('[]')
+	return create_app()
+
+
+@pytest.fixture
+def profile() -> dict:
+	"""
+	A trimmed profile (see `profile.trim_profile`) with a dozen graded projects of the catalogue.
+	"""
+	from server.catalogue import get_catalogue
+	pids = sorted(get_catalogue().index())[:12]
+	return {
+		'id': 1, 'login': 'jdoe', 'first_name': 'John', 'last_name': 'Doe', 'email': 'jdoe@student.42.fr',
+		'active?': True, 'alumni?': False, 'alumnized_at': None, 'pool_month': 'july', 'pool_year': '2023',
+		'campus_users': [{'campus_id': 1, 'is_primary': True}],
+		'campus': [{
+			'id': 1, 'name': 'Paris', 'address': '96 boulevard Bessières', 'zip': '75017', 'city': 'Paris',
+			'country': 'France', 'website': 'https://42.fr',
+		}],
+		'projects_users': [
+			{'final_mark': 80 + i * 3, 'current_team_id': 1000 + i, 'project': {'id': pid, 'name': f'Project {pid}', 'parent_id': None}}
+			for i, pid in enumerate(pids)
+		],
+	}
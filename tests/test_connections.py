@@ -0,0 +1,43 @@
+import threading
+
+from server.connections import Connections
+
+
+def setup(db):
+	db.execute('CREATE TABLE IF NOT EXISTS t (k TEXT PRIMARY KEY, v INTEGER NOT NULL)')
+
+
+def connection_of_thread(connections):
+	result = []
+	thread = threading.Thread(target=lambda: result.append(connections.get()))
+	thread.start()
+	thread.join()
+	return result[0]
+
+
+def test_one_connection_per_thread(tmp_path):
+	connections = Connections(str(tmp_path / 'db.sqlite3'), setup)
+
+	assert connections.get() is connections.get()
+	assert connection_of_thread(connections) is not connections.get()
+
+
+def test_shared_connection_under_gevent(tmp_path):
+	connections = Connections(str(tmp_path / 'db.sqlite3'), setup)
+	connections.shared = True
+
+	assert connection_of_thread(connections) is connections.get()
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+	connections = Connections(str(tmp_path / 'db.sqlite3'), setup)
+	with connections.transaction() as db:
+		db.execute("INSERT INTO t VALUES ('a', 1)")
+	try:
+		with connections.transaction() as db:
+			db.execute("UPDATE t SET v = 2 WHERE k = 'a'")
+			raise ValueError
+	except ValueError:
+		pass
+
+	assert connections.get().execute("SELECT v FROM t WHERE k = 'a'").fetchone() == (1,)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from server.catalogue import CATEGORIES, DEFAULT_MULT, DEFAULT_EXP, get_catalogue
+from server.transcript import compute_transcript
+
+# Needs numpy
+CreditEngine = pytest.importorskip('server.engine').CreditEngine
+
+
+PARAMS = [(DEFAULT_MULT, DEFAULT_EXP), (1.0, 0.5), (2.5, 0.25), (3.0, 1.0), (1.7, 0.33)]
+
+
+def random_profile(rng: random.Random, uid: int, base: dict) -> dict:
+	"""
+	`base` with random projects_users: retried projects, ungraded ones, subprojects and
+	projects missing from the catalogue included.
+	"""
+	pids = sorted(get_catalogue().index()) + [999_999_001, 999_999_002]
+	projects = []
+	for _ in range(rng.randrange(0, 60)):
+		pid = rng.choice(pids)
+		projects.append({
+			'final_mark': None if rng.random() < 0.1 else rng.randrange(0, 126),
+			'current_team_id': rng.randrange(1, 10**7),
+			'project': {'id': pid, 'name': f'Project {pid}', 'parent_id': rng.choice(pids) if rng.random() < 0.1 else None},
+		})
+	return base | {'id': uid, 'projects_users': projects}
+
+
+def figures(transcript: dict) -> dict:
+	return {
+		k: ({f: v[f] for f in ('maxCredits', 'totalCredits', 'gpa')} if k in CATEGORIES else v)
+		for k, v in transcript.items()
+	}
+
+
+def test_engine_matches_compute_transcript(profile):
+	rng = random.Random(42)
+	# 156645 is special-cased by `graded_projects`
+	profiles = [random_profile(rng, uid, profile) for uid in [*range(1, 200), 156645]]
+	engine = CreditEngine()
+	for me in profiles:
+		engine.add_user(me)
+	results = engine.compute(PARAMS)
+
+	for row, me in enumerate(profiles):
+		for k, (mult, exp) in enumerate(PARAMS):
+			assert results.transcript(row, k) == figures(compute_transcript(me, mult, exp)['transcript']), (me['id'], mult, exp)
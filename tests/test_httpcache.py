@@ -0,0 +1,156 @@
+import json
+
+import pytest
+import requests
+
+from server import httpcache
+from server.httpcache import PUBLIC_SCOPE, ResponseCache
+
+
+URL = 'https://api.intra.42.fr/v2/me'
+
+
+class StubClient:
+	"""
+	Answers GETs with the queued responses, recording the headers of each request.
+	"""
+
+	def __init__(self):
+		self.responses: list[requests.Response] = []
+		self.requests: list[dict] = []
+
+	def queue(self, status: int = 200, body=None, **headers) -> None:
+		res = requests.Response()
+		res.status_code = status
+		res.url = URL
+		res._content = json.dumps(body).encode() if body is not None else b''
+		res.headers.update({k.replace('_', '-'): v for k, v in headers.items()})
+		self.responses.append(res)
+
+	def get(self, url: str, headers: dict | None = None) -> requests.Response:
+		self.requests.append(dict(headers or {}))
+		return self.responses.pop(0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+	client = StubClient()
+	monkeypatch.setattr(httpcache, 'get_client', lambda: client)
+	return client
+
+
+def expire(cache: ResponseCache) -> None:
+	for entry in cache._entries.values():
+		entry.expires = 0
+
+
+def test_private_entries_are_never_served_to_another_scope(client):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, ETag='"a"', Cache_Control='private, max-age=60')
+	client.queue(body={'login': 'bob'}, ETag='"b"', Cache_Control='private, max-age=60')
+
+	assert cache.get(URL, {}, 'uid:1').json() == {'login': 'alice'}
+	assert cache.get(URL, {}, 'uid:2').json() == {'login': 'bob'}
+	# Neither a fresh hit nor a revalidation of alice's entry
+	assert 'If-None-Match' not in client.requests[1]
+	assert cache.get(URL, {}, 'uid:1').json() == {'login': 'alice'}
+	assert cache.get(URL, {}, 'uid:2').json() == {'login': 'bob'}
+	assert len(client.requests) == 2
+
+
+def test_unmarked_entries_are_private(client):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, ETag='"a"')
+	client.queue(body={'login': 'bob'}, ETag='"b"')
+
+	cache.get(URL, {}, 'uid:1')
+
+	assert cache.get(URL, {}, 'uid:2').json() == {'login': 'bob'}
+	assert 'If-None-Match' not in client.requests[1]
+
+
+def test_public_entries_are_shared(client):
+	cache = ResponseCache()
+	client.queue(body=[{'id': 1}], Cache_Control='public, max-age=60')
+
+	cache.get(URL, {}, 'uid:1')
+
+	assert cache.get(URL, {}, 'uid:2').json() == [{'id': 1}]
+	assert len(client.requests) == 1
+	assert list(cache._entries) == [(PUBLIC_SCOPE, URL)]
+
+
+def test_304_merges_the_revalidated_headers(client):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, ETag='"a"', Last_Modified='Mon, 01 Jan 2024 00:00:00 GMT', Cache_Control='no-cache', X_Total='1')
+	client.queue(304, ETag='"a2"', Cache_Control='max-age=60', X_Total='2')
+	cache.get(URL, {'Authorization': 'Bearer t'}, 'uid:1')
+
+	res = cache.get(URL, {'Authorization': 'Bearer t'}, 'uid:1')
+
+	assert client.requests[1] == {
+		'Authorization': 'Bearer t',
+		'If-None-Match': '"a"',
+		'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT',
+	}
+	assert res.status_code == 200
+	assert res.json() == {'login': 'alice'}
+	assert res.headers['ETag'] == '"a2"'
+	assert res.headers['Cache-Control'] == 'max-age=60'
+	# Not a header a 304 may update
+	assert res.headers['X-Total'] == '1'
+	# Fresh now
+	assert cache.get(URL, {}, 'uid:1').json() == {'login': 'alice'}
+	assert len(client.requests) == 2
+
+
+def test_stale_entries_are_revalidated(client):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, ETag='"a"', Cache_Control='max-age=60')
+	client.queue(body={'login': 'alice2'}, ETag='"b"', Cache_Control='max-age=60')
+	cache.get(URL, {}, 'uid:1')
+	expire(cache)
+
+	assert cache.get(URL, {}, 'uid:1').json() == {'login': 'alice2'}
+	assert client.requests[1]['If-None-Match'] == '"a"'
+
+
+@pytest.mark.parametrize('headers', [
+	{'ETag': '"a"', 'Cache-Control': 'no-store'},
+	{'ETag': '"a"', 'Cache-Control': 'max-age=60', 'Vary': '*'},
+	{},
+])
+def test_uncacheable_responses_are_not_stored(client, headers):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, **{k.replace('-', '_'): v for k, v in headers.items()})
+
+	cache.get(URL, {}, 'uid:1')
+
+	assert cache.stats()['entries'] == 0
+
+
+def test_gone_entries_are_dropped(client):
+	cache = ResponseCache()
+	client.queue(body={'login': 'alice'}, ETag='"a"')
+	client.queue(404, body={})
+	cache.get(URL, {}, 'uid:1')
+
+	assert cache.get(URL, {}, 'uid:1').status_code == 404
+	assert cache.stats()['entries'] == 0
+
+
+def test_size_bounds(client):
+	cache = ResponseCache(max_bytes=4000)
+	client.queue(body='x' * 1100, ETag='"big"')
+	cache.get(URL + '/big', {}, 'uid:1')
+	# Over a quarter of the cache
+	assert cache.stats()['entries'] == 0
+
+	for n in range(6):
+		client.queue(body='x' * 700, ETag=f'"{n}"')
+		cache.get(f'{URL}/{n}', {}, 'uid:1')
+	assert cache.stats()['bytes'] <= 4000
+	assert cache.stats()['evictions'] == 1
+	# Least recently used first
+	assert ('uid:1', f'{URL}/0') not in cache._entries
+	assert ('uid:1', f'{URL}/5') in cache._entries
@@ -0,0 +1,82 @@
+import threading
+
+from server import jobs
+from server.jobs import JobManager, JobStore
+
+
+def age(store: JobStore, job_id: str, seconds: float) -> None:
+	store._db().execute('UPDATE jobs SET updated = updated - ? WHERE id = ?', (seconds, job_id))
+
+
+def wait_for(store: JobStore, job_id: str, status: str) -> dict:
+	for _ in range(500):
+		if (job := store.get(job_id))['status'] == status:
+			return job
+		threading.Event().wait(0.01)
+	raise AssertionError(f'{job_id} is still {job["status"]}')
+
+
+def test_claim_coalesces_the_jobs_in_flight_of_an_owner(tmp_path):
+	store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+	job_id, created = store.claim(1)
+
+	assert created
+	assert store.claim(1) == (job_id, False)
+	assert store.claim(2)[0] != job_id
+	store.update(job_id, status='running')
+	assert store.claim(1) == (job_id, False)
+
+	store.update(job_id, status='done', path='/tmp/x.pdf', name='x.pdf')
+	new_id, created = store.claim(1)
+	assert created and new_id != job_id
+
+
+def test_jobs_of_a_dead_worker_time_out(tmp_path):
+	store = JobStore(str(tmp_path / 'jobs.sqlite3'), timeout=60)
+	job_id, _ = store.claim(1)
+	age(store, job_id, 61)
+
+	job = store.get(job_id)
+	assert job['status'] == 'error'
+	assert job['error'] == 'The job timed out.'
+	new_id, created = store.claim(1)
+	assert created and new_id != job_id
+
+
+def test_expired_jobs_are_deleted(tmp_path):
+	store = JobStore(str(tmp_path / 'jobs.sqlite3'), ttl=3600)
+	job_id, _ = store.claim(1)
+	store.update(job_id, status='done', path='/tmp/x.pdf', name='x.pdf')
+	age(store, job_id, 3601)
+
+	store.claim(2)
+
+	assert store.get(job_id) is None
+
+
+def test_submit_runs_one_build_per_owner(app, monkeypatch, tmp_path):
+	release, calls = threading.Event(), []
+
+	def build(sess):
+		calls.append(sess['uid'])
+		release.wait(5)
+		return {'path': '/tmp/x.pdf', 'name': 'x.pdf'}
+
+	monkeypatch.setattr(jobs, 'build_transcript', build)
+	manager = JobManager(JobStore(str(tmp_path / 'jobs.sqlite3')))
+	job_id = manager.submit(app, {'uid': 1})
+
+	assert manager.submit(app, {'uid': 1}) == job_id
+	release.set()
+	job = wait_for(manager.store, job_id, 'done')
+	assert (job['path'], job['name']) == ('/tmp/x.pdf', 'x.pdf')
+	assert calls == [1]
+
+
+def test_failed_builds_are_reported(app, monkeypatch, tmp_path):
+	monkeypatch.setattr(jobs, 'build_transcript', lambda sess: {'error': 'Bad Gateway', 'text': 'The 42 API is down.'})
+	manager = JobManager(JobStore(str(tmp_path / 'jobs.sqlite3')))
+
+	job = wait_for(manager.store, manager.submit(app, {'uid': 1}), 'error')
+
+	assert job['error'] == 'The 42 API is down.'
@@ -0,0 +1,28 @@
+import threading
+
+from main import warm_up
+from server.config import get_config
+from server.campuses import CampusDirectory, get_campuses
+
+
+def test_warm_up_does_not_fetch_campuses(app, monkeypatch, tmp_path):
+	calls = []
+	monkeypatch.setattr(CampusDirectory, 'refresh', lambda self: calls.append('refresh') or False)
+	# Missing, hence stale
+	monkeypatch.setattr(get_campuses(), 'path', str(tmp_path / 'campuses.json'))
+
+	warm_up(app, get_config())
+
+	assert calls == []
+	assert not any(t.name == 'campuses' for t in threading.enumerate())
+	assert get_campuses().index() == {}
+
+
+def test_stale_campuses_are_refreshed_on_first_use(monkeypatch, tmp_path):
+	done = threading.Event()
+	monkeypatch.setattr(CampusDirectory, 'refresh', lambda self: done.set() or False)
+	directory = CampusDirectory(str(tmp_path / 'campuses.json'))
+
+	directory.refresh_if_stale()
+
+	assert done.wait(5)
@@ -0,0 +1,14 @@
+from server.metrics import Registry
+
+
+def test_collected_totals_are_counters():
+	registry = Registry()
+	registry.collector(lambda: {
+		'ft_things_total': ('Things done.', 3),
+		'ft_things_queued': ('Things waiting.', 1),
+	})
+
+	text = registry.render()
+
+	assert '# TYPE ft_things_total counter\nft_things_total 3\n' in text
+	assert '# TYPE ft_things_queued gauge\nft_things_queued 1\n' in text
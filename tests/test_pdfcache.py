@@ -0,0 +1,109 @@
+import os
+import time
+from types import SimpleNamespace
+
+from server import pdfcache
+from server.pdfcache import TMP_TTL, PdfCache
+
+
+def test_native_engine_digest_follows_font_contents(monkeypatch, tmp_path):
+	fonts = tuple(str(tmp_path / f'font{i}.ttf') for i in range(4))
+	for path in fonts:
+		with open(path, 'wb') as f:
+			f.write(b'font')
+	monkeypatch.setattr(pdfcache, 'get_config', lambda: SimpleNamespace(pdf_engine='native', pdf_fonts=fonts))
+	before = pdfcache._engine_digest()
+
+	# Same path, new contents
+	with open(fonts[1], 'wb') as f:
+		f.write(b'other font')
+	os.utime(fonts[1], ns=(1, 1))
+
+	assert pdfcache._engine_digest() != before
+
+
+def entry(cache: PdfCache, key: str, contents: bytes = b'x' * 10, atime: float | None = None, mtime: float | None = None) -> str:
+	"""
+	Commit `contents` under `key`, with the given access and creation times.
+	"""
+	fd, tmp = cache.tempfile()
+	with os.fdopen(fd, 'wb') as f:
+		f.write(contents)
+	path = cache.commit(key, tmp)
+	now = time.time()
+	os.utime(path, (now if atime is None else atime, now if mtime is None else mtime))
+	return path
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+	cache = PdfCache(str(tmp_path), max_bytes=30)
+	now = time.time()
+	entry(cache, 'a', atime=now - 300)
+	entry(cache, 'b', atime=now - 200)
+	entry(cache, 'c', atime=now - 100)
+
+	# A hit makes 'a' the most recently used
+	assert cache.get('a') is not None
+	entry(cache, 'd')
+
+	assert sorted(os.listdir(tmp_path)) == ['a.pdf', 'c.pdf', 'd.pdf']
+	assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+	cache = PdfCache(str(tmp_path), ttl=60)
+	paths = {key: entry(cache, key) for key in ('old', 'stale', 'used', 'fresh')}
+	now = time.time()
+	for key in ('old', 'stale', 'used'):
+		os.utime(paths[key], (now - 61, now - 61))
+	# Recent use does not extend the lifetime
+	os.utime(paths['used'], (now, now - 61))
+	os.utime(paths['fresh'], (now - 59, now - 59))
+
+	assert cache.get('old') is None
+	assert cache.get('fresh') is not None
+	cache.evict()
+
+	assert os.listdir(tmp_path) == ['fresh.pdf']
+	assert cache.stats() | {'hits': 1, 'misses': 1, 'evictions': 2} == cache.stats()
+
+
+def test_commit_replaces_entries_atomically(tmp_path):
+	cache = PdfCache(str(tmp_path), max_bytes=100)
+	path = entry(cache, 'key', b'old')
+	reader = open(path, 'rb')
+	fd, tmp = cache.tempfile()
+	with os.fdopen(fd, 'wb') as f:
+		f.write(b'new')
+
+	assert cache.commit('key', tmp) == path
+
+	# Readers of the previous entry keep reading it whole
+	with reader:
+		assert reader.read() == b'old'
+	with open(path, 'rb') as f:
+		assert f.read() == b'new'
+	assert os.listdir(tmp_path) == ['key.pdf']
+
+
+def test_commit_leaves_entries_too_large_for_the_cache(tmp_path):
+	cache = PdfCache(str(tmp_path), max_bytes=10)
+	fd, tmp = cache.tempfile()
+	with os.fdopen(fd, 'wb') as f:
+		f.write(b'x' * 11)
+
+	assert cache.commit('key', tmp) is None
+	assert os.listdir(tmp_path) == [os.path.basename(tmp)]
+
+
+def test_abandoned_temporary_files_are_removed(tmp_path):
+	cache = PdfCache(str(tmp_path))
+	abandoned = cache.tempfile()
+	rendering = cache.tempfile()
+	for fd, _ in (abandoned, rendering):
+		os.close(fd)
+	os.utime(abandoned[1], (time.time(), time.time() - TMP_TTL - 1))
+
+	entry(cache, 'key')
+
+	assert sorted(os.listdir(tmp_path)) == sorted(['key.pdf', os.path.basename(rendering[1])])
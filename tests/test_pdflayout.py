@@ -0,0 +1,43 @@
+import io
+import re
+from html.parser import HTMLParser
+
+import pytest
+
+from server.transcript import compute_transcript, render_transcript_html
+from server.pdflayout import render_transcript
+
+pypdf = pytest.importorskip('pypdf')
+
+
+class _Text(HTMLParser):
+	def __init__(self):
+		super().__init__()
+		self.text, self.hidden = [], 0
+
+	def handle_starttag(self, tag, attrs):
+		self.hidden += tag in ('head', 'style')
+
+	def handle_endtag(self, tag):
+		self.hidden -= tag in ('head', 'style')
+
+	def handle_data(self, data):
+		if not self.hidden:
+			self.text.append(data)
+
+
+def visible(text: str) -> str:
+	# Layouts space and break lines differently, and list bullets are not text in HTML
+	return re.sub(r'[\s•]', '', text)
+
+
+def test_native_pdf_prints_the_text_of_the_template(app, profile):
+	with app.app_context():
+		data = compute_transcript(profile)
+		parser = _Text()
+		parser.feed(render_transcript_html(data, '/transcript/assets/'))
+	out = io.BytesIO()
+	render_transcript(data, out)
+	pdf = ''.join(page.extract_text() for page in pypdf.PdfReader(out).pages)
+
+	assert visible(pdf) == visible(''.join(parser.text))
@@ -0,0 +1,113 @@
+import pytest
+
+from server import profile as profiles
+from server.profile import ProfileCache, SnapshotStore, get_profile, merge_projects, projects_cursor
+from server.session import Session
+
+
+def project_user(pid: int, mark: int, updated: str) -> dict:
+	return {
+		'id': 100 + pid, 'final_mark': mark, 'current_team_id': 200 + pid, 'updated_at': updated,
+		'project': {'id': pid, 'name': f'Project {pid}', 'parent_id': None},
+	}
+
+
+ME = {
+	'id': 7, 'login': 'jdoe', 'first_name': 'John', 'last_name': 'Doe', 'email': 'jdoe@student.42.fr',
+	'active?': True, 'alumni?': False, 'alumnized_at': None, 'pool_month': 'july', 'pool_year': '2023',
+	'image': {'link': None}, 'cursus_users': [], 'campus_users': [], 'campus': [],
+	'projects_users': [project_user(1, 80, '2024-01-01T00:00:00.000Z'), project_user(2, 90, '2024-02-01T00:00:00.000Z')],
+}
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+	"""
+	Fresh profile cache and snapshots, and a fake `Session.get`: `/v2/me` answers `ME`, the
+	projects_users delta answers `api.delta`. Requested paths are recorded in `api.calls`.
+	"""
+	class Api:
+		calls: list[tuple[str, dict]] = []
+		delta: list[dict] = []
+
+	def get(sess, url, **kwargs):
+		Api.calls.append((url, kwargs))
+		if url == '/v2/me':
+			return ME
+		return {'data': Api.delta}
+
+	monkeypatch.setattr(Session, 'get', staticmethod(get))
+	monkeypatch.setattr(profiles, '_cache', ProfileCache())
+	monkeypatch.setattr(profiles, '_snapshots', SnapshotStore(str(tmp_path / 'profiles.sqlite3')))
+	return Api
+
+
+def paths(api) -> list[str]:
+	return [url for url, _ in api.calls]
+
+
+def test_merge_projects_replaces_by_id():
+	profile = {'projects_users': [project_user(1, 80, 'a'), project_user(2, 90, 'b')]}
+
+	merged = merge_projects(profile, [project_user(1, 100, 'c'), project_user(3, 70, 'c')])
+
+	assert {p['id']: p['final_mark'] for p in merged['projects_users']} == {101: 100, 102: 90, 103: 70}
+	assert [p['final_mark'] for p in profile['projects_users']] == [80, 90]
+
+
+def test_projects_cursor():
+	assert projects_cursor({'projects_users': ME['projects_users']}) == '2024-02-01T00:00:00.000Z'
+	assert projects_cursor({'projects_users': []}) is None
+	# Snapshots without ids or dates cannot be merged with a delta
+	assert projects_cursor({'projects_users': [ME['projects_users'][0] | {'id': None}]}) is None
+	assert projects_cursor({'projects_users': [ME['projects_users'][0] | {'updated_at': None}]}) is None
+
+
+def test_known_users_are_refreshed_with_a_delta(api):
+	sess = {'token': 'token'}
+	get_profile(sess)
+	profiles.get_cache().invalidate(7)
+	api.delta = [project_user(2, 125, '2024-03-01T00:00:00.000Z')]
+
+	profile = get_profile(sess)
+
+	assert paths(api) == ['/v2/me', '/v2/users/7/projects_users']
+	assert api.calls[1][1]['range[updated_at]'].startswith('2024-02-01T00:00:00.000Z,')
+	assert {p['id']: p['final_mark'] for p in profile['projects_users']} == {101: 80, 102: 125}
+	# Persisted: the next delta starts from the new cursor
+	assert projects_cursor(profiles.get_snapshots().get(7)) == '2024-03-01T00:00:00.000Z'
+
+
+def test_snapshots_past_their_ttl_are_fetched_in_full(api):
+	sess = {'token': 'token'}
+	get_profile(sess)
+	profiles.get_cache().invalidate(7)
+	snapshots = profiles.get_snapshots()
+	snapshots._db().execute('UPDATE snapshots SET full = full - ?', (snapshots.ttl + 1,))
+
+	get_profile(sess)
+
+	assert paths(api) == ['/v2/me', '/v2/me']
+
+
+def test_snapshots_without_a_cursor_are_fetched_in_full(api):
+	sess = {'token': 'token'}
+	get_profile(sess)
+	profiles.get_cache().invalidate(7)
+	snapshot = profiles.get_snapshots().get(7)
+	snapshot['projects_users'][0]['updated_at'] = None
+	profiles.get_snapshots().put(7, snapshot, full=False)
+
+	get_profile(sess)
+
+	assert paths(api) == ['/v2/me', '/v2/me']
+
+
+def test_invalidated_profiles_are_fetched_in_full(api):
+	sess = {'token': 'token'}
+	get_profile(sess)
+
+	profiles.invalidate_profile(sess)
+	get_profile({'token': 'token', 'uid': 7})
+
+	assert paths(api) == ['/v2/me', '/v2/me']
@@ -0,0 +1,116 @@
+import pytest
+import requests
+
+from server.ratelimit import RateLimited, RateLimiter
+
+
+# Half an hour past an hour boundary
+START = 3600 * 500_000 + 1800.25
+
+
+class Clock:
+	def __init__(self, now: float = START):
+		self.now = now
+
+	def __call__(self) -> float:
+		return self.now
+
+	def sleep(self, seconds: float) -> None:
+		self.now += seconds
+
+
+def limiter(tmp_path, clock: Clock, **kwargs) -> RateLimiter:
+	return RateLimiter(str(tmp_path / 'ratelimit.sqlite3'), clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def response(status: int = 200, **headers) -> requests.Response:
+	res = requests.Response()
+	res.status_code = status
+	res.headers.update({k.replace('_', '-'): v for k, v in headers.items()})
+	return res
+
+
+def test_burst_then_rate(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock, rate=2, burst=3)
+
+	assert [rl.acquire() for _ in range(5)] == [0, 0, 0, 0.5, 0.5]
+	assert clock.now == START + 1
+	# Idle long enough for the whole burst to come back
+	clock.now += 10
+	assert [rl.acquire() for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_past_the_deadline_nothing_is_reserved(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock, rate=1, burst=1, deadline=2)
+	for _ in range(3):
+		rl.acquire()
+	# The next slot is 1s away
+
+	with pytest.raises(RateLimited) as e:
+		rl.acquire(deadline=0.5)
+	assert e.value.retry_after == pytest.approx(1)
+	assert rl.acquire() == pytest.approx(1)
+	assert rl.stats()['rejected'] == 1
+
+
+def test_retry_after_blocks_the_bucket(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock, rate=2, burst=3, deadline=60)
+	rl.feedback(response(429, Retry_After='30'))
+
+	assert rl.stats()['blocked'] == 30
+	assert rl.stats()['throttled'] == 1
+	assert rl.acquire() == 30
+	# Then the steady rate, not a burst
+	assert [rl.acquire() for _ in range(3)] == [0.5, 0.5, 0.5]
+
+
+def test_unparsable_retry_after_blocks_for_a_second(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock)
+	rl.feedback(response(429, Retry_After='Wed, 21 Oct 2015 07:28:00 GMT'))
+
+	assert rl.stats()['blocked'] == 1
+
+
+def test_exhausted_secondly_limit_blocks_until_the_next_second(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock)
+	rl.feedback(response(X_Secondly_Ratelimit_Remaining='0'))
+
+	assert rl.stats()['blocked'] == pytest.approx(0.75)
+
+
+def test_exhausted_hourly_limit_blocks_until_the_next_hour(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock, deadline=10)
+	rl.feedback(response(X_Hourly_Ratelimit_Remaining='0', X_Secondly_Ratelimit_Remaining='3'))
+
+	assert rl.stats()['blocked'] == pytest.approx(1800 - 0.25)
+	with pytest.raises(RateLimited) as e:
+		rl.acquire()
+	assert e.value.retry_after == pytest.approx(1800 - 0.25)
+	clock.now = START - 1800.25 + 3600
+	assert rl.acquire() == 0
+
+
+def test_remaining_requests_do_not_block(tmp_path):
+	clock = Clock()
+	rl = limiter(tmp_path, clock)
+	rl.feedback(response(X_Hourly_Ratelimit_Remaining='1200', X_Secondly_Ratelimit_Remaining='1'))
+
+	assert rl.stats()['blocked'] == 0
+
+
+def test_workers_share_the_bucket_and_its_blocks(tmp_path):
+	clock = Clock()
+	one, two = limiter(tmp_path, clock, rate=2, burst=2), limiter(tmp_path, clock, rate=2, burst=2)
+
+	assert one.acquire() == 0
+	assert two.acquire() == 0
+	assert one.acquire() == 0.5
+	two.feedback(response(429, Retry_After='5'))
+	assert one.stats()['blocked'] == 5
+	assert one.acquire() == 5
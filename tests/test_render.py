@@ -0,0 +1,132 @@
+import io
+import os
+import stat
+import sys
+import textwrap
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from server import render
+from server.render import RenderError, RenderPool, RenderQueueFull, RenderTimeout
+
+
+# Stands in for wkhtmltopdf: reads the HTML from stdin and writes a "PDF" to stdout, or misbehaves
+# as the HTML asks. `PID:<path>` records the process id, `CRASH:<path>` kills the process with a
+# signal unless <path> exists (and creates it, so that only the first attempt crashes).
+FAKE_WKHTMLTOPDF = f'''\
+	#!{sys.executable}
+	import os, re, signal, sys, time
+	html = sys.stdin.read()
+	if m := re.search(r'PID:(\\S+)', html):
+		open(m[1], 'w').write(str(os.getpid()))
+	if 'SLEEP' in html:
+		time.sleep(60)
+	if 'FAIL' in html:
+		sys.stderr.write('boom')
+		sys.exit(2)
+	if (m := re.search(r'CRASH:(\\S+)', html)) and not os.path.exists(m[1]):
+		open(m[1], 'w').close()
+		os.kill(os.getpid(), signal.SIGKILL)
+	if 'ALWAYS_CRASH' in html:
+		os.kill(os.getpid(), signal.SIGKILL)
+	sys.stdout.write('%PDF-1.4 ' + html)
+'''
+
+
+@pytest.fixture
+def pools(monkeypatch, tmp_path):
+	"""
+	Factory of render pools running the fake wkhtmltopdf, shut down after the test.
+	"""
+	fake = tmp_path / 'bin' / 'wkhtmltopdf'
+	fake.parent.mkdir()
+	fake.write_text(textwrap.dedent(FAKE_WKHTMLTOPDF))
+	fake.chmod(fake.stat().st_mode | stat.S_IXUSR)
+	monkeypatch.setenv('PATH', f'{fake.parent}{os.pathsep}{os.environ["PATH"]}')
+	created = []
+
+	def make(**kwargs) -> RenderPool:
+		created.append(pool := RenderPool(**kwargs))
+		return pool
+
+	yield make
+	for pool in created:
+		pool.shutdown()
+
+
+def wait_until(predicate, timeout: float = 5) -> None:
+	deadline = time.monotonic() + timeout
+	while not predicate():
+		assert time.monotonic() < deadline
+		time.sleep(0.01)
+
+
+def test_render_streams_the_pdf(pools):
+	pool = pools(size=1)
+
+	assert pool.render('<p>Hello</p>') == b'%PDF-1.4 <p>Hello</p>'
+	with pytest.raises(RenderError, match='code 2: boom'):
+		pool.render('FAIL')
+	assert pool.stats() | {'busy': 0, 'rendered': 1, 'failed': 1} == pool.stats()
+
+
+def test_hung_renders_are_killed(pools, tmp_path):
+	pool = pools(size=1, timeout=0.5)
+	pid = tmp_path / 'pid'
+
+	start = time.monotonic()
+	with pytest.raises(RenderTimeout):
+		pool.render(f'SLEEP PID:{pid}')
+
+	assert time.monotonic() - start < 5
+	with pytest.raises(ProcessLookupError):
+		os.kill(int(pid.read_text()), 0)
+	# The slot is usable again
+	assert pool.render('after') == b'%PDF-1.4 after'
+	assert pool.stats()['failed'] == 1
+
+
+def test_renders_killed_by_a_signal_are_retried_once(pools, tmp_path):
+	pool = pools(size=1)
+
+	assert pool.render(f'CRASH:{tmp_path / "crashed"}') == f'%PDF-1.4 CRASH:{tmp_path / "crashed"}'.encode()
+	assert pool.stats()['restarts'] == 1
+
+	with pytest.raises(RenderError):
+		pool.render('ALWAYS_CRASH')
+	assert pool.stats()['restarts'] == 2
+
+
+def test_submit_rejects_jobs_past_the_queue_size(pools):
+	pool = pools(size=1, queue_size=1, timeout=1)
+	running = pool.submit('SLEEP', io.BytesIO())
+	wait_until(lambda: pool.stats()['busy'] == 1)
+	queued = pool.submit('queued', io.BytesIO())
+
+	with pytest.raises(RenderQueueFull):
+		pool.submit('rejected', io.BytesIO())
+
+	with pytest.raises(RenderTimeout):
+		pool.result(running)
+	assert pool.result(queued) == len(b'%PDF-1.4 queued')
+
+
+def test_result_waits_for_the_jobs_that_can_be_ahead(pools, monkeypatch):
+	monkeypatch.setattr(render, 'RESULT_MARGIN', 0)
+	pool = pools(size=2, queue_size=4, timeout=0.1)
+	never = Future()
+
+	start = time.monotonic()
+	with pytest.raises(RenderTimeout):
+		pool.result(never)
+
+	# Its own render timeout, plus those of the 4 / 2 jobs per renderer ahead of it
+	assert 0.3 <= time.monotonic() - start < 1
+	assert never.cancelled()
+
+	start = time.monotonic()
+	with pytest.raises(RenderTimeout):
+		pool.result(Future(), timeout=0.2)
+	assert 0.6 <= time.monotonic() - start < 1.5
@@ -0,0 +1,193 @@
+import gzip
+import json
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from server import routes, transcript
+from server.data import Data
+from server.assets import MANIFEST, Assets, get_assets
+from server.templates import get_assets_dir
+from server.jobs import get_manager
+
+
+def login(app, uid: int):
+	client = app.test_client()
+	with client.session_transaction() as session:
+		session[Data.S_SESSION] = {'token': 'token', 'refresh': 'refresh', 'expires': time.time() + 7200, 'uid': uid}
+	return client
+
+
+@pytest.fixture(scope='module')
+def client(app):
+	return login(app, 1)
+
+
+def assert_sessionless(response):
+	assert response.status_code == 200
+	assert 'Set-Cookie' not in response.headers
+	assert 'Cookie' not in response.vary
+
+
+def test_pages_refresh_the_session(client):
+	response = client.get('/')
+	assert 'Set-Cookie' in response.headers
+	assert 'Cookie' in response.vary
+
+
+def test_asset_does_not_touch_the_session(client):
+	response = client.get(get_assets().url('css/style.css'))
+	assert_sessionless(response)
+	assert response.cache_control.immutable
+
+
+def test_transcript_asset_does_not_touch_the_session(client):
+	with open(os.path.join(get_assets_dir(), 'image.png'), 'wb') as f:
+		f.write(b'\x89PNG\r\n\x1a\n')
+	response = client.get('/transcript/assets/image.png')
+	assert_sessionless(response)
+	assert response.cache_control.immutable
+
+
+def test_assets_are_fingerprinted_by_contents(tmp_path):
+	src = tmp_path / 'client'
+	(src / 'css').mkdir(parents=True)
+	(src / 'html').mkdir()
+	(src / 'css' / 'style.css').write_text('body { margin: 0; }\n' * 100)
+	(src / 'logo.png').write_bytes(b'\x89PNG\r\n\x1a\n' * 100)
+	(src / 'html' / 'index.html').write_text('<p>Rendered by Flask</p>')
+	manifest = Assets(str(src), str(tmp_path / 'build')).build()
+
+	assert set(manifest) == {'css/style.css', 'logo.png'}
+	assert manifest['css/style.css'].startswith('css/style.') and manifest['css/style.css'].endswith('.css')
+	assert json.loads((tmp_path / 'build' / MANIFEST).read_text()) == manifest
+	# Stable across builds, and changes only with the contents of the file
+	assert Assets(str(src), str(tmp_path / 'build')).build() == manifest
+	(src / 'css' / 'style.css').write_text('body { margin: 1px; }\n' * 100)
+	rebuilt = Assets(str(src), str(tmp_path / 'build')).build()
+	assert rebuilt['logo.png'] == manifest['logo.png']
+	assert rebuilt['css/style.css'] != manifest['css/style.css']
+
+
+def test_asset_variant_follows_accept_encoding():
+	assets = Assets('src', 'build')
+	assets.encodings = {'style.css': ('br', 'gzip'), 'logo.png': ()}
+
+	def variant(name, header):
+		return assets.variant(name, parse_accept_header(header, Accept))
+
+	assert variant('style.css', 'gzip, deflate, br') == ('style.css.br', 'br')
+	assert variant('style.css', 'gzip, br;q=0') == ('style.css.gz', 'gzip')
+	assert variant('style.css', '') == ('style.css', None)
+	assert variant('logo.png', 'gzip, br') == ('logo.png', None)
+	assert variant('missing.css', 'gzip') is None
+
+
+def test_asset_is_sent_precompressed(client):
+	url = get_assets().url('js/script.js')
+	with open(os.path.join(get_assets().src_dir, 'js', 'script.js'), 'rb') as f:
+		source = f.read()
+
+	response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+	assert response.headers['Content-Encoding'] == 'gzip'
+	assert 'Accept-Encoding' in response.vary
+	assert gzip.decompress(response.data) == source
+
+	response = client.get(url)
+	assert 'Content-Encoding' not in response.headers
+	assert response.data == source
+
+
+def test_asset_url_falls_back_to_the_static_files(client):
+	assert get_assets().url('css/missing.css') == '/client/css/missing.css'
+	assert client.get(Assets('src', 'build').url('css/style.css')).status_code == 200
+
+
+@pytest.fixture
+def data(monkeypatch, profile):
+	data = transcript.compute_transcript(profile)
+	monkeypatch.setattr(routes, 'get_transcript_data', lambda sess: data)
+	return data
+
+
+def fail(*args, **kwargs):
+	raise AssertionError('rendered')
+
+
+@pytest.mark.parametrize('url', ['/transcript.json', '/transcript/preview'])
+def test_transcript_is_revalidated_without_rendering(client, data, monkeypatch, url):
+	response = client.get(url)
+	assert response.status_code == 200
+	etag = response.headers['ETag']
+	assert response.cache_control.private and response.cache_control.no_cache
+	assert 'Cookie' in response.vary
+
+	monkeypatch.setattr(routes, 'json_response', fail)
+	monkeypatch.setattr(routes, 'render_transcript_html', fail)
+	response = client.get(url, headers={'If-None-Match': etag})
+	assert response.status_code == 304
+	assert response.headers['ETag'] == etag
+	assert response.cache_control.private and response.cache_control.no_cache
+	assert 'Cookie' in response.vary
+
+
+@pytest.mark.parametrize('url', ['/transcript.json', '/transcript/preview'])
+def test_transcript_etag_follows_the_data(client, data, url):
+	etag = client.get(url).headers['ETag']
+	data['transcript']['gpa'] += 1
+
+	response = client.get(url, headers={'If-None-Match': etag})
+	assert response.status_code == 200
+	assert response.headers['ETag'] != etag
+
+
+def test_preview_etag_follows_the_template(client, data, monkeypatch):
+	etag = client.get('/transcript/preview').headers['ETag']
+	monkeypatch.setattr(transcript, '_template_digest', lambda: 'edited')
+
+	response = client.get('/transcript/preview', headers={'If-None-Match': etag})
+	assert response.status_code == 200
+	assert response.headers['ETag'] != etag
+
+
+def job(owner: int, **fields) -> str:
+	store = get_manager().store
+	job_id, _ = store.claim(owner)
+	if fields:
+		store.update(job_id, **fields)
+	return job_id
+
+
+def test_jobs_are_only_visible_to_their_owner(app, client, tmp_path):
+	pdf = tmp_path / 'transcript.pdf'
+	pdf.write_bytes(b'%PDF-1.4')
+	job_id = job(1, status='done', path=str(pdf), name='transcript.pdf')
+
+	assert client.get(f'/transcript/jobs/{job_id}').get_json()['status'] == 'done'
+	assert client.get(f'/transcript/jobs/{job_id}/download').data == b'%PDF-1.4'
+	other = login(app, 2)
+	assert other.get(f'/transcript/jobs/{job_id}').status_code == 404
+	assert other.get(f'/transcript/jobs/{job_id}/download').status_code == 404
+	assert app.test_client().get(f'/transcript/jobs/{job_id}').status_code == 401
+	assert client.get('/transcript/jobs/unknown').status_code == 404
+
+
+def test_job_download_before_it_is_done(app):
+	client = login(app, 3)
+	job_id = job(3)
+
+	response = client.get(f'/transcript/jobs/{job_id}/download')
+	assert response.status_code == 409
+	assert response.get_json()['status'] == 'queued'
+
+
+def test_job_download_after_the_pdf_expired(app, tmp_path):
+	client = login(app, 4)
+	job_id = job(4, status='done', path=str(tmp_path / 'evicted.pdf'), name='transcript.pdf')
+
+	response = client.get(f'/transcript/jobs/{job_id}/download')
+	assert response.status_code == 410
+	assert response.get_json()['error'] == 'The transcript expired, please generate it again.'
@@ -0,0 +1,89 @@
+import json
+import time
+from types import SimpleNamespace
+
+import requests
+
+from server import session as session_module
+from server.session import Session
+
+
+def response(data, status: int = 200, headers: dict | None = None) -> requests.Response:
+	res = requests.Response()
+	res.status_code = status
+	res._content = json.dumps(data).encode()
+	res.headers.update(headers or {})
+	return res
+
+
+def session() -> dict:
+	return {'token': 'token', 'refresh': 'refresh', 'expires': time.time() + 7200, 'uid': 1}
+
+
+def fake_api(monkeypatch, pages: dict, headers: dict | None = None) -> None:
+	"""
+	Serve `pages` (page number -> list, or exception to raise) as the paginated endpoint.
+	"""
+	def get(url):
+		page = int(url.split('page[number]=')[1].split('&')[0]) if 'page[number]=' in url else 1
+		if isinstance(result := pages[page], Exception):
+			raise result
+		return 'GET', response(result, headers=headers)
+
+	monkeypatch.setattr(Session, '_get_callback', staticmethod(lambda sess: get))
+
+
+def test_iter_pages_yields_error_when_a_concurrent_page_fails(monkeypatch):
+	fake_api(
+		monkeypatch,
+		{1: [{'id': 1}, {'id': 2}], 2: requests.ConnectionError('reset'), 3: [{'id': 5}]},
+		headers={'X-Total': '5', 'X-Per-Page': '2'},
+	)
+
+	items = list(Session.iter_pages(session(), '/v2/users', 2, False))
+
+	assert items[0]['page'] == 1 and items[0]['total'] == 2
+	assert items[-1]['page'] == 2
+	assert items[-1]['status_code'] == 502
+	assert items[-1]['error'] == 'Bad Gateway'
+
+
+def test_iter_pages_yields_error_when_a_sequential_page_fails(monkeypatch):
+	fake_api(monkeypatch, {1: [{'id': 1}, {'id': 2}], 2: requests.Timeout('slow')})
+
+	items = list(Session.iter_pages(session(), '/v2/users', 2, False))
+
+	assert [item['page'] for item in items] == [1, 2]
+	assert items[-1]['status_code'] == 504
+
+
+def test_iter_pages_paginates_concurrently_after_a_token_refresh(monkeypatch):
+	fake_api(
+		monkeypatch,
+		{1: [{'id': 1}, {'id': 2}], 2: [{'id': 3}, {'id': 4}], 3: [{'id': 5}]},
+		headers={'X-Total': '5', 'X-Per-Page': '2'},
+	)
+	get = Session._get_callback(None)
+	calls = []
+
+	def revoked(url):
+		# The first request is rejected, its retry with the refreshed token succeeds
+		calls.append(url)
+		return ('GET', response({'error': 'Unauthorized'}, 401)) if len(calls) == 1 else get(url)
+
+	refreshes = []
+	monkeypatch.setattr(Session, '_get_callback', staticmethod(lambda sess: revoked))
+	monkeypatch.setattr(
+		session_module, 'get_token_manager',
+		lambda: SimpleNamespace(ensure_fresh=lambda sess, force=False: refreshes.append(force) or (force, None)),
+	)
+	fetched = []
+	fetch_pages = Session._fetch_pages
+	monkeypatch.setattr(Session, '_fetch_pages', staticmethod(lambda *a, **kw: fetched.append(list(a[3])) or fetch_pages(*a, **kw)))
+
+	items = list(Session.iter_pages(session(), '/v2/users', 2, False))
+
+	assert refreshes == [False, True]
+	assert fetched == [[2, 3]]
+	assert sorted(item['page'] for item in items) == [1, 2, 3]
+	assert sum(item['total'] for item in items) == 5
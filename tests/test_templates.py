@@ -0,0 +1,139 @@
+import base64
+import os
+import re
+from html.parser import HTMLParser
+
+import pytest
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+
+from server.config import get_config
+from server.templates import BuildLoader, extract_images, minify_css, minify_html
+from server.transcript import compute_transcript
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 8
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"/>'
+
+
+class _Text(HTMLParser):
+	def __init__(self):
+		super().__init__()
+		self.text, self.style = [], False
+
+	def handle_starttag(self, tag, attrs):
+		self.style = tag == 'style'
+
+	def handle_endtag(self, tag):
+		self.style = False
+
+	def handle_data(self, data):
+		if data.strip() and not self.style:
+			self.text.append(' '.join(data.split()))
+
+
+def text(html: str) -> list[str]:
+	"""
+	Text nodes of `html`, whitespace collapsed: minifying only drops whitespace that does not render.
+	Style sheets are left out, see `minify_css`.
+	"""
+	parser = _Text()
+	parser.feed(html)
+	return parser.text
+
+
+def data_uri(mime: str, data: bytes) -> str:
+	return f'data:{mime};base64,{base64.b64encode(data).decode()}'
+
+
+def test_minify_html_collapses_whitespace_around_blocks():
+	html = '<div>\n\t<!-- Note -->\n\t<p>  Hello,   <strong>John</strong>  !</p>\n</div>\n'
+
+	assert minify_html(html) == '<div><p>Hello, <strong>John</strong> !</p></div>'
+
+
+@pytest.mark.parametrize('raw', [
+	'<pre>  two\n    lines </pre>',
+	'<textarea name="t">  keep\n  this </textarea>',
+	'<script>\n\tif (a  <  b) {\n\t\tf("  ");  // <p>\n\t}\n</script>',
+])
+def test_minify_html_keeps_raw_text_elements(raw):
+	assert minify_html(f'<div>\n  {raw}\n</div>') == f'<div>{raw}</div>'
+
+
+def test_minify_html_keeps_jinja_tags():
+	html = (
+		'<ul>\n'
+		'  {# The   stages #}\n'
+		'  {% for s in stages   %}\n'
+		'    <li>{{ s.name  ~ "  " }} <em>{{ s.mark }}</em></li>\n'
+		'  {% endfor %}\n'
+		'</ul>\n'
+	)
+	minified = minify_html(html)
+	stages = [{'name': 'Piscine', 'mark': 100}, {'name': 'Core', 'mark': 125}]
+
+	for tag in ('{# The   stages #}', '{% for s in stages   %}', '{{ s.name  ~ "  " }}', '{{ s.mark }}', '{% endfor %}'):
+		assert tag in minified
+	env = Environment()
+	assert text(env.from_string(minified).render(stages=stages)) == text(env.from_string(html).render(stages=stages))
+
+
+def test_minify_css():
+	css = '/* Layout */\nbody > .card ,\n h1 {\n\tcolor:  red ;\n\tmargin: 0 auto;\n}\na:hover { color: blue; }\n'
+
+	assert minify_css(css) == 'body>.card,h1{color:red;margin:0 auto}a:hover{color:blue}'
+	assert minify_html(f'<style>\n{css}</style>') == f'<style>{minify_css(css)}</style>'
+
+
+def test_extract_images_writes_each_image_once(tmp_path):
+	html = (
+		f'<img src="{data_uri("image/png", PNG)}"><img src="{data_uri("image/png", PNG)}">'
+		f'<img src="{data_uri("image/svg+xml", SVG)}"><img src="{data_uri("image/webp", b"RIFF")}">'
+	)
+
+	out = extract_images(html, str(tmp_path))
+
+	urls = re.findall(r'src="([^"]*)"', out)
+	assert all(url.startswith(f'file://{tmp_path}/') for url in urls)
+	assert urls[0] == urls[1] and len(set(urls)) == 3
+	assert sorted(os.path.splitext(f)[1] for f in os.listdir(tmp_path)) == ['.png', '.svg', '.webp']
+	with open(urls[0].removeprefix('file://'), 'rb') as f:
+		assert f.read() == PNG
+
+
+def test_build_loader_rebuilds_stale_templates(tmp_path):
+	src = tmp_path / 'src'
+	src.mkdir()
+	(src / 'transcript.html').write_text(f'<div>\n  <img src="{data_uri("image/png", PNG)}">\n</div>\n')
+	(src / 'other.html').write_text('<p>Served as is</p>')
+	loader = BuildLoader(str(src), str(tmp_path / 'build'))
+
+	source, path, uptodate = loader.get_source(None, 'transcript.html')
+
+	assert re.fullmatch(r'<div><img src="file://[^"]*\.png"></div>', source)
+	assert path == str(tmp_path / 'build' / 'html' / 'transcript.html')
+	assert uptodate()
+	assert len(os.listdir(tmp_path / 'build' / 'assets')) == 1
+	with pytest.raises(TemplateNotFound):
+		loader.get_source(None, 'other.html')
+	assert loader.list_templates() == ['transcript.html']
+
+	(src / 'transcript.html').write_text('<div>\n  <p>Edited</p>\n</div>\n')
+	os.utime(src / 'transcript.html', (os.path.getmtime(path) + 1,) * 2)
+
+	assert not uptodate()
+	assert loader.get_source(None, 'transcript.html')[0] == '<div><p>Edited</p></div>'
+
+
+def test_built_transcript_renders_the_text_of_its_source(app, profile):
+	with app.app_context():
+		context = {'env': get_config().template_env} | compute_transcript(profile)
+		app.update_template_context(context)
+		built = app.jinja_env.get_template('transcript.html').render(context)
+		sources = app.jinja_env.overlay(
+			loader=FileSystemLoader(os.path.join(app.root_path, app.template_folder)),
+			cache_size=0, bytecode_cache=None,
+		)
+		source = sources.get_template('transcript.html').render(context)
+
+	assert built != source
+	assert text(built) == text(source)
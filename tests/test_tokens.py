@@ -0,0 +1,102 @@
+import os
+import stat
+import time
+import threading
+
+from server.tokens import RotationStore, TokenManager
+
+
+def tokens(n: int) -> dict:
+	return {'token': f'access-{n}', 'refresh': f'refresh-{n}', 'expires': time.time() + 7200 + n}
+
+
+def manager(tmp_path) -> TokenManager:
+	return TokenManager(RotationStore(str(tmp_path / 'tokens.sqlite3')))
+
+
+def test_store_is_only_readable_by_its_owner(tmp_path):
+	path = tmp_path / 'tokens.sqlite3'
+	path.touch(mode=0o644)
+	store = RotationStore(str(path))
+	store.put('refresh-0', tokens(1))
+
+	for name in ('tokens.sqlite3', 'tokens.sqlite3-wal'):
+		assert stat.S_IMODE(os.stat(tmp_path / name).st_mode) == 0o600
+
+
+def test_concurrent_refreshes_make_one_upstream_call(tmp_path, monkeypatch):
+	tm, calls, release = manager(tmp_path), [], threading.Event()
+
+	def post(data):
+		calls.append(data['refresh_token'])
+		release.wait(5)
+		return tokens(1)
+
+	monkeypatch.setattr(TokenManager, '_post', staticmethod(post))
+	results = []
+	threads = [threading.Thread(target=lambda: results.append(tm.refresh('refresh-0'))) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	while not calls:
+		time.sleep(0.001)
+	release.set()
+	for thread in threads:
+		thread.join()
+
+	assert calls == ['refresh-0']
+	assert len(results) == 8 and all(r == results[0] for r in results)
+	assert results[0]['token'] == 'access-1'
+
+
+def test_rotations_are_shared_between_workers(tmp_path, monkeypatch):
+	calls = []
+	monkeypatch.setattr(TokenManager, '_post', staticmethod(lambda data: calls.append(data) or tokens(1)))
+	one, two = manager(tmp_path), manager(tmp_path)
+
+	assert one.refresh('refresh-0')['token'] == 'access-1'
+	assert two.refresh('refresh-0')['token'] == 'access-1'
+	assert len(calls) == 1
+
+
+def test_successor_follows_the_rotation_chain(tmp_path):
+	tm = manager(tmp_path)
+	tm.store.put('refresh-0', tokens(1))
+	tm.store.put('refresh-1', tokens(2))
+	tm.store.put('refresh-2', tokens(3))
+
+	assert tm.successor('refresh-0')['token'] == 'access-3'
+	assert tm.successor('refresh-2')['token'] == 'access-3'
+	assert tm.successor('refresh-3') is None
+	assert tm.successor(None) is None
+
+
+def test_successor_stops_on_a_loop(tmp_path):
+	tm = manager(tmp_path)
+	# A provider that hands the same refresh token back
+	tm.store.put('refresh-0', tokens(0))
+
+	assert tm.successor('refresh-0')['token'] == 'access-0'
+
+
+def test_stale_sessions_pick_up_the_latest_tokens(tmp_path, monkeypatch):
+	monkeypatch.setattr(TokenManager, '_post', staticmethod(lambda data: {'status_code': 400, 'error': 'invalid_grant'}))
+	tm = manager(tmp_path)
+	tm.store.put('refresh-0', tokens(1))
+	tm.store.put('refresh-1', tokens(2))
+	sess = {'token': 'access-0', 'refresh': 'refresh-0', 'expires': time.time() - 10}
+
+	assert tm.ensure_fresh(sess) == (True, None)
+	assert (sess['token'], sess['refresh'], sess['valid']) == ('access-2', 'refresh-2', True)
+
+
+def test_lost_race_with_another_worker_is_not_a_failure(tmp_path, monkeypatch):
+	tm = manager(tmp_path)
+
+	def post(data):
+		# Another worker rotated the token first
+		tm.store.put('refresh-0', tokens(1))
+		return {'status_code': 400, 'error': 'invalid_grant'}
+
+	monkeypatch.setattr(TokenManager, '_post', staticmethod(post))
+
+	assert tm.refresh('refresh-0')['token'] == 'access-1'
@@ -0,0 +1,31 @@
+import pytest
+
+from server.utils import strbool
+from server.config import Config, ConfigError
+
+
+@pytest.mark.parametrize('value, expected', [
+	('true', True), ('Yes', True), ('1', True), ('on', True),
+	('false', False), ('No', False), ('0', False), ('off', False),
+	(1, True), (0, False), (0.0, False), (True, True), (False, False),
+])
+def test_strbool(value, expected):
+	assert strbool(value) is expected
+	assert strbool(value, strict=True) is expected
+
+
+def test_strbool_unrecognized():
+	assert strbool('maybe') is False
+	assert strbool('maybe', strict=True) is None
+	assert strbool(None) is False
+	assert strbool(None, strict=True) is None
+
+
+def test_debug_false_is_parsed_as_false():
+	env = {
+		'API_URL': 'a', 'API_TOKEN_URL': 't', 'API_OAUTH_URL': 'o', 'REDIRECT_URI': 'r',
+		'FT_UID': 'u', 'FT_SECRET': 's', 'DEBUG': 'False',
+	}
+	assert Config.from_env(env).debug is False
+	with pytest.raises(ConfigError):
+		Config.from_env(env | {'DEBUG': 'maybe'})